@@ -0,0 +1,219 @@
+const winston = require('winston');
+const fs = require('fs').promises;
+const path = require('path');
+const { spawn } = require('child_process');
+
+// Logger setup
+const logger = winston.createLogger({
+    level: 'info',
+    format: winston.format.combine(
+        winston.format.timestamp(),
+        winston.format.printf(({ timestamp, level, message }) => `${timestamp} ${level}: ${message}`)
+    ),
+    transports: [
+        new winston.transports.File({ filename: 'logs/environment.log' }),
+        new winston.transports.Console()
+    ]
+});
+
+// Bump when the fingerprint layout changes so old caches are re-probed
+const FINGERPRINT_VERSION = 1;
+
+const REQUIRED_PACKAGES = ['selenium', 'webdriver-manager', 'robotframework', 'robotframework-seleniumlibrary'];
+
+// Prints the interpreter path, version, site-packages dir and package versions as JSON
+const PYTHON_PROBE = [
+    'import sys, json, sysconfig',
+    'from importlib import metadata',
+    'packages = {}',
+    'for name in sys.argv[1:]:',
+    '    try:',
+    '        packages[name] = metadata.version(name)',
+    '    except metadata.PackageNotFoundError:',
+    '        packages[name] = None',
+    'print(json.dumps({"executable": sys.executable, "version": sys.version.split()[0], ' +
+        '"sitePackages": sysconfig.get_paths()["purelib"], "packages": packages}))'
+].join('\n');
+
+const DRIVER_PROBES = {
+    chromedriver: ['chromedriver', ['--version']],
+    geckodriver: ['geckodriver', ['--version']],
+    msedgedriver: ['msedgedriver', ['--version']]
+};
+
+// Commands that report the installed version of each supported browser, per platform
+const BROWSER_PROBES = {
+    linux: {
+        chrome: [['google-chrome', ['--version']], ['chromium', ['--version']], ['chromium-browser', ['--version']]],
+        firefox: [['firefox', ['--version']]],
+        edge: [['microsoft-edge', ['--version']]]
+    },
+    darwin: {
+        chrome: [['/Applications/Google Chrome.app/Contents/MacOS/Google Chrome', ['--version']]],
+        firefox: [['/Applications/Firefox.app/Contents/MacOS/firefox', ['--version']]],
+        edge: [['/Applications/Microsoft Edge.app/Contents/MacOS/Microsoft Edge', ['--version']]]
+    },
+    win32: {
+        chrome: [['reg', ['query', 'HKCU\\Software\\Google\\Chrome\\BLBeacon', '/v', 'version']]],
+        firefox: [['reg', ['query', 'HKLM\\SOFTWARE\\Mozilla\\Mozilla Firefox', '/v', 'CurrentVersion']]],
+        edge: [['reg', ['query', 'HKCU\\Software\\Microsoft\\Edge\\BLBeacon', '/v', 'version']]]
+    }
+};
+
+// Run a command and collect its combined output; resolves with code -1 if it cannot start
+function runCommand(command, args) {
+    return new Promise((resolve) => {
+        let output = '';
+        const child = spawn(command, args);
+        child.stdout.on('data', (data) => output += data.toString());
+        child.stderr.on('data', (data) => output += data.toString());
+        child.on('error', (err) => resolve({ code: -1, output: err.message }));
+        child.on('close', (code) => resolve({ code, output: output.trim() }));
+    });
+}
+
+function extractVersion(output) {
+    const version = output.match(/\d+(\.\d+)+/);
+    return version ? version[0] : null;
+}
+
+async function probeVersion(probes) {
+    for (const [command, args] of probes) {
+        const result = await runCommand(command, args);
+        const version = result.code === 0 && extractVersion(result.output);
+        if (version) {
+            return version;
+        }
+    }
+    return null;
+}
+
+async function probePython(pythonCommand) {
+    const result = await runCommand(pythonCommand, ['-c', PYTHON_PROBE, ...REQUIRED_PACKAGES]);
+    if (result.code !== 0) {
+        return null;
+    }
+    try {
+        return JSON.parse(result.output.split('\n').pop());
+    } catch (err) {
+        logger.error(`Could not parse ${pythonCommand} probe output: ${result.output}`);
+        return null;
+    }
+}
+
+async function mtimeOf(filePath) {
+    try {
+        return (await fs.stat(filePath)).mtimeMs;
+    } catch (err) {
+        return null;
+    }
+}
+
+// Return the cached fingerprint if the interpreter and its site-packages are unchanged
+async function readCachedFingerprint(cachePath) {
+    let fingerprint;
+    try {
+        fingerprint = JSON.parse(await fs.readFile(cachePath, 'utf8'));
+    } catch (err) {
+        return null;
+    }
+
+    const [interpreterMtime, sitePackagesMtime] = await Promise.all([
+        mtimeOf(fingerprint.interpreterPath),
+        mtimeOf(fingerprint.sitePackagesPath)
+    ]);
+    if (fingerprint.version !== FINGERPRINT_VERSION ||
+        interpreterMtime === null ||
+        interpreterMtime !== fingerprint.interpreterMtimeMs ||
+        sitePackagesMtime !== fingerprint.sitePackagesMtimeMs) {
+        logger.info('Cached environment fingerprint is stale');
+        return null;
+    }
+
+    logger.info(`Using cached environment fingerprint from ${fingerprint.createdAt}`);
+    return fingerprint;
+}
+
+async function saveFingerprint(cachePath, fingerprint) {
+    await fs.mkdir(path.dirname(cachePath), { recursive: true });
+    const tempPath = `${cachePath}.tmp`;
+    await fs.writeFile(tempPath, JSON.stringify(fingerprint, null, 2));
+    await fs.rename(tempPath, cachePath);
+}
+
+// Probe interpreters, packages, drivers and browsers in parallel, installing missing packages
+async function probeEnvironment(sendStatus) {
+    sendStatus('Probing Python, packages, drivers and browsers...');
+    const browserProbes = BROWSER_PROBES[process.platform] || BROWSER_PROBES.linux;
+    const browserNames = Object.keys(browserProbes);
+    const driverNames = Object.keys(DRIVER_PROBES);
+
+    const [python, python3, ...versions] = await Promise.all([
+        probePython('python'),
+        probePython('python3'),
+        ...driverNames.map((name) => probeVersion([DRIVER_PROBES[name]])),
+        ...browserNames.map((name) => probeVersion(browserProbes[name]))
+    ]);
+
+    let interpreter = python || python3;
+    if (!interpreter) {
+        sendStatus('Python not found. Please install Python manually and add it to PATH.', 'error');
+        throw new Error('Python not found');
+    }
+    sendStatus(`Python found: ${interpreter.version} at ${interpreter.executable}`, 'success');
+
+    const missing = REQUIRED_PACKAGES.filter((pkg) => !interpreter.packages[pkg]);
+    if (missing.length > 0) {
+        sendStatus(`${missing.join(', ')} not found, installing latest version...`, 'info');
+        const pipInstall = await runCommand(interpreter.executable, ['-m', 'pip', 'install', ...missing, '--upgrade']);
+        if (pipInstall.code !== 0) {
+            sendStatus(`Failed to install ${missing.join(', ')}: ${pipInstall.output}`, 'error');
+            throw new Error(`Failed to install ${missing.join(', ')}`);
+        }
+        sendStatus(`Successfully installed ${missing.join(', ')}`, 'success');
+        interpreter = await probePython(interpreter.executable);
+    } else {
+        sendStatus('All required Python packages are already installed', 'success');
+    }
+
+    const drivers = {};
+    driverNames.forEach((name, index) => {
+        if (versions[index]) {
+            drivers[name] = versions[index];
+        }
+    });
+    const browsers = {};
+    browserNames.forEach((name, index) => {
+        if (versions[driverNames.length + index]) {
+            browsers[name] = versions[driverNames.length + index];
+        }
+    });
+
+    return {
+        version: FINGERPRINT_VERSION,
+        createdAt: new Date().toISOString(),
+        platform: process.platform,
+        interpreterPath: interpreter.executable,
+        interpreterMtimeMs: await mtimeOf(interpreter.executable),
+        sitePackagesPath: interpreter.sitePackages,
+        sitePackagesMtimeMs: await mtimeOf(interpreter.sitePackages),
+        pythonVersion: interpreter.version,
+        packages: interpreter.packages,
+        drivers,
+        browsers
+    };
+}
+
+// Capabilities advertised to the hub in register-electron
+function capabilitiesFromFingerprint(fingerprint) {
+    const robotVersion = fingerprint.packages.robotframework;
+    return {
+        platform: fingerprint.platform,
+        browsers: fingerprint.browsers,
+        drivers: fingerprint.drivers,
+        python: `Python ${fingerprint.pythonVersion}`,
+        robot: robotVersion ? `Robot Framework ${robotVersion}` : null
+    };
+}
+
+module.exports = { readCachedFingerprint, saveFingerprint, probeEnvironment, capabilitiesFromFingerprint };
@@ -1,9 +1,10 @@
 const { app, BrowserWindow, ipcMain } = require('electron');
 const WebSocket = require('ws');
 const path = require('path');
-const { runTestCase } = require('./runTests');
+const { runTestCase, prepareTestCase, discardWorkspace } = require('./runTests');
 const fs = require('fs').promises;
-const { spawn } = require('child_process');
+const os = require('os');
+const { readCachedFingerprint, saveFingerprint, probeEnvironment, capabilitiesFromFingerprint } = require('./environment');
 const winston = require('winston');
 
 // Logger setup
@@ -44,111 +45,177 @@ function createWindow() {
   return mainWindow;
 }
 
-// Dependency check and installation
-async function checkAndInstallDependencies(mainWindow) {
+// Number of tests this worker runs concurrently, advertised to the hub
+const WORKER_SLOTS = Math.max(1, parseInt(process.env.WORKER_SLOTS, 10) || Math.floor(os.cpus().length / 2) || 1);
+
+// A prefetched test the hub has not sent after this long is assumed to run elsewhere
+const PREFETCH_TTL_MS = parseInt(process.env.PREFETCH_TTL_MS, 10) || 120000;
+
+// Dependency check and installation, skipped when the cached fingerprint is still valid
+async function checkAndInstallDependencies(mainWindow, cachePath) {
   const sendStatus = (message, type = 'info') => {
     mainWindow.webContents.send('dependency-status', { message, type });
     logger.info(message);
   };
 
-  // Check for Python
-  sendStatus('Checking for Python...');
-  let pythonCommand = 'python';
+  const cached = await readCachedFingerprint(cachePath);
+  if (cached) {
+    sendStatus(`Using cached environment: Python ${cached.pythonVersion} at ${cached.interpreterPath}`, 'success');
+    return cached;
+  }
+
+  const fingerprint = await probeEnvironment(sendStatus);
   try {
-    const pythonCheck = await new Promise((resolve, reject) => {
-      const process = spawn(pythonCommand, ['--version']);
-      let output = '';
-      process.stdout.on('data', (data) => output += data.toString());
-      process.stderr.on('data', (data) => output += data.toString());
-      process.on('close', (code) => resolve({ code, output }));
-      process.on('error', (err) => reject(err));
-    });
+    await saveFingerprint(cachePath, fingerprint);
+  } catch (err) {
+    logger.error(`Failed to cache environment fingerprint: ${err.message}`);
+  }
+  sendStatus('All dependencies installed, ready to execute tests', 'success');
+  return fingerprint;
+}
 
-    if (pythonCheck.code === 0) {
-      sendStatus(`Python found: ${pythonCheck.output.trim()}`, 'success');
-    } else {
-      sendStatus(`Python check failed: ${pythonCheck.output.trim()}`, 'error');
-      throw new Error('Python not found');
-    }
+// Workers without a fingerprint yet register as pending so the hub holds their tests;
+// a worker whose probe failed reports the error instead, and the hub sends it anything
+function currentCapabilities(worker) {
+  if (worker.environment) {
+    return capabilitiesFromFingerprint(worker.environment);
+  }
+  return worker.probeError ? { error: worker.probeError } : { pending: true };
+}
+
+// Results that could not be sent because the hub was unreachable, kept on disk
+// until the worker has re-registered
+async function loadOutbox(worker) {
+  try {
+    worker.outbox = JSON.parse(await fs.readFile(worker.outboxPath, 'utf8'));
+    logger.info(`Loaded ${worker.outbox.length} unsent test results`);
   } catch (err) {
-    pythonCommand = 'python3';
-    try {
-      const python3Check = await new Promise((resolve, reject) => {
-        const process = spawn(pythonCommand, ['--version']);
-        let output = '';
-        process.stdout.on('data', (data) => output += data.toString());
-        process.stderr.on('data', (data) => output += data.toString());
-        process.on('close', (code) => resolve({ code, output }));
-        process.on('error', (err) => reject(err));
-      });
+    worker.outbox = [];
+  }
+}
 
-      if (python3Check.code === 0) {
-        sendStatus(`Python found: ${python3Check.output.trim()}`, 'success');
-      } else {
-        sendStatus('Python not found. Please install Python manually and add it to PATH.', 'error');
-        throw new Error('Python not found');
-      }
-    } catch (err) {
-      sendStatus('Python not found. Please install Python manually and add it to PATH.', 'error');
-      throw err;
-    }
+async function saveOutbox(worker) {
+  try {
+    const tempPath = `${worker.outboxPath}.tmp`;
+    await fs.writeFile(tempPath, JSON.stringify(worker.outbox));
+    await fs.rename(tempPath, worker.outboxPath);
+  } catch (err) {
+    logger.error(`Failed to save unsent test results: ${err.message}`);
   }
+}
 
-  // Check and install Python packages
-  const requiredPackages = ['selenium', 'webdriver-manager', 'robotframework', 'robotframework-seleniumlibrary'];
-  for (const pkg of requiredPackages) {
-    sendStatus(`Checking for ${pkg}...`);
-    try {
-      const pipList = await new Promise((resolve, reject) => {
-        const process = spawn(pythonCommand, ['-m', 'pip', 'list']);
-        let output = '';
-        process.stdout.on('data', (data) => output += data.toString());
-        process.stderr.on('data', (data) => output += data.toString());
-        process.on('close', (code) => resolve({ code, output }));
-        process.on('error', (err) => reject(err));
-      });
+async function sendResult(worker, message) {
+  if (worker.ws && worker.ws.readyState === WebSocket.OPEN && worker.clientId) {
+    worker.ws.send(JSON.stringify({ ...message, clientId: worker.clientId }));
+    return true;
+  }
+  worker.outbox.push(message);
+  await saveOutbox(worker);
+  return false;
+}
 
-      if (pipList.code === 0 && pipList.output.includes(pkg)) {
-        sendStatus(`${pkg} is already installed, moving to next step`, 'success');
-      } else {
-        sendStatus(`${pkg} not found, installing latest version...`, 'info');
-        const pipInstall = await new Promise((resolve, reject) => {
-          const process = spawn(pythonCommand, ['-m', 'pip', 'install', pkg, '--upgrade']);
-          let output = '';
-          process.stdout.on('data', (data) => output += data.toString());
-          process.stderr.on('data', (data) => output += data.toString());
-          process.on('close', (code) => resolve({ code, output }));
-          process.on('error', (err) => reject(err));
-        });
+async function flushOutbox(worker) {
+  if (worker.outbox.length === 0) {
+    return;
+  }
+  const unsent = worker.outbox.splice(0);
+  unsent.forEach((message) => worker.ws.send(JSON.stringify({ ...message, clientId: worker.clientId })));
+  logger.info(`Sent ${unsent.length} test results held while disconnected`);
+  await saveOutbox(worker);
+}
 
-        if (pipInstall.code === 0) {
-          sendStatus(`Successfully installed ${pkg}`, 'success');
-        } else {
-          sendStatus(`Failed to install ${pkg}: ${pipInstall.output}`, 'error');
-          throw new Error(`Failed to install ${pkg}`);
-        }
-      }
+// Write the test file to its own directory. Prefetched tests also get their workspace
+// prepared and an interpreter started, so they can start as soon as a slot frees up.
+async function stageTestCase(worker, testCase, prefetch) {
+  const testDir = await fs.mkdtemp(path.join(__dirname, 'test_'));
+  const testFilePath = path.join(testDir, testCase.name);
+  try {
+    await fs.writeFile(testFilePath, testCase.content);
+  } catch (err) {
+    await removeStaged({ testDir });
+    throw err;
+  }
+  logger.info(`Test file saved at: ${testFilePath}`);
+
+  let workspace = null;
+  if (prefetch) {
+    try {
+      workspace = await prepareTestCase(testCase, testFilePath, { environment: worker.environment, warm: true });
     } catch (err) {
-      sendStatus(`Error checking/installing ${pkg}: ${err.message}`, 'error');
-      throw err;
+      // Prepared again when the test runs, which reports the error
+      logger.error(`Failed to prepare prefetched test case ${testCase.name}: ${err.message}`);
     }
   }
+  return { testDir, testFilePath, workspace };
+}
 
-  sendStatus('All dependencies installed, ready to execute tests', 'success');
-  return pythonCommand;
+async function removeStaged(staged) {
+  try {
+    await fs.rm(staged.testDir, { recursive: true, force: true });
+    logger.info(`Cleaned up test directory: ${staged.testDir}`);
+  } catch (err) {
+    logger.error(`Error cleaning up test directory: ${err.message}`);
+  }
+}
+
+function prefetchTest(worker, jobId, testCase) {
+  if (worker.prefetched.has(jobId) || worker.running.has(jobId)) {
+    return;
+  }
+  logger.info(`Prefetching test case ${testCase.name} (job ${jobId})`);
+  worker.prefetched.set(jobId, {
+    staged: stageTestCase(worker, testCase, true),
+    timer: setTimeout(() => discardPrefetched(worker, jobId, 'it was not sent in time'), PREFETCH_TTL_MS)
+  });
+}
+
+// The staged test for a job if it was prefetched, or null
+async function takePrefetched(worker, jobId) {
+  const prefetched = worker.prefetched.get(jobId);
+  if (!prefetched) {
+    return null;
+  }
+  worker.prefetched.delete(jobId);
+  clearTimeout(prefetched.timer);
+  try {
+    return await prefetched.staged;
+  } catch (err) {
+    logger.error(`Prefetched test for job ${jobId} could not be staged: ${err.message}`);
+    return null;
+  }
+}
+
+async function discardPrefetched(worker, jobId, reason) {
+  const staged = await takePrefetched(worker, jobId);
+  if (staged) {
+    logger.info(`Discarding prefetched job ${jobId}: ${reason}`);
+    if (staged.workspace) {
+      await discardWorkspace(staged.workspace);
+    }
+    await removeStaged(staged);
+  }
 }
 
 // WebSocket connection and test execution
-async function connectWebSocket(mainWindow, pythonCommand) {
+async function connectWebSocket(mainWindow, worker) {
   const ws = new WebSocket('ws://localhost:8080');
-  
+  worker.ws = ws;
+  worker.clientId = null;
+
   ws.on('open', () => {
     logger.info('Connected to Node server');
     mainWindow.webContents.send('dependency-status', {
       message: 'Client connected to Node server',
       type: 'success'
     });
-    ws.send(JSON.stringify({ type: 'register-electron' }));
+    // Tests still running from before a reconnect are reported so the hub does not
+    // hand them to another worker
+    ws.send(JSON.stringify({
+      type: 'register-electron',
+      capacity: WORKER_SLOTS,
+      capabilities: currentCapabilities(worker),
+      inFlight: Array.from(worker.running.values())
+    }));
   });
 
   ws.on('message', async (data) => {
@@ -157,45 +224,91 @@ async function connectWebSocket(mainWindow, pythonCommand) {
 
     if (message.type === 'registration') {
       logger.info(`Registered with ID: ${message.clientId}`);
+      worker.clientId = message.clientId;
       mainWindow.webContents.send('dependency-status', {
-        message: `Registered with Node server, Client ID: ${message.clientId}`,
+        message: `Registered with Node server, Client ID: ${message.clientId}, slots: ${message.capacity}`,
         type: 'success'
       });
+      await flushOutbox(worker);
     } else if (message.type === 'run-test') {
+      // Tests for different slots run concurrently; each gets its own directory
       const testCase = message.testCase;
-      logger.info(`Running test case: ${testCase.name}`);
+      worker.running.set(message.jobId, {
+        jobId: message.jobId,
+        slot: message.slot,
+        name: testCase.name,
+        runId: testCase.runId,
+        browser: testCase.browser
+      });
+      logger.info(`Running test case: ${testCase.name} in slot ${message.slot}`);
       mainWindow.webContents.send('dependency-status', {
-        message: `Running test case: ${testCase.name}`,
+        message: `Running test case: ${testCase.name} (slot ${message.slot})`,
         type: 'info'
       });
 
-      const testDir = path.join(__dirname, 'test_' + Date.now());
-      await fs.mkdir(testDir, { recursive: true });
-      const testFilePath = path.join(testDir, testCase.name);
-      await fs.writeFile(testFilePath, testCase.content);
-      logger.info(`Test file saved at: ${testFilePath}`);
-
-      const report = await runTestCase(testCase, testFilePath);
-      report.screenshots = report.screenshots || {};
-      
+      // Aborted when the hub cancels the job; the watchdog then stops the test
+      const controller = new AbortController();
+      worker.cancellers.set(message.jobId, controller);
+      let staged = null;
+      let report;
       try {
-        await fs.rm(testDir, { recursive: true, force: true });
-        logger.info(`Cleaned up test directory: ${testDir}`);
+        staged = await takePrefetched(worker, message.jobId) || await stageTestCase(worker, testCase, false);
+        report = await runTestCase(testCase, staged.testFilePath, {
+          slot: message.slot,
+          environment: worker.environment,
+          workspace: staged.workspace,
+          signal: controller.signal
+        });
       } catch (err) {
-        logger.error(`Error cleaning up test directory: ${err.message}`);
+        // Still reported, so the hub frees the slot and the run gets a result for the job
+        logger.error(`Failed to run test case ${testCase.name}: ${err.message}`);
+        if (staged && staged.workspace) {
+          await discardWorkspace(staged.workspace);
+        }
+        report = {
+          name: testCase.name,
+          runId: testCase.runId || null,
+          status: 'failed',
+          error: err.message,
+          framework: testCase.framework,
+          browser: testCase.browser,
+          dataset: testCase.dataset || null,
+          output: '',
+          steps: [{ step: `Prepare ${testCase.framework} test file`, status: 'failed', message: err.message }]
+        };
+      } finally {
+        worker.cancellers.delete(message.jobId);
+        worker.running.delete(message.jobId);
+        if (staged) {
+          await removeStaged(staged);
+        }
       }
+      report.screenshots = report.screenshots || {};
 
-      logger.info('Test report saved locally');
-      ws.send(JSON.stringify({
+      // Send on the current connection, which may have been re-established meanwhile
+      const sent = await sendResult(worker, {
         type: 'test-result',
         result: report,
-        clientId: message.clientId
-      }));
-      logger.info('Test report sent to Node server');
+        runId: testCase.runId,
+        jobId: message.jobId,
+        slot: message.slot
+      });
+      logger.info(sent ? 'Test report sent to Node server' : 'Hub unreachable, test report held until reconnected');
       mainWindow.webContents.send('dependency-status', {
         message: `Test case ${testCase.name} completed with status: ${report.status}`,
         type: report.status === 'passed' ? 'success' : 'error'
       });
+    } else if (message.type === 'prefetch-test') {
+      // The hub's lookahead: this test is next in the queue, prepare it while the slots are busy
+      prefetchTest(worker, message.jobId, message.testCase);
+    } else if (message.type === 'prefetch-cancel') {
+      await discardPrefetched(worker, message.jobId, 'the hub sent it to another worker');
+    } else if (message.type === 'cancel-test') {
+      const controller = worker.cancellers.get(message.jobId);
+      if (controller) {
+        logger.info(`Cancelling job ${message.jobId}: ${message.reason || 'cancelled by the hub'}`);
+        controller.abort();
+      }
     }
   });
 
@@ -213,7 +326,7 @@ async function connectWebSocket(mainWindow, pythonCommand) {
       message: 'WebSocket connection closed, attempting to reconnect...',
       type: 'info'
     });
-    setTimeout(() => connectWebSocket(mainWindow, pythonCommand), 5000);
+    setTimeout(() => connectWebSocket(mainWindow, worker), 5000);
   });
 }
 
@@ -222,16 +335,40 @@ app.whenReady().then(async () => {
   await ensureLogsDir();
   const mainWindow = createWindow();
 
+  // Register with the hub straight away; capabilities follow once the environment is known
+  const worker = {
+    environment: null,
+    probeError: null,
+    ws: null,
+    clientId: null,
+    running: new Map(),
+    // jobId -> AbortController of each running test
+    cancellers: new Map(),
+    // jobId -> { staged, timer } for tests announced by the hub but not sent yet
+    prefetched: new Map(),
+    outbox: [],
+    outboxPath: path.join(app.getPath('userData'), 'outbox.json')
+  };
+  await loadOutbox(worker);
+  connectWebSocket(mainWindow, worker);
+
   try {
-    const pythonCommand = await checkAndInstallDependencies(mainWindow);
-    await connectWebSocket(mainWindow, pythonCommand);
+    const cachePath = path.join(app.getPath('userData'), 'env-fingerprint.json');
+    worker.environment = await checkAndInstallDependencies(mainWindow, cachePath);
   } catch (err) {
+    // Tests then run with the python on PATH; the error is shown with the worker on the hub
+    worker.probeError = err.message;
     logger.error(`Failed to initialize: ${err.message}`);
     mainWindow.webContents.send('dependency-status', {
       message: `Initialization failed: ${err.message}`,
       type: 'error'
     });
   }
+  const capabilities = currentCapabilities(worker);
+  logger.info(`Worker capabilities: ${JSON.stringify(capabilities)}, slots: ${WORKER_SLOTS}`);
+  if (worker.ws && worker.ws.readyState === WebSocket.OPEN) {
+    worker.ws.send(JSON.stringify({ type: 'update-capabilities', capabilities }));
+  }
 
   app.on('activate', () => {
     if (BrowserWindow.getAllWindows().length === 0) {
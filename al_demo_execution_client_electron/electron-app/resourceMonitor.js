@@ -0,0 +1,280 @@
+const winston = require('winston');
+const fs = require('fs').promises;
+const { execFile, execFileSync } = require('child_process');
+
+// Logger setup
+const logger = winston.createLogger({
+    level: 'info',
+    format: winston.format.combine(
+        winston.format.timestamp(),
+        winston.format.printf(({ timestamp, level, message }) => `${timestamp} ${level}: ${message}`)
+    ),
+    transports: [
+        new winston.transports.File({ filename: 'logs/resourceMonitor.log' }),
+        new winston.transports.Console()
+    ]
+});
+
+// One /proc scan per interval serves every running test; processes that start and exit
+// between two scans are not seen
+const SAMPLE_INTERVAL_MS = parseInt(process.env.RESOURCE_SAMPLE_INTERVAL_MS, 10) || 500;
+// Orphans get SIGTERM first and SIGKILL if they are still alive after this long
+const REAP_GRACE_MS = 2000;
+
+const SUPPORTED = process.platform === 'linux';
+// Where /proc is not available the tree is killed by the platform: taskkill /T on
+// Windows, and elsewhere (macOS) through the process group each test leads (spawn
+// test processes with these options)
+const SPAWN_OPTIONS = SUPPORTED || process.platform === 'win32' ? {} : { detached: true };
+
+function getconf(name, fallback) {
+    try {
+        return parseInt(execFileSync('getconf', [name]).toString(), 10) || fallback;
+    } catch (err) {
+        return fallback;
+    }
+}
+
+const CLOCK_TICKS = SUPPORTED ? getconf('CLK_TCK', 100) : 100;
+const PAGE_SIZE = SUPPORTED ? getconf('PAGESIZE', 4096) : 4096;
+
+const monitors = new Set();
+let timer = null;
+
+// /proc/<pid>/stat: the command name is in parentheses and may contain spaces, so fields
+// are counted from the closing one (state is field 3, ppid 4, utime 14, stime 15,
+// starttime 22, rss 24)
+function parseStat(pid, text) {
+    const close = text.lastIndexOf(')');
+    const fields = text.slice(close + 2).split(' ');
+    return {
+        pid,
+        name: text.slice(text.indexOf('(') + 1, close),
+        ppid: parseInt(fields[1], 10),
+        cpuTicks: parseInt(fields[11], 10) + parseInt(fields[12], 10),
+        startTime: fields[19],
+        rssBytes: parseInt(fields[21], 10) * PAGE_SIZE
+    };
+}
+
+async function readProcesses() {
+    const processes = new Map();
+    const entries = (await fs.readdir('/proc')).filter((entry) => /^\d+$/.test(entry));
+    await Promise.all(entries.map(async (entry) => {
+        try {
+            processes.set(Number(entry), parseStat(Number(entry), await fs.readFile(`/proc/${entry}/stat`, 'utf8')));
+        } catch (err) {
+            // Exited between the directory listing and the read
+        }
+    }));
+    return processes;
+}
+
+async function countFds(pid) {
+    try {
+        return (await fs.readdir(`/proc/${pid}/fd`)).length;
+    } catch (err) {
+        return 0;
+    }
+}
+
+// Every process under the given roots
+function collectTree(processes, roots) {
+    const children = new Map();
+    for (const proc of processes.values()) {
+        if (!children.has(proc.ppid)) {
+            children.set(proc.ppid, []);
+        }
+        children.get(proc.ppid).push(proc);
+    }
+    const tree = new Map();
+    const stack = roots.map((pid) => processes.get(pid));
+    while (stack.length > 0) {
+        const proc = stack.pop();
+        if (!tree.has(proc.pid)) {
+            tree.set(proc.pid, proc);
+            stack.push(...(children.get(proc.pid) || []));
+        }
+    }
+    return [...tree.values()];
+}
+
+async function isAlive(pid, startTime) {
+    try {
+        return parseStat(pid, await fs.readFile(`/proc/${pid}/stat`, 'utf8')).startTime === startTime;
+    } catch (err) {
+        return false;
+    }
+}
+
+function signal(pid, name) {
+    try {
+        process.kill(pid, name);
+    } catch (err) {
+        // Already gone
+    }
+}
+
+// Terminate orphans; returns the pids that ignored SIGTERM and had to be killed
+async function reap(orphans) {
+    orphans.forEach((orphan) => signal(orphan.pid, 'SIGTERM'));
+    await new Promise((resolve) => setTimeout(resolve, REAP_GRACE_MS));
+    const stubborn = [];
+    for (const orphan of orphans) {
+        if (await isAlive(orphan.pid, orphan.startTime)) {
+            signal(orphan.pid, 'SIGKILL');
+            stubborn.push(orphan.pid);
+        }
+    }
+    return stubborn;
+}
+
+// Samples the process tree of one test process (python/robot -> driver -> browser).
+// Processes stay in the tree after their parent exits, so browsers left behind by a
+// driver that died are still accounted for, and reported as orphans at the end.
+class ProcessTreeMonitor {
+    constructor(rootPid) {
+        this.rootPid = rootPid;
+        // Every process seen in the tree: { name, startTime, cpuTicks, peakRssBytes }
+        this.seen = new Map();
+        this.peakRssBytes = 0;
+        this.peakProcesses = 0;
+        this.peakFds = 0;
+        this.samples = 0;
+    }
+
+    tree(processes) {
+        const roots = [this.rootPid, ...this.seen.keys()].filter((pid) => {
+            const proc = processes.get(pid);
+            const known = this.seen.get(pid);
+            return proc && (!known || known.startTime === proc.startTime);
+        });
+        return collectTree(processes, roots);
+    }
+
+    async sample(processes) {
+        const tree = this.tree(processes);
+        const fds = await Promise.all(tree.map((proc) => countFds(proc.pid)));
+        let rssBytes = 0;
+        for (const proc of tree) {
+            const known = this.seen.get(proc.pid);
+            this.seen.set(proc.pid, {
+                name: proc.name,
+                startTime: proc.startTime,
+                cpuTicks: proc.cpuTicks,
+                peakRssBytes: Math.max(known ? known.peakRssBytes : 0, proc.rssBytes)
+            });
+            rssBytes += proc.rssBytes;
+        }
+        this.peakRssBytes = Math.max(this.peakRssBytes, rssBytes);
+        this.peakProcesses = Math.max(this.peakProcesses, tree.length);
+        this.peakFds = Math.max(this.peakFds, fds.reduce((total, count) => total + count, 0));
+        this.samples++;
+        return tree;
+    }
+
+    // SIGKILL the test process and everything under it; returns how many processes were signalled
+    async kill() {
+        let tree = [];
+        try {
+            tree = this.tree(await readProcesses());
+        } catch (err) {
+            logger.error(`Error reading the process tree of ${this.rootPid}: ${err.message}`);
+        }
+        signal(this.rootPid, 'SIGKILL');
+        tree.forEach((proc) => signal(proc.pid, 'SIGKILL'));
+        logger.warn(`Killed process tree of ${this.rootPid}: ${tree.map((proc) => `${proc.name} (${proc.pid})`).join(', ')}`);
+        return Math.max(tree.length, 1);
+    }
+
+    // Call once the test process has exited: whatever is left of its tree is orphaned
+    async stop() {
+        monitors.delete(this);
+        let orphans = [];
+        let forceKilled = [];
+        try {
+            orphans = await this.sample(await readProcesses());
+            if (orphans.length > 0) {
+                logger.warn(`Test process ${this.rootPid} left ${orphans.length} processes behind: ` +
+                    orphans.map((proc) => `${proc.name} (${proc.pid})`).join(', '));
+                forceKilled = await reap(orphans);
+            }
+        } catch (err) {
+            logger.error(`Error checking for orphans of ${this.rootPid}: ${err.message}`);
+        }
+
+        const byName = {};
+        let cpuTicks = 0;
+        for (const proc of this.seen.values()) {
+            const entry = byName[proc.name] || (byName[proc.name] = { count: 0, cpuMs: 0, peakRssBytes: 0 });
+            entry.count++;
+            entry.cpuMs += Math.round(proc.cpuTicks * 1000 / CLOCK_TICKS);
+            entry.peakRssBytes = Math.max(entry.peakRssBytes, proc.peakRssBytes);
+            cpuTicks += proc.cpuTicks;
+        }
+        return {
+            cpuMs: Math.round(cpuTicks * 1000 / CLOCK_TICKS),
+            peakRssBytes: this.peakRssBytes,
+            peakProcesses: this.peakProcesses,
+            peakFds: this.peakFds,
+            samples: this.samples,
+            processes: byName,
+            orphans: orphans.map((proc) => ({ pid: proc.pid, name: proc.name, rssBytes: proc.rssBytes })),
+            // Orphans still alive after SIGTERM and the grace period were killed with SIGKILL
+            forceKilled
+        };
+    }
+}
+
+function tick() {
+    readProcesses()
+        .then((processes) => Promise.all([...monitors].map((monitor) => monitor.sample(processes))))
+        .catch((err) => logger.error(`Error sampling processes: ${err.message}`))
+        .finally(() => {
+            timer = monitors.size > 0 ? setTimeout(tick, SAMPLE_INTERVAL_MS) : null;
+            if (timer) {
+                timer.unref();
+            }
+        });
+}
+
+// Kill a test process and its children without /proc
+function killTreeByPlatform(pid) {
+    if (process.platform === 'win32') {
+        return new Promise((resolve) => {
+            execFile('taskkill', ['/pid', String(pid), '/T', '/F'], (err) => {
+                if (err) {
+                    // Exits non-zero when the process is already gone
+                    logger.warn(`taskkill of process tree ${pid} failed: ${err.message}`);
+                } else {
+                    logger.warn(`Killed process tree of ${pid}`);
+                }
+                resolve(1);
+            });
+        });
+    }
+    signal(-pid, 'SIGKILL');
+    signal(pid, 'SIGKILL');
+    logger.warn(`Killed process ${pid} and its process group`);
+    return Promise.resolve(1);
+}
+
+// Start sampling the tree of a spawned test process. stop() resolves with its resource
+// summary, or null where /proc is not available; kill() kills the whole tree.
+function monitorProcessTree(pid) {
+    if (!SUPPORTED || !pid) {
+        return {
+            stop: async () => null,
+            kill: async () => (pid ? killTreeByPlatform(pid) : 0)
+        };
+    }
+    const monitor = new ProcessTreeMonitor(pid);
+    monitors.add(monitor);
+    if (!timer) {
+        timer = setTimeout(tick, 0);
+        timer.unref();
+    }
+    return monitor;
+}
+
+module.exports = { monitorProcessTree, SPAWN_OPTIONS };
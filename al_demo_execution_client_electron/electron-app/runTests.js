@@ -1,7 +1,9 @@
 const winston = require('winston');
 const fs = require('fs').promises;
+const os = require('os');
 const path = require('path');
 const { spawn } = require('child_process');
+const { monitorProcessTree, SPAWN_OPTIONS } = require('./resourceMonitor');
 
 // Logger setup
 const logger = winston.createLogger({
@@ -16,162 +18,443 @@ const logger = winston.createLogger({
     ]
 });
 
-async function runTestCase(testCase, testFilePath) {
-    logger.info(`Starting test case: ${testCase.name} with framework: ${testCase.framework} and browser: ${testCase.browser}`);
+const SCREENSHOT_FILES = [
+    'before_login.png', 'after_login.png', 'error.png',
+    'divisions_page.png', 'edit_page.png', 'after_update.png',
+    'after_go_back.png', 'users_page.png', 'after_logout.png',
+    'after_first_pagination.png', 'after_second_pagination.png'
+];
+
+// Used when the test case carries no retry policy: a single attempt
+const DEFAULT_RETRY_POLICY = {
+    maxAttempts: 1,
+    backoffMs: 2000,
+    retryOn: ['TimeoutException', 'StaleElementReferenceException']
+};
+
+// Errors kept per attempt in the report are truncated to this many characters
+const ATTEMPT_ERROR_LIMIT = 2000;
+
+// A test past its deadline (or cancelled) gets SIGTERM first, so it can save its error
+// screenshot and profiles, and its whole process tree is killed if it is still running
+// this much later
+const WATCHDOG_KILL_GRACE_MS = parseInt(process.env.WATCHDOG_KILL_GRACE_MS, 10) || 10000;
+
+function normalizeRetryPolicy(policy) {
+    const merged = { ...DEFAULT_RETRY_POLICY, ...(policy || {}) };
+    return {
+        maxAttempts: Math.max(1, parseInt(merged.maxAttempts, 10) || 1),
+        backoffMs: Math.max(0, parseInt(merged.backoffMs, 10) || 0),
+        retryOn: Array.isArray(merged.retryOn) ? merged.retryOn : DEFAULT_RETRY_POLICY.retryOn
+    };
+}
+
+// Return the retry-on error class found in a failed attempt's output, or null if it is not transient
+function matchRetryReason(policy, result) {
+    const text = `${result.error || ''}\n${result.output || ''}`;
+    return policy.retryOn.find((errorClass) => text.includes(errorClass)) || null;
+}
+
+// Browser disk caches shared by the tests run in the same slot when the network policy
+// enables caching; one directory per slot of this worker process, since a cache is never
+// used by two browsers at once and other workers on the host have slots of their own.
+// The hub does not reuse a slot until its test has exited, cancelled or not.
+const CACHE_ROOT = path.join(os.tmpdir(), 'aut-disk-cache');
+
+// Profiles written by the support helpers: locator timings (aut_support / locator_listener),
+// page-load timings (network_policy), per-step performance metrics (perf_metrics) and
+// the browser state saved at a shared prefix's checkpoint (checkpoints)
+async function readProfile(testDir, fileName, fallback) {
+    const profilePath = path.join(testDir, fileName);
+    try {
+        const profile = JSON.parse(await fs.readFile(profilePath, 'utf8'));
+        await fs.rm(profilePath, { force: true });
+        return profile;
+    } catch (err) {
+        return fallback;
+    }
+}
+
+// Started ahead of a prefetched test: imports the test framework, then waits for one line
+// on stdin with the environment variables only known once the test runs (its slot's cache
+// directory) and runs the test as `python <test> <browser>` or `python -m robot ...` would.
+// An empty stdin means the test was sent elsewhere and the interpreter just exits.
+const WARM_BOOTSTRAP = `
+import json, os, runpy, sys
+framework, argv = sys.argv[1], sys.argv[2:]
+try:
+    if framework == 'Robot':
+        import robot
+    else:
+        import selenium.webdriver
+except ImportError:
+    pass
+line = sys.stdin.readline()
+if not line.strip():
+    sys.exit(0)
+os.environ.update(json.loads(line))
+if framework == 'Robot':
+    from robot import run_cli
+    run_cli(argv)
+else:
+    sys.argv = argv
+    runpy.run_path(argv[0], run_name='__main__')
+`;
+
+// Run the test process once and collect its output and screenshots. Screenshots are
+// removed after reading so a retry in the same directory never reports stale ones.
+// warm is an interpreter started by prepareTestCase, with the variables to start it with.
+// The watchdog stops the test after timeoutMs, or when signal is aborted; the result
+// then carries stopReason ('timeout' or 'cancelled') and whatever artifacts were written.
+function executeAttempt(command, args, testDir, env, warm = null, watchdog = {}) {
+    return new Promise((resolve) => {
+        const testProcess = warm ? warm.process : spawn(command, args, { cwd: testDir, env, ...SPAWN_OPTIONS });
+        if (warm) {
+            // A broken pipe shows up as the process's own exit status
+            testProcess.stdin.on('error', (err) => logger.error(`Error starting warm ${command} process: ${err.message}`));
+            testProcess.stdin.end(`${JSON.stringify(warm.env)}\n`);
+        }
+        // CPU, memory, process and file descriptor usage of the test's whole process tree.
+        // Whatever is left of the tree when the test process exits is reaped right away,
+        // which also releases stdout/stderr if a leftover browser inherited them.
+        const monitor = monitorProcessTree(testProcess.pid);
+        let resourcesReady = null;
+        let stopReason = null;
+        let killTimer = null;
+        const stopTest = (reason) => {
+            if (stopReason || testProcess.exitCode !== null || testProcess.signalCode !== null) {
+                return;
+            }
+            stopReason = reason;
+            logger.warn(`Stopping ${command} process ${testProcess.pid}: ${reason}`);
+            testProcess.kill('SIGTERM');
+            killTimer = setTimeout(() => monitor.kill(), WATCHDOG_KILL_GRACE_MS);
+        };
+        const timeoutTimer = watchdog.timeoutMs != null ? setTimeout(() => stopTest('timeout'), Math.max(0, watchdog.timeoutMs)) : null;
+        const onAbort = () => stopTest('cancelled');
+        if (watchdog.signal) {
+            watchdog.signal.addEventListener('abort', onAbort, { once: true });
+            if (watchdog.signal.aborted) {
+                onAbort();
+            }
+        }
+        testProcess.on('exit', () => {
+            clearTimeout(timeoutTimer);
+            clearTimeout(killTimer);
+            if (watchdog.signal) {
+                watchdog.signal.removeEventListener('abort', onAbort);
+            }
+            resourcesReady = monitor.stop();
+        });
+        let stdout = '';
+        let stderr = '';
+
+        testProcess.stdout.on('data', (data) => {
+            const output = data.toString();
+            stdout += output;
+            logger.info(`${command} stdout: ${output}`);
+        });
+
+        testProcess.stderr.on('data', (data) => {
+            const error = data.toString();
+            stderr += error;
+            logger.error(`${command} stderr: ${error}`);
+        });
+
+        testProcess.on('error', (err) => {
+            logger.error(`Failed to start ${command} process: ${err.message}`);
+            clearTimeout(timeoutTimer);
+            resourcesReady = resourcesReady || monitor.stop();
+            resolve({
+                status: 'failed',
+                error: `Failed to start ${command} process: ${err.message}`,
+                output: stdout,
+                screenshots: {}
+            });
+        });
+
+        testProcess.on('close', (code) => {
+            logger.info(`${command} process exited with code ${code}`);
+
+            // Check for screenshots in the temp directory. With the on-failure policy the
+            // test writes none when it passes; any it wrote anyway are dropped unread.
+            const keepScreenshots = code !== 0 || env.AUT_SCREENSHOT_POLICY !== 'on-failure';
+            const screenshots = {};
+            Promise.all(SCREENSHOT_FILES.map(async (file) => {
+                try {
+                    const filePath = path.join(testDir, file);
+                    const exists = await fs.access(filePath).then(() => true).catch(() => false);
+                    if (exists && keepScreenshots) {
+                        logger.info(`Found screenshot: ${file}`);
+                        const data = await fs.readFile(filePath);
+                        screenshots[file] = data.toString('base64');
+                        await fs.rm(filePath, { force: true });
+                    } else if (exists) {
+                        await fs.rm(filePath, { force: true });
+                    }
+                } catch (err) {
+                    logger.error(`Error reading screenshot ${file}: ${err.message}`);
+                }
+            })).then(() => Promise.all([
+                readProfile(testDir, 'locator_profile.json', []),
+                readProfile(testDir, 'network_profile.json', null),
+                readProfile(testDir, 'perf_metrics.json', null),
+                readProfile(testDir, 'checkpoint_state.json', null),
+                resourcesReady || monitor.stop()
+            ])).then(([locatorProfile, networkProfile, perfMetrics, checkpointState, resources]) => {
+                resolve({
+                    status: code === 0 && !stopReason ? 'passed' : 'failed',
+                    error: stderr || (code !== 0 ? `Process exited with code ${code}` : null),
+                    stopReason,
+                    output: stdout,
+                    screenshots,
+                    locatorProfile,
+                    networkProfile,
+                    perfMetrics,
+                    checkpointState,
+                    resources
+                });
+            });
+        });
+    });
+}
+
+// Validate the test case and set up its temp directory: test and support files, browser
+// profile directory and environment. With options.warm the interpreter is started as
+// well, so a prefetched test only has to be told to go.
+async function prepareTestCase(testCase, testFilePath, options = {}) {
+    // Normalize browser name to lowercase for consistency
+    const browser = testCase.browser ? testCase.browser.toLowerCase() : 'chrome';
+    const validBrowsers = ['chrome', 'firefox', 'edge'];
+    if (!validBrowsers.includes(browser)) {
+        throw new Error(`Invalid browser specified: ${browser}. Supported browsers: ${validBrowsers.join(', ')}`);
+    }
+
+    // Determine the command based on the framework. The interpreter comes from the
+    // worker's cached environment fingerprint, so no per-test version probe is needed
+    const command = options.environment ? options.environment.interpreterPath : 'python';
+    // Shared locator registry and helpers, written to support/ next to the test
+    const supportFiles = testCase.supportFiles || {};
+    // Matrix jobs carry dataset params: Robot variables, or TEST_* environment variables
+    const params = testCase.params || {};
+    // The test runs from its copy in the temp directory (the cwd), next to support/
+    const testFileName = path.basename(testFilePath);
+    let scriptArgs;
+    if (testCase.framework === 'Robot') {
+        const variables = Object.entries(params).flatMap(([key, value]) => ['--variable', `${key}:${value}`]);
+        scriptArgs = ['--variable', `BROWSER:${browser}`, ...variables];
+        if (supportFiles['locator_listener.py']) {
+            scriptArgs.push('--pythonpath', 'support', '--listener', path.join('support', 'locator_listener.py'));
+        }
+        scriptArgs.push(testFileName);
+    } else {
+        scriptArgs = [testFileName, browser];
+    }
+    const args = testCase.framework === 'Robot' ? ['-m', 'robot', ...scriptArgs] : scriptArgs;
+
+    // Create a unique temporary directory for the test so concurrent slots never collide
+    const testDir = await fs.mkdtemp(path.join(__dirname, 'temp_test_'));
+    const tempTestPath = path.join(testDir, testFileName);
+
+    // Point the temp directory of the test process at a private directory, so the
+    // browser profiles created by chromedriver/geckodriver are isolated per test
+    const profileDir = path.join(testDir, 'profile');
+    await fs.mkdir(profileDir);
+    const env = {
+        ...process.env,
+        TMPDIR: profileDir,
+        TMP: profileDir,
+        TEMP: profileDir
+    };
+    if (testCase.framework !== 'Robot') {
+        Object.entries(params).forEach(([key, value]) => {
+            env[`TEST_${key}`] = String(value);
+        });
+    }
+    if (testCase.networkPolicy) {
+        env.AUT_NETWORK_POLICY = JSON.stringify(testCase.networkPolicy);
+    }
+    // Which screenshots the test writes (see support/screenshots.py); all of them by default
+    if (testCase.screenshotPolicy) {
+        env.AUT_SCREENSHOT_POLICY = testCase.screenshotPolicy.mode;
+        env.AUT_SCREENSHOT_BUFFER = String(testCase.screenshotPolicy.bufferSize);
+    }
+
+    // Shared-prefix runs: the first test of a group saves its browser state at the
+    // checkpoint, the others start from that state and skip the steps it covers
+    const checkpoint = testCase.checkpoint || {};
+    if (checkpoint.save) {
+        env.AUT_CHECKPOINT_SAVE = checkpoint.save;
+    }
+    if (checkpoint.resume && checkpoint.state) {
+        env.AUT_CHECKPOINT_RESUME = checkpoint.resume.join(',');
+        env.AUT_CHECKPOINT_STATE = path.join(testDir, 'checkpoint_resume.json');
+        await fs.writeFile(env.AUT_CHECKPOINT_STATE, JSON.stringify(checkpoint.state));
+    }
+
+    // Copy the test file and its support files to the temp directory
+    await fs.copyFile(testFilePath, tempTestPath);
+    if (Object.keys(supportFiles).length > 0) {
+        const supportDir = path.join(testDir, 'support');
+        await fs.mkdir(supportDir);
+        await Promise.all(Object.entries(supportFiles).map(([name, content]) =>
+            fs.writeFile(path.join(supportDir, path.basename(name)), content)));
+    }
+
+    let warm = null;
+    if (options.warm) {
+        warm = spawn(command, ['-c', WARM_BOOTSTRAP, testCase.framework, ...scriptArgs], { cwd: testDir, env, ...SPAWN_OPTIONS });
+        // Reported when the test runs; a failed spawn just means it starts cold
+        warm.on('error', (err) => logger.error(`Failed to start warm ${command} process: ${err.message}`));
+    }
+    logger.info(`Prepared ${testCase.name} in ${testDir}${warm ? ` with warm interpreter ${warm.pid}` : ''}`);
+    return { testDir, browser, command, args, env, warm };
+}
+
+// Release a prepared workspace whose test will not run here
+async function discardWorkspace(workspace) {
+    if (workspace.warm && workspace.warm.pid && workspace.warm.exitCode === null && workspace.warm.signalCode === null) {
+        workspace.warm.stdin.on('error', () => {});
+        workspace.warm.stdin.end();
+    }
+    try {
+        await fs.rm(workspace.testDir, { recursive: true, force: true });
+    } catch (err) {
+        logger.error(`Error cleaning up temp directory: ${err.message}`);
+    }
+}
+
+// How long the next attempt may run: the per-test timeout, capped by the run's deadline
+function attemptTimeout(testCase) {
+    const limits = [];
+    if (testCase.timeoutMs) {
+        limits.push(testCase.timeoutMs);
+    }
+    if (testCase.deadline) {
+        limits.push(testCase.deadline - Date.now());
+    }
+    return limits.length > 0 ? Math.max(0, Math.min(...limits)) : null;
+}
+
+function stopMessage(stopReason, testCase) {
+    if (stopReason === 'cancelled') {
+        return 'Test cancelled';
+    }
+    return testCase.deadline && Date.now() >= testCase.deadline
+        ? 'Test stopped at the run deadline'
+        : `Test timed out after ${testCase.timeoutMs}ms`;
+}
+
+// options.signal (an AbortSignal) cancels the test; the running attempt is stopped by its watchdog
+async function runTestCase(testCase, testFilePath, options = {}) {
+    logger.info(`Starting test case: ${testCase.name} with framework: ${testCase.framework} and browser: ${testCase.browser} in slot ${options.slot}`);
     let report = {
         name: testCase.name,
+        runId: testCase.runId || null,
         status: 'failed',
         error: null,
         framework: testCase.framework,
         browser: testCase.browser,
+        dataset: testCase.dataset || null,
         output: '',
         screenshots: {},
         steps: []
     };
 
     try {
-        // Normalize browser name to lowercase for consistency
-        const browser = testCase.browser ? testCase.browser.toLowerCase() : 'chrome';
-        const validBrowsers = ['chrome', 'firefox', 'edge'];
-        if (!validBrowsers.includes(browser)) {
-            throw new Error(`Invalid browser specified: ${browser}. Supported browsers: ${validBrowsers.join(', ')}`);
-        }
+        // A prefetched test comes with its workspace ready and usually a warm interpreter
+        const workspace = options.workspace || await prepareTestCase(testCase, testFilePath, options);
+        const { testDir, command, args, env } = workspace;
 
-        // Determine the command based on the framework
-        let command, args;
-        if (testCase.framework === 'Robot') {
-            command = 'robot';
-            args = ['--variable', `BROWSER:${browser}`, testFilePath];
-        } else {
-            command = 'python';
-            args = [testFilePath, browser];
+        // The disk cache is per slot, and the slot is only known now
+        const slotEnv = {};
+        if (testCase.networkPolicy && testCase.networkPolicy.cache) {
+            slotEnv.AUT_CACHE_DIR = path.join(CACHE_ROOT, `${workspace.browser}-${process.pid}-slot${options.slot || 0}`);
+            await fs.mkdir(slotEnv.AUT_CACHE_DIR, { recursive: true });
         }
-
-        // Verify the command exists
-        logger.info(`Checking if ${command} is available`);
-        const versionResult = await new Promise((resolve) => {
-            const versionProcess = spawn(command, ['--version']);
-            let versionOutput = '';
-            versionProcess.stdout.on('data', (data) => {
-                versionOutput += data.toString();
-            });
-            versionProcess.stderr.on('data', (data) => {
-                versionOutput += data.toString();
-            });
-            versionProcess.on('error', (err) => {
-                logger.error(`Failed to start ${command}: ${err.message}`);
-                resolve({
-                    status: 'failed',
-                    error: `Failed to start ${command}: ${err.message}`,
-                    output: versionOutput
-                });
-            });
-            versionProcess.on('close', (code) => {
-                logger.info(`${command} version: ${versionOutput.trim()}, exit code: ${code}`);
-                resolve({
-                    status: code === 0 || (command === 'robot' && code === 251) ? 'success' : 'failed',
-                    output: versionOutput,
-                    exitCode: code
-                });
-            });
-        });
-
-        if (versionResult.status === 'failed') {
-            report.error = versionResult.error;
-            report.steps = [
-                { step: `Check ${command} availability`, status: 'failed', message: versionResult.error }
-            ];
-            throw new Error(versionResult.error);
+        Object.assign(env, slotEnv);
+        let warm = workspace.warm;
+        if (warm && (!warm.pid || warm.exitCode !== null || warm.signalCode !== null)) {
+            logger.warn(`Warm interpreter for ${testCase.name} is not running, starting the test cold`);
+            warm = null;
         }
+        // Cancelled, or dispatched after the run's deadline: nothing to run
+        const stoppedBeforeStart = options.signal && options.signal.aborted ? 'cancelled'
+            : (testCase.deadline && Date.now() >= testCase.deadline ? 'timeout' : null);
+        if (stoppedBeforeStart) {
+            await discardWorkspace(workspace);
+            report.stopReason = stoppedBeforeStart;
+            report.timedOut = stoppedBeforeStart === 'timeout';
+            report.cancelled = stoppedBeforeStart === 'cancelled';
+            report.error = `${stopMessage(stoppedBeforeStart, testCase)} before it started`;
+            report.steps = [{ step: `Execute ${testCase.framework} test file`, status: 'failed', message: report.error }];
+            logger.warn(`Not running ${testCase.name}: ${report.error}`);
+            return report;
+        }
+        logger.info(`Running test from temp directory: ${testDir}${warm ? ` in warm interpreter ${warm.pid}` : ''}`);
+        report.warmStart = Boolean(warm);
 
-        // Create a temporary directory for the test
-        const testDir = path.join(__dirname, 'temp_test_' + Date.now());
-        await fs.mkdir(testDir, { recursive: true });
-        const tempTestPath = path.join(testDir, path.basename(testFilePath));
-
-        // Copy the test file to the temp directory
-        await fs.copyFile(testFilePath, tempTestPath);
-        logger.info(`Running test from temp directory: ${tempTestPath}`);
-
-        // Execute the test file
-        const result = await new Promise((resolve) => {
-            const testProcess = spawn(command, args, { cwd: testDir });
-            let stdout = '';
-            let stderr = '';
-
-            testProcess.stdout.on('data', (data) => {
-                const output = data.toString();
-                stdout += output;
-                logger.info(`${command} stdout: ${output}`);
-            });
-
-            testProcess.stderr.on('data', (data) => {
-                const error = data.toString();
-                stderr += error;
-                logger.error(`${command} stderr: ${error}`);
-            });
+        // Execute the test file. Failures matching the retry policy are retried right away
+        // in the same directory, so the driver caches and browser profile stay warm.
+        const retryPolicy = normalizeRetryPolicy(testCase.retryPolicy);
+        report.attempts = [];
+        let result;
+        let totalDurationMs = 0;
+        for (let attempt = 1; attempt <= retryPolicy.maxAttempts; attempt++) {
+            const attemptStartedAt = Date.now();
+            // Only the first attempt can use the warm interpreter; retries start cold
+            result = await executeAttempt(command, args, testDir, env,
+                attempt === 1 && warm ? { process: warm, env: slotEnv } : null,
+                { timeoutMs: attemptTimeout(testCase), signal: options.signal });
+            const durationMs = Date.now() - attemptStartedAt;
+            totalDurationMs += durationMs;
 
-            testProcess.on('error', (err) => {
-                logger.error(`Failed to start ${command} process: ${err.message}`);
-                resolve({
-                    status: 'failed',
-                    error: `Failed to start ${command} process: ${err.message}`,
-                    output: stdout,
-                    screenshots: {}
-                });
+            const retryReason = result.status === 'failed' ? matchRetryReason(retryPolicy, result) : null;
+            report.attempts.push({
+                attempt,
+                status: result.status,
+                durationMs,
+                peakRssBytes: result.resources ? result.resources.peakRssBytes : null,
+                error: result.error ? result.error.slice(-ATTEMPT_ERROR_LIMIT) : null,
+                stopReason: result.stopReason,
+                retryReason
             });
+            // A test stopped by the watchdog is not retried
+            if (result.status === 'passed' || result.stopReason || !retryReason || attempt === retryPolicy.maxAttempts) {
+                break;
+            }
 
-            testProcess.on('close', (code) => {
-                logger.info(`${command} process exited with code ${code}`);
-
-                // Check for screenshots in the temp directory
-                const screenshots = {};
-                const screenshotFiles = [
-                    'before_login.png', 'after_login.png', 'error.png',
-                    'divisions_page.png', 'edit_page.png', 'after_update.png',
-                    'after_go_back.png', 'users_page.png', 'after_logout.png',
-                    'after_first_pagination.png', 'after_second_pagination.png'
-                ];
-
-                Promise.all(screenshotFiles.map(async (file) => {
-                    try {
-                        const filePath = path.join(testDir, file);
-                        const exists = await fs.access(filePath).then(() => true).catch(() => false);
-                        if (exists) {
-                            logger.info(`Found screenshot: ${file}`);
-                            const data = await fs.readFile(filePath);
-                            screenshots[file] = data.toString('base64');
-                        }
-                    } catch (err) {
-                        logger.error(`Error reading screenshot ${file}: ${err.message}`);
-                    }
-                })).then(async () => {
-                    // Clean up the temp directory
-                    try {
-                        const files = await fs.readdir(testDir);
-                        for (const file of files) {
-                            await fs.unlink(path.join(testDir, file));
-                        }
-                        await fs.rmdir(testDir);
-                        logger.info(`Cleaned up temp directory: ${testDir}`);
-                    } catch (err) {
-                        logger.error(`Error cleaning up temp directory: ${err.message}`);
-                    }
+            const backoffMs = retryPolicy.backoffMs * Math.pow(2, attempt - 1);
+            logger.info(`Attempt ${attempt} of ${testCase.name} failed with ${retryReason}, retrying in ${backoffMs}ms`);
+            await new Promise((resolve) => setTimeout(resolve, backoffMs));
+        }
 
-                    resolve({
-                        status: code === 0 ? 'passed' : 'failed',
-                        error: stderr || (code !== 0 ? `Process exited with code ${code}` : null),
-                        output: stdout,
-                        screenshots
-                    });
-                });
-            });
-        });
+        // Clean up the temp directory
+        try {
+            await fs.rm(testDir, { recursive: true, force: true });
+            logger.info(`Cleaned up temp directory: ${testDir}`);
+        } catch (err) {
+            logger.error(`Error cleaning up temp directory: ${err.message}`);
+        }
 
-        // Update the report with the test results
+        // Update the report with the test results of the last attempt
+        report.durationMs = totalDurationMs;
+        report.flaky = result.status === 'passed' && report.attempts.length > 1;
         report.status = result.status;
         report.output = result.output;
         report.screenshots = result.screenshots;
+        report.locatorProfile = result.locatorProfile;
+        report.network = result.networkProfile;
+        report.perfMetrics = result.perfMetrics;
+        report.checkpointState = result.checkpointState;
+        report.resources = result.resources;
+        if (result.stopReason) {
+            // The screenshots and profiles the test wrote before it was stopped are kept
+            report.stopReason = result.stopReason;
+            report.timedOut = result.stopReason === 'timeout';
+            report.cancelled = result.stopReason === 'cancelled';
+            result.error = `${stopMessage(result.stopReason, testCase)}\n${result.error || ''}`.trim();
+        }
 
         if (result.status === 'passed') {
             report.steps = [
@@ -201,4 +484,4 @@ async function runTestCase(testCase, testFilePath) {
     return report;
 }
 
-module.exports = { runTestCase };
\ No newline at end of file
+module.exports = { runTestCase, prepareTestCase, discardWorkspace };
\ No newline at end of file
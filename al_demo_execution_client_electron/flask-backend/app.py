@@ -1,4 +1,4 @@
-from flask import Flask, jsonify, request
+from flask import Flask, jsonify, request, Response, send_file
 import os
 import json
 from flask_cors import CORS
@@ -6,8 +6,27 @@ import logging
 from logging.handlers import RotatingFileHandler
 from websocket import create_connection
 import time
+import atexit
 import base64
-from datetime import datetime
+import gzip
+import hashlib
+import io
+import queue
+import re
+import socket
+import sqlite3
+import threading
+import uuid
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import visual_diff
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows: the report store is then safe for one backend process only
+    fcntl = None
 
 app = Flask(__name__)
 CORS(app)
@@ -19,83 +38,1304 @@ log_handler.setFormatter(log_formatter)
 app.logger.addHandler(log_handler)
 app.logger.setLevel(logging.INFO)
 
+# Several backend processes can share the hub and the report store. Each registers
+# with its own instance id and receives only the results of the jobs it submitted;
+# the id has to survive restarts so a restarted instance gets its results back and
+# resumes its own runs.
+HUB_URL = os.environ.get('HUB_URL', 'ws://localhost:8080')
+PORT = int(os.environ.get('FLASK_PORT', 5000))
+INSTANCE_ID = os.environ.get('FLASK_INSTANCE_ID') or f"{socket.gethostname()}:{PORT}"
+
 ws = None
-reports_dir = os.path.join(os.path.dirname(__file__), 'reports')
+ws_send_lock = threading.Lock()
+# Messages from the hub are read on one thread and routed to the run waiting on them
+run_result_queues = {}
+run_result_queues_lock = threading.Lock()
+# Latest live worker load pushed by the hub
+workers_snapshot = {"workers": [], "unplaced": 0, "updatedAt": None}
+# Reports, runs and the stores derived from them; put REPORTS_DIR on a shared volume
+# to serve them from every instance
+reports_dir = os.environ.get('REPORTS_DIR') or os.path.join(os.path.dirname(__file__), 'reports')
+locks_dir = os.path.join(reports_dir, 'locks')
+
+class SharedLock:
+    """A thread lock that also holds an exclusive flock on locks/<name>.lock.
+
+    Guards the read-modify-write of a JSON store against the other backend
+    processes sharing the report store as well as against other threads.
+    """
+
+    def __init__(self, name):
+        self.path = os.path.join(locks_dir, f"{name}.lock")
+        self.thread_lock = threading.Lock()
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                os.makedirs(locks_dir, exist_ok=True)
+                self.file = open(self.path, 'a')
+                fcntl.flock(self.file, fcntl.LOCK_EX)
+            except Exception:
+                if self.file is not None:
+                    self.file.close()
+                    self.file = None
+                self.thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+
 screenshots_dir = os.path.join(reports_dir, 'screenshots')
+test_history_path = os.path.join(reports_dir, 'test_history.json')
+test_history_lock = SharedLock('test_history')
+
+# Selection modes accepted by /execute-tests
+RUN_MODES = ('all', 'failed-only', 'changed-only')
+
+# Locator registry and helpers shipped with every test case, and the aggregated
+# per-locator timings reported back by them
+support_files_dir = os.path.join(os.path.dirname(__file__), 'test_cases', 'support')
+locator_stats_path = os.path.join(reports_dir, 'locator_stats.json')
+locator_stats_lock = SharedLock('locator_stats')
+
+# Per-page performance of the application under test, from the steps sampled by
+# support/perf_metrics.py: one point per report and page, capped per page and browser
+perf_trend_path = os.path.join(reports_dir, 'perf_trend.json')
+perf_trend_lock = SharedLock('perf_trend')
+PERF_TREND_MAX_POINTS = int(os.environ.get('PERF_TREND_MAX_POINTS', 200))
+# A page's latest value this far above the median of its earlier points is a regression
+PERF_REGRESSION_RATIO = float(os.environ.get('PERF_REGRESSION_RATIO', 1.25))
+
+# Named test data sets for /execute-matrix, injected into tests as parameters
+datasets_path = os.path.join(os.path.dirname(__file__), 'datasets.json')
+
+# Weight of the newest sample in each test's per-browser duration estimate (EWMA)
+DURATION_EWMA_ALPHA = 0.3
+
+# Screenshots are diffed against approved baselines as reports are ingested
+baseline_store = visual_diff.BaselineStore(os.path.join(reports_dir, 'baselines'))
+visual_diff_executor = ThreadPoolExecutor(max_workers=int(os.environ.get('VISUAL_DIFF_WORKERS', 4)))
+# Worst status first; a report's visualStatus is the worst of its screenshots
+VISUAL_STATUS_ORDER = ('size-mismatch', 'changed', 'error', 'new', 'unchanged', 'match', 'unavailable')
+if not visual_diff.available():
+    app.logger.warning("numpy/Pillow not installed, visual diffing of screenshots is disabled")
+
+# Default retry policy applied by the worker right after a failure; requests may
+# override it with a "retry" object. Only failures whose output mentions one of
+# the retry-on error classes are retried.
+RETRY_MAX_ATTEMPTS = int(os.environ.get('TEST_RETRY_MAX_ATTEMPTS', 2))
+RETRY_BACKOFF_MS = int(os.environ.get('TEST_RETRY_BACKOFF_MS', 2000))
+RETRY_ON = [c.strip() for c in os.environ.get(
+    'TEST_RETRY_ON', 'TimeoutException,StaleElementReferenceException,not visible after'
+).split(',') if c.strip()]
+
+# Deadlines, overridable per run with a "timeouts" object: testMs bounds each attempt of
+# a test and runMs the whole run (0 for none). The worker's watchdog stops a test at
+# either; once the run deadline passes its queued jobs are cancelled, and results of
+# the stopped tests are waited for this much longer before the run gives up on them.
+TEST_TIMEOUT_MS = int(os.environ.get('TEST_TIMEOUT_MS', 600000))
+RUN_TIMEOUT_MS = int(os.environ.get('RUN_TIMEOUT_MS', 7200000))
+RUN_STOP_GRACE_SECONDS = int(os.environ.get('RUN_STOP_GRACE_SECONDS', 30))
+
+# Per-run network shaping on Chromium browsers, requested with a "network" object (or
+# true for these defaults): blocked URL patterns and resource types, a disk cache shared
+# by the tests of a worker slot, and optional throttling. Savings are measured against
+# each test's page-load time in unshaped runs.
+NETWORK_RESOURCE_TYPES = ('image', 'font', 'media')
+NETWORK_BLOCK_RESOURCE_TYPES = [t.strip() for t in os.environ.get(
+    'NETWORK_BLOCK_RESOURCE_TYPES', 'image,font,media'
+).split(',') if t.strip()]
+NETWORK_BLOCK_URLS = [u.strip() for u in os.environ.get(
+    'NETWORK_BLOCK_URLS', '*googletagmanager.com*,*google-analytics.com*,*doubleclick.net*,*facebook.net*,*hotjar.com*'
+).split(',') if u.strip()]
+
+# Which screenshots tests take (support/screenshots.py), per run with a "screenshots"
+# mode or {"mode", "bufferSize"} object: all, only on failure (the last bufferSize
+# steps before it), the first and last, or only when the page changed visibly
+SCREENSHOT_POLICIES = ('all', 'on-failure', 'first-and-last', 'on-visual-change')
+SCREENSHOT_POLICY = os.environ.get('SCREENSHOT_POLICY', 'all')
+SCREENSHOT_BUFFER_SIZE = int(os.environ.get('SCREENSHOT_BUFFER_SIZE', 5))
+
+# Shared-prefix runs ("sharedPrefix": true): tests mark the end of shared navigation
+# with checkpoints (support/checkpoints.py). Jobs on the same browser and dataset whose
+# steps up to a checkpoint are identical form a group: one of them runs in full and
+# saves the browser state there, and the others are sent once it finishes, starting
+# from that state. Steps are compared by the locators, actions and screenshots before
+# the checkpoint, so comments and log lines may differ.
+CHECKPOINT_PATTERNS = {
+    'Selenium': re.compile(r"checkpoint\(driver, '(\w+)'\)"),
+    'Robot': re.compile(r"^[ \t]+Save Checkpoint(?: {2,}|\t+)(\w+)", re.MULTILINE)
+}
+SELENIUM_STEP_PATTERN = re.compile(r"find\(driver, '(\w+)'|\.(click|clear|send_keys|back|refresh)\(([^)]*)\)|'([\w-]+\.png)'")
+
+# Report retention: reports past any hot limit are rolled into gzip'd NDJSON
+# archive segments (one per day); segments past the archive age are dropped. A
+# report's size includes its sidecar output and screenshots, which are deleted
+# when it is archived.
+archive_dir = os.path.join(reports_dir, 'archive')
+archive_index_path = os.path.join(archive_dir, 'index.json')
+archive_lock = SharedLock('archive')
+RETENTION_MAX_AGE_HOURS = float(os.environ.get('REPORT_RETENTION_MAX_AGE_HOURS', 24))
+RETENTION_MAX_PER_TEST = int(os.environ.get('REPORT_RETENTION_MAX_PER_TEST', 20))
+RETENTION_MAX_BYTES = int(os.environ.get('REPORT_RETENTION_MAX_BYTES', 50 * 1024 * 1024))
+ARCHIVE_MAX_AGE_DAYS = float(os.environ.get('REPORT_ARCHIVE_MAX_AGE_DAYS', 90))
+COMPACTION_INTERVAL_SECONDS = float(os.environ.get('REPORT_COMPACTION_INTERVAL_SECONDS', 300))
+# Screenshots and diff images are named <report stem>_<screenshot>, the stem ending in
+# the report's timestamp; they count toward their report's size and go with it
+SCREENSHOT_FILE_PATTERN = re.compile(r'^(report_.*?_\d{8}_\d{6})_')
+
+# Each /execute-tests call is a run; its metadata and report filenames live in runs/<run_id>.json
+runs_dir = os.path.join(reports_dir, 'runs')
+runs_lock = SharedLock('runs')
+# Jobs of a run are journaled as they are queued and completed (runs/<run_id>.journal.ndjson),
+# so runs still marked running when the backend starts are resumed with their unfinished jobs
+RUN_JOURNAL_SUFFIX = '.journal.ndjson'
+
+# Outputs larger than this are kept uncompressed in outputs/<report stem>.txt next to
+# a sparse line index, so /reports/<filename>/output serves a range by seeking into
+# the file instead of loading the whole report
+outputs_dir = os.path.join(reports_dir, 'outputs')
+OUTPUT_SIDECAR_MIN_BYTES = int(os.environ.get('REPORT_OUTPUT_SIDECAR_MIN_BYTES', 64 * 1024))
+# The line index holds the byte offset of every Nth line
+OUTPUT_LINE_INDEX_STRIDE = 1000
+# Page sizes for /reports/<filename>/output, per unit
+OUTPUT_DEFAULT_LIMIT = {"lines": 500, "bytes": 64 * 1024}
+OUTPUT_MAX_LIMIT = {"lines": 20000, "bytes": 4 * 1024 * 1024}
+
+# Full-text index over report names, output, errors and step messages (SQLite FTS5),
+# updated as reports are saved. report_docs holds the filterable metadata and shares
+# its id with the report_text rowid.
+search_index_path = os.path.join(reports_dir, 'index.db')
+search_index_lock = threading.Lock()
+search_index_local = threading.local()
+SEARCH_DEFAULT_LIMIT = 50
+SEARCH_MAX_LIMIT = 500
+# bm25 column weights for name, output, error, steps: errors rank highest
+SEARCH_COLUMN_WEIGHTS = (2.0, 1.0, 4.0, 2.0)
+
+# Reports are saved by a background writer so collecting results never waits on
+# disk. Its queue is bounded: when the writer falls behind, save_report blocks
+# rather than buffering an unbounded number of screenshots in memory.
+REPORT_WRITE_QUEUE_SIZE = int(os.environ.get('REPORT_WRITE_QUEUE_SIZE', 64))
+REPORT_WRITE_BATCH_SIZE = int(os.environ.get('REPORT_WRITE_BATCH_SIZE', 16))
+REPORT_WRITE_FLUSH_TIMEOUT_SECONDS = 60
+report_write_queue = queue.Queue(maxsize=REPORT_WRITE_QUEUE_SIZE)
+# Reports queued or being written, by filename; readers are served these until saved
+pending_report_writes = {}
+report_writes_done = threading.Condition()
+report_writer_lock = threading.Lock()
+report_writer_thread = None
+
+# Change feed behind /reports/changes: saved and archived reports and run status
+# changes, kept in memory. A cursor is "<epoch>:<seq>"; the epoch is new on every
+# start, so cursors from before a restart (or older than the log) ask for a reset.
+CHANGE_LOG_SIZE = int(os.environ.get('REPORT_CHANGE_LOG_SIZE', 1000))
+CHANGES_DEFAULT_WAIT_SECONDS = 25
+CHANGES_MAX_WAIT_SECONDS = 60
+change_log = deque(maxlen=CHANGE_LOG_SIZE)
+change_log_epoch = uuid.uuid4().hex[:12]
+change_log_seq = 0
+change_log_updated = threading.Condition()
+
+# JSON responses at least this large are gzip'd for clients that accept it
+COMPRESS_MIN_BYTES = 1024
 
 def connect_to_node_server():
     global ws
     try:
-        ws = create_connection("ws://localhost:8080")
+        ws = create_connection(HUB_URL)
         app.logger.info("Websocket connected")
-        app.logger.info("Connected to Node server")
-        ws.send(json.dumps({"type": "register-flask"}))
+        app.logger.info(f"Connected to Node server as instance {INSTANCE_ID}")
+        ws.send(json.dumps({"type": "register-flask", "instance": INSTANCE_ID}))
     except Exception as e:
         app.logger.error(f"Failed to connect to Node server: {str(e)}")
 
-def save_report(report):
+def send_to_hub(message):
+    with ws_send_lock:
+        ws.send(json.dumps(message))
+
+def acknowledge_result(job_id):
+    """Tell the hub a result is recorded, so it stops holding it for redelivery."""
+    if not job_id:
+        return
+    try:
+        send_to_hub({"type": "result-ack", "jobId": job_id})
+    except Exception as e:
+        app.logger.error(f"Error acknowledging result of job {job_id}: {str(e)}")
+
+def handle_hub_message(data):
+    global workers_snapshot
+    if data.get('type') == 'test-result':
+        run_id = data.get('runId') or data['result'].get('runId')
+        with run_result_queues_lock:
+            result_queue = run_result_queues.get(run_id)
+        if result_queue is None:
+            run = load_run(run_id) if run_id else None
+            if run is None or run['status'] != 'running':
+                # Nothing will ever collect it; let the hub drop it
+                acknowledge_result(data.get('jobId'))
+            app.logger.warning(f"Ignoring result for {data['result'].get('name')}: no request is waiting on run {run_id}")
+            return
+        result_queue.put(data)
+    elif data.get('type') == 'change':
+        # Published by another instance sharing the report store
+        publish_change(data['change'], relay=False)
+    elif data.get('type') == 'run-cancelled':
+        with run_result_queues_lock:
+            result_queue = run_result_queues.get(data.get('runId'))
+        if result_queue is not None:
+            result_queue.put(data)
+    elif data.get('type') == 'resubmit-jobs':
+        # The hub restarted and only knows these jobs by id
+        with run_result_queues_lock:
+            result_queue = run_result_queues.get(data.get('runId'))
+        if result_queue is not None:
+            result_queue.put(data)
+        else:
+            app.logger.warning(f"No request is waiting on run {data.get('runId')}, letting the hub drop its jobs")
+            for job_id in data.get('jobIds', []):
+                acknowledge_result(job_id)
+    elif data.get('type') == 'workers-update':
+        workers_snapshot = {
+            "workers": data.get('workers', []),
+            "unplaced": data.get('unplaced', 0),
+            "awaitingReconnect": data.get('awaitingReconnect', 0),
+            "updatedAt": datetime.now().isoformat()
+        }
+
+def read_hub_messages():
+    while True:
+        try:
+            if ws is None:
+                raise ConnectionError("Not connected to Node server")
+            message = ws.recv()
+        except Exception as e:
+            app.logger.error(f"Lost connection to Node server: {str(e)}, reconnecting in 5s")
+            time.sleep(5)
+            connect_to_node_server()
+            continue
+
+        try:
+            handle_hub_message(json.loads(message))
+        except Exception as e:
+            app.logger.error(f"Error handling message from Node server: {str(e)}")
+
+def start_ws_reader():
+    thread = threading.Thread(target=read_hub_messages, name='hub-reader', daemon=True)
+    thread.start()
+
+def publish_change(change, relay=True):
+    """Append a change to the feed and wake every client waiting on /reports/changes.
+
+    Changes made here are relayed through the hub to the other instances, so each
+    instance's feed covers the whole shared report store.
+    """
+    global change_log_seq
+    with change_log_updated:
+        change_log_seq += 1
+        change_log.append({**change, "seq": change_log_seq, "at": time.time()})
+        change_log_updated.notify_all()
+    if relay:
+        try:
+            send_to_hub({"type": "change", "change": change})
+        except Exception as e:
+            app.logger.error(f"Error relaying change to other instances: {str(e)}")
+
+def change_cursor(seq):
+    return f"{change_log_epoch}:{seq}"
+
+def report_summary(report):
+    """The fields of a report that the change feed carries; fetch the rest by filename."""
+    return {key: report.get(key) for key in (
+        'name', 'status', 'runId', 'browser', 'framework', 'dataset', 'durationMs', 'flaky', 'visualStatus'
+    ) if key in report}
+
+def save_report(report, tag=None, job_id=None):
+    """Queue a report for the background writer and return its filename, or None on failure.
+
+    Matrix jobs pass a tag (browser and dataset), and every job its jobId, so reports
+    of the same test that finish within the same second, in one run or in concurrent
+    ones, do not overwrite each other. Until the writer has saved it, the report is
+    served from memory by read_report_file.
+    """
     try:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        report_filename = f"report_{report['name']}_{timestamp}.json"
-        report_path = os.path.join(reports_dir, report_filename)
-        
+        # The timestamp stays last; report_timestamp_from_filename reads it from there
+        parts = [report['name'], tag, job_id[:8] if job_id else None, timestamp]
+        report_filename = f"report_{'_'.join(part for part in parts if part)}.json"
+
+        start_report_writer()
+        with report_writes_done:
+            pending_report_writes[report_filename] = report
+        try:
+            report_write_queue.put_nowait((report_filename, report))
+        except queue.Full:
+            # Backpressure: hold the caller until the writer catches up
+            app.logger.warning(f"Report write queue is full, waiting to queue {report_filename}")
+            report_write_queue.put((report_filename, report))
+        return report_filename
+    except Exception as e:
+        app.logger.error(f"Error saving report: {str(e)}")
+        return None
+
+def persist_report(report_filename, report):
+    """Write a report's screenshots, output and report file; return the saved report.
+
+    The queued report is left untouched, since readers are served it until it is saved.
+    """
+    report = dict(report)
+    if not os.path.exists(reports_dir):
+        os.makedirs(reports_dir)
+    
+    if not os.path.exists(screenshots_dir):
+        os.makedirs(screenshots_dir)
+    
+    if 'screenshots' in report:
+        # Prefix screenshots with the report name; every test writes before_login.png etc.
+        report_stem = report_filename[:-len('.json')]
+        screenshots = {}
+        for screenshot_name, screenshot_data in report['screenshots'].items():
+            screenshot_path = os.path.join(screenshots_dir, f"{report_stem}_{screenshot_name}")
+            write_file_atomic(screenshot_path, base64.b64decode(screenshot_data))
+            screenshots[screenshot_name] = screenshot_path
+        report['screenshots'] = screenshots
+    
+        if report['screenshots']:
+            report['visualDiff'] = diff_screenshots(report, report_stem)
+            report['visualStatus'] = min(
+                (d['status'] for d in report['visualDiff'].values()),
+                key=VISUAL_STATUS_ORDER.index
+            )
+
+    report_path = write_report_file(report_filename, store_output(report_filename, report))
+    app.logger.info(f"Test report saved at {report_path}")
+    return report
+
+def write_report_batch(batch):
+    """Persist a batch of queued reports and index them in one transaction."""
+    saved = []
+    for report_filename, report in batch:
+        try:
+            saved.append((report_filename, persist_report(report_filename, report)))
+        except Exception as e:
+            app.logger.error(f"Error saving report {report_filename}: {str(e)}")
+    try:
+        index_reports(saved)
+    except Exception as e:
+        app.logger.error(f"Error indexing {len(saved)} reports: {str(e)}")
+    for report_filename, report in saved:
+        publish_change({
+            "type": "report",
+            "filename": report_filename,
+            "timestamp": report_timestamp_from_filename(report_filename),
+            "data": report_summary(report)
+        })
+
+    with report_writes_done:
+        for report_filename, report in batch:
+            if pending_report_writes.get(report_filename) is report:
+                del pending_report_writes[report_filename]
+        report_writes_done.notify_all()
+
+def run_report_writer():
+    while True:
+        batch = [report_write_queue.get()]
+        while len(batch) < REPORT_WRITE_BATCH_SIZE:
+            try:
+                batch.append(report_write_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            write_report_batch(batch)
+        except Exception as e:
+            app.logger.error(f"Error writing report batch: {str(e)}")
+        finally:
+            for _ in batch:
+                report_write_queue.task_done()
+
+def start_report_writer():
+    """Start the writer thread on first use, flushing the queue at interpreter exit."""
+    global report_writer_thread
+    with report_writer_lock:
+        if report_writer_thread is None:
+            report_writer_thread = threading.Thread(target=run_report_writer, name='report-writer', daemon=True)
+            report_writer_thread.start()
+            atexit.register(flush_report_writes)
+            app.logger.info(f"Report writer started (queue size {REPORT_WRITE_QUEUE_SIZE}, batch size {REPORT_WRITE_BATCH_SIZE})")
+
+def wait_for_report_writes(filenames=None, timeout=None):
+    """Wait until the given reports (default: all queued reports) are saved; False on timeout."""
+    def written():
+        if filenames is None:
+            return not pending_report_writes
+        return not any(filename in pending_report_writes for filename in filenames)
+
+    with report_writes_done:
+        return report_writes_done.wait_for(written, timeout)
+
+def flush_report_writes():
+    if not wait_for_report_writes(timeout=REPORT_WRITE_FLUSH_TIMEOUT_SECONDS):
+        app.logger.error(f"Exiting with {len(pending_report_writes)} reports not yet saved")
+
+def diff_screenshots(report, report_stem):
+    """Compare every screenshot of a report with its baseline, in parallel."""
+    def diff_one(item):
+        screenshot_name, screenshot_path = item
+        diff_path = os.path.join(screenshots_dir, f"{report_stem}_diff_{screenshot_name}")
+        try:
+            return screenshot_name, baseline_store.compare(
+                report['name'], report.get('browser'), screenshot_name, screenshot_path, diff_path)
+        except Exception as e:
+            app.logger.error(f"Error diffing screenshot {screenshot_name} of {report['name']}: {str(e)}")
+            return screenshot_name, {"status": "error", "error": str(e)}
+
+    return dict(visual_diff_executor.map(diff_one, report['screenshots'].items()))
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def load_test_history():
+    if not os.path.exists(test_history_path):
+        return {}
+    try:
+        with open(test_history_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        app.logger.error(f"Error reading test history: {str(e)}")
+        return {}
+
+def record_test_result(test_name, test_hash, status, browser=None, duration_ms=None, attempts=1, page_load_ms=None,
+                       resources=None):
+    """Update the per-test history used to select, order and schedule the next run.
+
+    A test that passed only after a retry counts as a flaky run. page_load_ms is the
+    total page-load time of an unshaped run, the baseline for network savings.
+    resources is the worker's accounting of the test's process tree.
+    """
+    with test_history_lock:
+        history = load_test_history()
+        entry = history.get(test_name, {})
+        now = time.time()
+
+        entry['runs'] = entry.get('runs', 0) + 1
+        entry['retries'] = entry.get('retries', 0) + max(0, attempts - 1)
+        if status == 'passed' and attempts > 1:
+            entry['flakyRuns'] = entry.get('flakyRuns', 0) + 1
+            entry['lastFlakyAt'] = now
+        elif status == 'passed':
+            entry['passedRuns'] = entry.get('passedRuns', 0) + 1
+        else:
+            entry['failedRuns'] = entry.get('failedRuns', 0) + 1
+
+        if entry.get('lastHash') != test_hash:
+            entry['lastChangedAt'] = now
+        entry['lastHash'] = test_hash
+        entry['lastStatus'] = status
+        entry['lastRunAt'] = now
+        if status == 'passed':
+            entry['lastPassedHash'] = test_hash
+        else:
+            entry['lastFailedAt'] = now
+        if browser and duration_ms is not None:
+            durations = entry.setdefault('durations', {})
+            key = browser.lower()
+            previous = durations.get(key)
+            durations[key] = duration_ms if previous is None else (
+                DURATION_EWMA_ALPHA * duration_ms + (1 - DURATION_EWMA_ALPHA) * previous
+            )
+        if browser and page_load_ms is not None:
+            page_loads = entry.setdefault('pageLoadMs', {})
+            key = browser.lower()
+            previous = page_loads.get(key)
+            page_loads[key] = page_load_ms if previous is None else (
+                DURATION_EWMA_ALPHA * page_load_ms + (1 - DURATION_EWMA_ALPHA) * previous
+            )
+        if browser and resources:
+            usage = entry.setdefault('resources', {}).setdefault(browser.lower(), {})
+            for key in ('peakRssBytes', 'cpuMs', 'peakFds'):
+                if resources.get(key) is not None:
+                    previous = usage.get(key)
+                    usage[key] = resources[key] if previous is None else (
+                        DURATION_EWMA_ALPHA * resources[key] + (1 - DURATION_EWMA_ALPHA) * previous
+                    )
+            usage['peakProcesses'] = max(usage.get('peakProcesses', 0), resources.get('peakProcesses') or 0)
+            orphans = resources.get('orphans') or []
+            if orphans:
+                usage['orphanedRuns'] = usage.get('orphanedRuns', 0) + 1
+                usage['orphanedProcesses'] = usage.get('orphanedProcesses', 0) + len(orphans)
+                usage['lastOrphans'] = sorted({orphan['name'] for orphan in orphans})
+                usage['lastOrphanedAt'] = now
+        history[test_name] = entry
+
+        try:
+            if not os.path.exists(reports_dir):
+                os.makedirs(reports_dir)
+            with open(test_history_path, 'w') as f:
+                json.dump(history, f, indent=4)
+        except Exception as e:
+            app.logger.error(f"Error saving test history: {str(e)}")
+
+def retry_policy_from_request(data):
+    retry = data.get('retry') or {}
+    return {
+        "maxAttempts": int(retry.get('maxAttempts', RETRY_MAX_ATTEMPTS)),
+        "backoffMs": int(retry.get('backoffMs', RETRY_BACKOFF_MS)),
+        "retryOn": list(retry.get('retryOn', RETRY_ON))
+    }
+
+def timeouts_from_request(data):
+    timeouts = data.get('timeouts') or {}
+    return {
+        "testMs": max(0, int(timeouts.get('testMs', TEST_TIMEOUT_MS))),
+        "runMs": max(0, int(timeouts.get('runMs', RUN_TIMEOUT_MS)))
+    }
+
+def matrix_from_request(data):
+    """Return the matrix's browsers (lowercased), frameworks and dataset names; TypeError if malformed."""
+    axes = {}
+    for key, default in (('browsers', []), ('frameworks', []), ('datasets', ['default'])):
+        values = data.get(key) or default
+        if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+            raise TypeError(f"{key} must be a list of strings")
+        axes[key] = values
+    return [b.lower() for b in axes['browsers']], axes['frameworks'], axes['datasets']
+
+def network_policy_from_request(data):
+    """Return the run's network policy, or None for unshaped runs; ValueError if invalid."""
+    network = data.get('network')
+    if not network:
+        return None
+    if network is True:
+        network = {}
+    resource_types = [t.lower() for t in network.get('blockResourceTypes', NETWORK_BLOCK_RESOURCE_TYPES)]
+    unknown = [t for t in resource_types if t not in NETWORK_RESOURCE_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown resource types: {', '.join(unknown)}. Supported: {', '.join(NETWORK_RESOURCE_TYPES)}")
+    throttle = network.get('throttle') or None
+    if throttle:
+        throttle = {key: int(throttle[key]) for key in ('latencyMs', 'downloadKbps', 'uploadKbps') if key in throttle}
+    return {
+        "blockUrls": list(network.get('blockUrls', NETWORK_BLOCK_URLS)),
+        "blockResourceTypes": resource_types,
+        "cache": bool(network.get('cache', True)),
+        "throttle": throttle
+    }
+
+def screenshot_policy_from_request(data):
+    """Return the run's screenshot policy, or None when every screenshot is kept; ValueError if invalid."""
+    screenshots = data.get('screenshots') or SCREENSHOT_POLICY
+    if isinstance(screenshots, str):
+        screenshots = {"mode": screenshots}
+    mode = screenshots.get('mode', SCREENSHOT_POLICY)
+    if mode not in SCREENSHOT_POLICIES:
+        raise ValueError(f"Unknown mode: {mode}. Supported modes: {', '.join(SCREENSHOT_POLICIES)}")
+    if mode == 'all':
+        return None
+    return {"mode": mode, "bufferSize": max(1, int(screenshots.get('bufferSize', SCREENSHOT_BUFFER_SIZE)))}
+
+def network_savings(test_name, browser, load_ms):
+    """Compare a shaped run's total page-load time with the test's unshaped average."""
+    baseline = load_test_history().get(test_name, {}).get('pageLoadMs', {}).get((browser or '').lower())
+    if baseline is None:
+        return {"loadMs": load_ms, "baselineLoadMs": None, "savedMs": None}
+    return {
+        "loadMs": load_ms,
+        "baselineLoadMs": round(baseline, 1),
+        "savedMs": round(baseline - load_ms, 1),
+        "savedPercent": round(100 * (baseline - load_ms) / baseline, 1) if baseline else None
+    }
+
+def estimate_duration(history, test_name, browser):
+    """Return the EWMA duration in ms of a test on a browser, or None without history."""
+    if not browser:
+        return None
+    return history.get(test_name, {}).get('durations', {}).get(browser.lower())
+
+def select_and_order_tests(tests, mode, browser=None):
+    """Filter tests for the requested mode and put the most informative ones first.
+
+    Recently failing tests run first, then tests changed since their last pass,
+    then everything else. Each group is ordered longest-first, so the hub's
+    longest-processing-time placement packs the worker slots tightly within it.
+    Each test gets its duration estimate attached for the hub.
+    """
+    history = load_test_history()
+    for test in tests:
+        test['estimatedDurationMs'] = estimate_duration(history, test['name'], browser)
+
+    def is_failing(test):
+        return history.get(test['name'], {}).get('lastStatus') == 'failed'
+
+    def is_changed(test):
+        return history.get(test['name'], {}).get('lastPassedHash') != test['hash']
+
+    if mode == 'failed-only':
+        tests = [t for t in tests if is_failing(t)]
+    elif mode == 'changed-only':
+        tests = [t for t in tests if is_changed(t)]
+
+    # Longest-first placement is only as good as the order tests arrive in, so within a
+    # group the estimate wins over recency: the most recent failure or change no longer
+    # runs first, but the groups still do. Across groups the packing is not optimal.
+    def sort_key(test):
+        group = 0 if is_failing(test) else 1 if is_changed(test) else 2
+        return (group, -(test['estimatedDurationMs'] or 0), test['name'])
+
+    return sorted(tests, key=sort_key)
+
+def run_path(run_id):
+    return os.path.join(runs_dir, f"{run_id}.json")
+
+def load_run(run_id):
+    path = run_path(run_id)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def save_run(run):
+    if not os.path.exists(runs_dir):
+        os.makedirs(runs_dir)
+    tmp_path = run_path(run['runId']) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(run, f)
+    os.replace(tmp_path, run_path(run['runId']))
+
+def create_run(browser, framework, client_id, mode, test_names, matrix=None, network=None, shared_prefix=False,
+               screenshots=None, timeouts=None):
+    run = {
+        "runId": uuid.uuid4().hex,
+        "status": "running",
+        "instance": INSTANCE_ID,
+        "browser": browser,
+        "framework": framework,
+        "clientId": client_id,
+        "mode": mode,
+        "startedAt": datetime.now().isoformat(),
+        "finishedAt": None,
+        "tests": test_names,
+        "reports": [],
+        "passed": 0,
+        "failed": 0
+    }
+    if matrix:
+        run['matrix'] = matrix
+    if network:
+        run['networkPolicy'] = network
+    if screenshots:
+        run['screenshotPolicy'] = screenshots
+    if timeouts:
+        run['timeouts'] = timeouts
+    if shared_prefix:
+        run['sharedPrefix'] = True
+    with runs_lock:
+        save_run(run)
+    publish_change({"type": "run", "runId": run['runId'], "status": run['status']})
+    return run
+
+def add_run_report(run_id, report_filename, result):
+    with runs_lock:
+        run = load_run(run_id)
+        run['reports'].append({
+            "filename": report_filename,
+            "name": result.get('name'),
+            "status": result.get('status'),
+            "browser": result.get('browser'),
+            "dataset": result.get('dataset'),
+            "attempts": len(result.get('attempts') or []) or 1,
+            "flaky": bool(result.get('flaky'))
+        })
+        if result.get('status') == 'passed':
+            run['passed'] += 1
+        else:
+            run['failed'] += 1
+        if result.get('flaky'):
+            run['flaky'] = run.get('flaky', 0) + 1
+        saved_ms = ((result.get('network') or {}).get('savings') or {}).get('savedMs')
+        if saved_ms is not None:
+            run['networkSavedMs'] = round(run.get('networkSavedMs', 0) + saved_ms, 1)
+        save_run(run)
+
+def run_journal_path(run_id):
+    return os.path.join(runs_dir, f"{run_id}{RUN_JOURNAL_SUFFIX}")
+
+def append_run_journal(run_id, events):
+    """Append events to a run's journal and sync them to disk before returning."""
+    if not os.path.exists(runs_dir):
+        os.makedirs(runs_dir)
+    with open(run_journal_path(run_id), 'a') as f:
+        f.write(''.join(json.dumps(event) + '\n' for event in events))
+        f.flush()
+        os.fsync(f.fileno())
+
+def read_run_journal(run_id):
+    path = run_journal_path(run_id)
+    if not os.path.exists(path):
+        return []
+    events = []
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                events.append(json.loads(line))
+            except ValueError:
+                # A torn last line from a crash mid-append
+                app.logger.warning(f"Skipping unreadable line in journal of run {run_id}")
+    return events
+
+def finish_run(run_id, status):
+    with runs_lock:
+        run = load_run(run_id)
+        run['status'] = status
+        run['finishedAt'] = datetime.now().isoformat()
+        save_run(run)
+    publish_change({
+        "type": "run",
+        "runId": run_id,
+        "status": status,
+        "passed": run['passed'],
+        "failed": run['failed']
+    })
+
+def client_accepts_gzip():
+    return request.accept_encodings.quality('gzip') > 0
+
+def encode_report(report):
+    """Gzip the compact /reports/<filename> response body for a report.
+
+    Reports are stored as the exact bytes served to clients, so reads can be
+    streamed from disk without decoding and re-encoding the JSON.
+    """
+    body = json.dumps({"status": "success", "report": report}, separators=(',', ':')) + '\n'
+    return gzip.compress(body.encode('utf-8'))
+
+def decode_report(data):
+    document = json.loads(gzip.decompress(data))
+    # Reports archived before reports were stored as response bodies are bare reports
+    return document['report'] if 'report' in document else document
+
+def report_storage_path(filename):
+    return os.path.join(reports_dir, filename + '.gz')
+
+def write_file_atomic(path, data):
+    """Write data to a temp file and rename it into place, so readers never see a partial file."""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def write_report_file(filename, report):
+    report_path = report_storage_path(filename)
+    write_file_atomic(report_path, encode_report(report))
+    return report_path
+
+def read_report_file(filename, include_output=True):
+    """Return a hot report, or None if it is not in the hot directory.
+
+    Outputs kept in a sidecar file are read back in unless include_output is False.
+    Reports still queued for the writer are returned as received, without screenshots.
+    """
+    with report_writes_done:
+        pending = pending_report_writes.get(filename)
+    if pending is not None:
+        return {**pending, "screenshots": {}, "writePending": True}
+    report_path = report_storage_path(filename)
+    if os.path.exists(report_path):
+        with open(report_path, 'rb') as f:
+            report = decode_report(f.read())
+        if include_output and report.get('outputInfo', {}).get('external'):
+            with open(output_sidecar_path(filename), 'r', encoding='utf-8') as f:
+                report['output'] = f.read()
+        return report
+    # Reports written before compressed storage are plain pretty-printed JSON
+    legacy_path = os.path.join(reports_dir, filename)
+    if os.path.exists(legacy_path):
+        with open(legacy_path, 'r') as f:
+            return json.load(f)
+    return None
+
+def output_sidecar_path(filename):
+    return os.path.join(outputs_dir, filename[:-len('.json')] + '.txt')
+
+def output_line_index_path(filename):
+    return os.path.join(outputs_dir, filename[:-len('.json')] + '.lines.json')
+
+def build_line_index(data):
+    """Count the lines of output bytes and record where every stride-th line starts."""
+    offsets = [0]
+    lines = 0
+    position = 0
+    while True:
+        newline = data.find(b'\n', position)
+        if newline == -1:
+            break
+        lines += 1
+        position = newline + 1
+        if lines % OUTPUT_LINE_INDEX_STRIDE == 0 and position < len(data):
+            offsets.append(position)
+    if position < len(data):
+        lines += 1
+    return {"bytes": len(data), "lines": lines, "stride": OUTPUT_LINE_INDEX_STRIDE, "offsets": offsets}
+
+def store_output(filename, report):
+    """Return the report to store, moving a large output into its sidecar file.
+
+    Every stored report carries outputInfo (size in bytes and lines), so viewers
+    can page through the output without fetching it.
+    """
+    data = (report.get('output') or '').encode('utf-8')
+    line_index = build_line_index(data)
+    info = {"bytes": line_index['bytes'], "lines": line_index['lines'], "external": False}
+    if len(data) < OUTPUT_SIDECAR_MIN_BYTES:
+        return {**report, "outputInfo": info}
+
+    os.makedirs(outputs_dir, exist_ok=True)
+    write_file_atomic(output_sidecar_path(filename), data)
+    write_file_atomic(output_line_index_path(filename), json.dumps(line_index).encode('utf-8'))
+    info['external'] = True
+    stored = {key: value for key, value in report.items() if key != 'output'}
+    stored['outputInfo'] = info
+    return stored
+
+def remove_output_sidecar(filename):
+    for path in (output_sidecar_path(filename), output_line_index_path(filename)):
+        if os.path.exists(path):
+            os.remove(path)
+
+def read_output_range(f, line_index, unit, offset, limit):
+    """Read limit lines or bytes starting at offset from an output file object."""
+    if unit == 'bytes':
+        f.seek(offset)
+        return f.read(limit)
+    stride = line_index['stride']
+    f.seek(line_index['offsets'][min(offset // stride, len(line_index['offsets']) - 1)])
+    for _ in range(offset % stride):
+        f.readline()
+    return b''.join(f.readline() for _ in range(limit))
+
+def report_filename_from_path(path_name):
+    """Map a file in the reports directory to its report filename, or None."""
+    if path_name.endswith('.json.gz'):
+        path_name = path_name[:-len('.gz')]
+    if path_name.startswith('report_') and path_name.endswith('.json'):
+        return path_name
+    return None
+
+def list_report_files():
+    return sorted({
+        filename for filename in map(report_filename_from_path, os.listdir(reports_dir))
+        if filename
+    })
+
+def hot_report_path(filename):
+    report_path = report_storage_path(filename)
+    if os.path.exists(report_path):
+        return report_path
+    return os.path.join(reports_dir, filename)
+
+def report_timestamp_from_filename(filename):
+    # report_<name>_<YYYYMMDD>_<HHMMSS>.json
+    parts = filename.replace('.json', '').split('_')
+    if len(parts) >= 3:
+        return f"{parts[-2]}_{parts[-1]}"
+    return '00000000_000000'
+
+def search_index_connection():
+    """Return this thread's connection to the search index, creating the schema once."""
+    conn = getattr(search_index_local, 'conn', None)
+    if conn is None:
         if not os.path.exists(reports_dir):
             os.makedirs(reports_dir)
-        
-        if not os.path.exists(screenshots_dir):
-            os.makedirs(screenshots_dir)
-        
-        if 'screenshots' in report:
-            for screenshot_name, screenshot_data in report['screenshots'].items():
-                screenshot_path = os.path.join(screenshots_dir, screenshot_name)
-                with open(screenshot_path, 'wb') as f:
-                    f.write(base64.b64decode(screenshot_data))
-                report['screenshots'][screenshot_name] = screenshot_path
-        
-        with open(report_path, 'w') as f:
-            json.dump(report, f, indent=4)
-        
-        app.logger.info(f"Test report saved at {report_path}")
+        conn = sqlite3.connect(search_index_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS report_docs (
+                id INTEGER PRIMARY KEY,
+                filename TEXT UNIQUE NOT NULL,
+                name TEXT,
+                browser TEXT,
+                status TEXT,
+                timestamp TEXT
+            );
+            CREATE INDEX IF NOT EXISTS report_docs_name ON report_docs (name, timestamp);
+            CREATE INDEX IF NOT EXISTS report_docs_timestamp ON report_docs (timestamp);
+            CREATE VIRTUAL TABLE IF NOT EXISTS report_text USING fts5(
+                name, output, error, steps, tokenize = 'unicode61'
+            );
+        """)
+        search_index_local.conn = conn
+    return conn
+
+def unindex_reports_locked(conn, filenames):
+    for filename in filenames:
+        row = conn.execute('SELECT id FROM report_docs WHERE filename = ?', (filename,)).fetchone()
+        if row:
+            conn.execute('DELETE FROM report_text WHERE rowid = ?', row)
+            conn.execute('DELETE FROM report_docs WHERE id = ?', row)
+
+def index_reports(items):
+    """Index (filename, report) pairs in a single transaction."""
+    if not items:
+        return
+    with search_index_lock:
+        conn = search_index_connection()
+        with conn:
+            for filename, report in items:
+                steps = '\n'.join(
+                    f"{step.get('step', '')} {step.get('message') or ''}".strip()
+                    for step in report.get('steps') or []
+                )
+                unindex_reports_locked(conn, [filename])
+                cursor = conn.execute(
+                    'INSERT INTO report_docs (filename, name, browser, status, timestamp) VALUES (?, ?, ?, ?, ?)',
+                    (filename, report.get('name'), (report.get('browser') or '').lower() or None,
+                     report.get('status'), report_timestamp_from_filename(filename))
+                )
+                conn.execute(
+                    'INSERT INTO report_text (rowid, name, output, error, steps) VALUES (?, ?, ?, ?, ?)',
+                    (cursor.lastrowid, report.get('name') or '', report.get('output') or '',
+                     report.get('error') or '', steps)
+                )
+
+def index_report(filename, report):
+    index_reports([(filename, report)])
+
+def unindex_reports(filenames):
+    with search_index_lock:
+        conn = search_index_connection()
+        with conn:
+            unindex_reports_locked(conn, filenames)
+
+def clear_search_index():
+    with search_index_lock:
+        conn = search_index_connection()
+        with conn:
+            conn.execute('DELETE FROM report_text')
+            conn.execute('DELETE FROM report_docs')
+
+def backfill_search_index():
+    """Index hot and archived reports that predate the search index."""
+    with search_index_lock:
+        indexed = {row[0] for row in search_index_connection().execute('SELECT filename FROM report_docs')}
+    count = 0
+    filenames = list_report_files() + list(load_archive_index())
+    for filename in filenames:
+        if filename in indexed:
+            continue
+        try:
+            report = read_report_file(filename) or read_archived_report(filename)
+            if report is not None:
+                index_report(filename, report)
+                count += 1
+        except Exception as e:
+            app.logger.error(f"Error indexing report {filename}: {str(e)}")
+    if count:
+        app.logger.info(f"Indexed {count} existing reports for search")
+
+def start_search_backfill():
+    threading.Thread(target=backfill_search_index, daemon=True).start()
+
+def fts_quote(query):
+    """Turn free text into an FTS5 query matching all of its terms literally."""
+    return ' '.join('"' + term.replace('"', '""') + '"' for term in query.split())
+
+def parse_search_date(value, end_of_day):
+    if not value:
+        return None
+    day = value.replace('-', '')
+    if not re.fullmatch(r'\d{8}', day):
+        raise ValueError(f"Invalid date: {value}. Use YYYY-MM-DD")
+    return f"{day}_235959" if end_of_day else f"{day}_000000"
+
+def search_reports(query, test=None, browser=None, date_from=None, date_to=None, limit=SEARCH_DEFAULT_LIMIT):
+    sql = """
+        SELECT d.filename, d.name, d.browser, d.status, d.timestamp,
+               bm25(report_text, ?, ?, ?, ?) AS score,
+               snippet(report_text, -1, '**', '**', '...', 16) AS snippet
+        FROM report_text JOIN report_docs d ON d.id = report_text.rowid
+        WHERE report_text MATCH ?
+    """
+    filters = []
+    params = []
+    if test:
+        filters.append('d.name = ?')
+        params.append(test)
+    if browser:
+        filters.append('d.browser = ?')
+        params.append(browser.lower())
+    if date_from:
+        filters.append('d.timestamp >= ?')
+        params.append(date_from)
+    if date_to:
+        filters.append('d.timestamp <= ?')
+        params.append(date_to)
+    for condition in filters:
+        sql += f" AND {condition}"
+    sql += " ORDER BY score LIMIT ?"
+
+    conn = search_index_connection()
+    try:
+        rows = conn.execute(sql, (*SEARCH_COLUMN_WEIGHTS, query, *params, limit)).fetchall()
+    except sqlite3.OperationalError:
+        # Not valid FTS5 syntax (e.g. a file name with dots): match the terms literally
+        rows = conn.execute(sql, (*SEARCH_COLUMN_WEIGHTS, fts_quote(query), *params, limit)).fetchall()
+    return [{
+        "filename": filename,
+        "name": name,
+        "browser": browser,
+        "status": status,
+        "timestamp": timestamp,
+        "score": round(-score, 4),
+        "snippet": snippet
+    } for filename, name, browser, status, timestamp, score, snippet in rows]
+
+def load_archive_index():
+    if not os.path.exists(archive_index_path):
+        return {}
+    try:
+        with open(archive_index_path, 'r') as f:
+            return json.load(f)
     except Exception as e:
-        app.logger.error(f"Error saving report: {str(e)}")
+        app.logger.error(f"Error reading archive index: {str(e)}")
+        return {}
+
+def save_archive_index(index):
+    tmp_path = archive_index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, archive_index_path)
+
+def read_archived_member(filename):
+    """Return the stored gzip member for an archived report, or None."""
+    entry = load_archive_index().get(filename)
+    if not entry:
+        return None
+    segment_path = os.path.join(archive_dir, entry['segment'])
+    with open(segment_path, 'rb') as f:
+        f.seek(entry['offset'])
+        return f.read(entry['length'])
+
+def read_archived_report(filename):
+    """Return an archived report, or None if it is not in the archive."""
+    member = read_archived_member(filename)
+    if member is None:
+        return None
+    return decode_report(member)
+
+def select_reports_to_archive(hot_reports):
+    """Pick the hot reports that fall outside the age, per-test and size limits.
+
+    Each report is {"filename", "name", "mtime", "size"}, its size including its
+    sidecar output and screenshots.
+    """
+    now = time.time()
+    selected = set()
+
+    for report in hot_reports:
+        if now - report['mtime'] > RETENTION_MAX_AGE_HOURS * 3600:
+            selected.add(report['filename'])
+
+    by_test = {}
+    for report in hot_reports:
+        by_test.setdefault(report['name'], []).append(report)
+    for reports in by_test.values():
+        reports.sort(key=lambda r: r['mtime'], reverse=True)
+        for report in reports[RETENTION_MAX_PER_TEST:]:
+            selected.add(report['filename'])
+
+    total_bytes = sum(r['size'] for r in hot_reports if r['filename'] not in selected)
+    for report in sorted(hot_reports, key=lambda r: r['mtime']):
+        if total_bytes <= RETENTION_MAX_BYTES:
+            break
+        if report['filename'] not in selected:
+            selected.add(report['filename'])
+            total_bytes -= report['size']
+
+    return selected
+
+def screenshot_files_by_report():
+    """Screenshots and diff images under screenshots/, by the report filename they belong to."""
+    files = {}
+    if os.path.exists(screenshots_dir):
+        for name in os.listdir(screenshots_dir):
+            match = SCREENSHOT_FILE_PATTERN.match(name)
+            if match:
+                files.setdefault(f"{match.group(1)}.json", []).append(os.path.join(screenshots_dir, name))
+    return files
+
+def indexed_report_names():
+    """Test name of every report in the search index, by filename."""
+    try:
+        with search_index_lock:
+            rows = search_index_connection().execute('SELECT filename, name FROM report_docs').fetchall()
+        return dict(rows)
+    except Exception as e:
+        app.logger.error(f"Error reading report names from the search index: {str(e)}")
+        return {}
+
+def archive_member(filename):
+    """The gzip member stored in the archive for a hot report: self-contained, without screenshots."""
+    report_data = read_report_file(filename)
+    if report_data.get('outputInfo', {}).get('external'):
+        report_data['outputInfo'] = {**report_data['outputInfo'], "external": False}
+    # Screenshot files are removed with the hot report; the names are kept
+    if report_data.get('screenshots'):
+        report_data['screenshotsRemoved'] = sorted(report_data['screenshots'])
+        report_data['screenshots'] = {}
+    return report_data, encode_report(report_data)
+
+def compact_reports():
+    """Roll old hot reports into the archive and expire old archive segments.
+
+    Reports are selected from file metadata and the search index; only the ones
+    being archived are read.
+    """
+    with archive_lock:
+        if not os.path.exists(reports_dir):
+            return {"archived": 0, "expired": 0}
+        if not os.path.exists(archive_dir):
+            os.makedirs(archive_dir)
+
+        names = indexed_report_names()
+        screenshots = screenshot_files_by_report()
+        hot_reports = []
+        for filename in list_report_files():
+            report_path = hot_report_path(filename)
+            try:
+                stat = os.stat(report_path)
+                size = stat.st_size
+                if os.path.exists(output_sidecar_path(filename)):
+                    size += os.path.getsize(output_sidecar_path(filename))
+                size += sum(os.path.getsize(path) for path in screenshots.get(filename, []))
+            except OSError as e:
+                app.logger.error(f"Error reading report {filename} for compaction: {str(e)}")
+                continue
+            hot_reports.append({
+                "filename": filename,
+                "path": report_path,
+                # Reports not indexed yet are kept apart from their test's per-test limit
+                "name": names.get(filename) or filename[len('report_'):-len('_YYYYMMDD_HHMMSS.json')],
+                "mtime": stat.st_mtime,
+                "size": size
+            })
+
+        to_archive = select_reports_to_archive(hot_reports)
+        index = load_archive_index()
+        archived = 0
+
+        for report in hot_reports:
+            if report['filename'] not in to_archive:
+                continue
+            try:
+                report_data, member = archive_member(report['filename'])
+            except Exception as e:
+                app.logger.error(f"Error reading report {report['filename']} for compaction: {str(e)}")
+                continue
+            day = datetime.fromtimestamp(report['mtime']).strftime("%Y%m%d")
+            segment = f"reports_{day}.ndjson.gz"
+            # Each report is its own gzip member (the stored response body plus a
+            # newline), so a single report can be read back and served by offset
+            # while the whole segment stays a valid gzip'd NDJSON stream.
+            with open(os.path.join(archive_dir, segment), 'ab') as f:
+                offset = f.tell()
+                f.write(member)
+                length = f.tell() - offset
+            index[report['filename']] = {
+                "segment": segment,
+                "offset": offset,
+                "length": length,
+                "name": report_data.get('name', report['name']),
+                "status": report_data.get('status'),
+                "timestamp": report_timestamp_from_filename(report['filename']),
+                "envelope": True
+            }
+            # Persist the index before dropping the hot copy so a crash never loses a report
+            save_archive_index(index)
+            os.remove(report['path'])
+            remove_output_sidecar(report['filename'])
+            for path in screenshots.get(report['filename'], []):
+                os.remove(path)
+            publish_change({"type": "archived", "filename": report['filename']})
+            archived += 1
+
+        expired = 0
+        cutoff = (datetime.now() - timedelta(days=ARCHIVE_MAX_AGE_DAYS)).strftime("%Y%m%d")
+        for segment in os.listdir(archive_dir):
+            if not (segment.startswith('reports_') and segment.endswith('.ndjson.gz')):
+                continue
+            day = segment[len('reports_'):-len('.ndjson.gz')]
+            if day < cutoff:
+                expired_reports = [k for k, v in index.items() if v['segment'] == segment]
+                index = {k: v for k, v in index.items() if v['segment'] != segment}
+                save_archive_index(index)
+                unindex_reports(expired_reports)
+                os.remove(os.path.join(archive_dir, segment))
+                expired += 1
+
+        if archived or expired:
+            app.logger.info(f"Compaction archived {archived} reports and expired {expired} archive segments")
+        return {"archived": archived, "expired": expired}
+
+def run_compactor():
+    while True:
+        time.sleep(COMPACTION_INTERVAL_SECONDS)
+        try:
+            compact_reports()
+        except Exception as e:
+            app.logger.error(f"Error compacting reports: {str(e)}")
+
+def start_compactor():
+    thread = threading.Thread(target=run_compactor, name='report-compactor', daemon=True)
+    thread.start()
+    app.logger.info(f"Report compactor started (interval {COMPACTION_INTERVAL_SECONDS}s)")
 
 @app.route('/reports', methods=['GET'])
 def get_reports():
-    reports_dir = 'reports'
     if not os.path.exists(reports_dir):
         return jsonify({
             "status": "error",
             "message": "No reports found"
         }), 404
     
-    # Only include files that start with 'report_' and end with '.json'
-    report_files = [f for f in os.listdir(reports_dir) if f.startswith('report_') and f.endswith('.json')]
+    # Only include files that start with 'report_' and end with '.json' (or '.json.gz')
+    report_files = list_report_files()
     reports = []
     
     for report_file in report_files:
         try:
-            with open(os.path.join(reports_dir, report_file), 'r') as f:
-                report_data = json.load(f)
-                # Extract timestamp from filename or use data timestamp
-                timestamp = None
-                if 'timestamp' in report_data:
-                    timestamp = report_data['timestamp']
-                else:
-                    # Try to extract timestamp from filename
-                    parts = report_file.split('_')
-                    if len(parts) > 1:
-                        try:
-                            timestamp = parts[-1].replace('.json', '')
-                        except:
-                            timestamp = '00000000_000000'  # Default timestamp
-                
-                reports.append({
-                    "filename": report_file,
-                    "timestamp": timestamp,
-                    "data": report_data
-                })
+            # Sidecar outputs stay on disk; /reports/<filename> and its output range serve them
+            report_data = read_report_file(report_file, include_output=False)
+            # Extract timestamp from filename or use data timestamp
+            timestamp = None
+            if 'timestamp' in report_data:
+                timestamp = report_data['timestamp']
+            else:
+                timestamp = report_timestamp_from_filename(report_file)
+            
+            reports.append({
+                "filename": report_file,
+                "timestamp": timestamp,
+                "data": report_data
+            })
         except Exception as e:
-            app.loger.error(f"Error reading report {report_file}: {str(e)}")
+            app.logger.error(f"Error reading report {report_file}: {str(e)}")
+
+    # Archived reports are listed from the index only; fetch one through /reports/<filename>
+    if request.args.get('archived') == 'true':
+        for report_file, entry in load_archive_index().items():
+            reports.append({
+                "filename": report_file,
+                "timestamp": entry.get('timestamp'),
+                "archived": True,
+                "data": {"name": entry.get('name'), "status": entry.get('status')}
+            })
     
     # Sort reports by timestamp (newest first)
     reports.sort(key=lambda x: x.get('timestamp', '00000000_000000'), reverse=True)
@@ -105,18 +1345,168 @@ def get_reports():
         "reports": reports
     })
 
-@app.route('/reports/<filename>', methods=['GET'])
-def get_report(filename):
-    report_path = os.path.join('reports', filename)
-    if not os.path.exists(report_path):
+@app.route('/reports/changes', methods=['GET'])
+def get_report_changes():
+    """Long-poll for changes after a cursor.
+
+    Returns as soon as there are changes after `since`, or with none once `wait`
+    seconds have passed. Without `since`, returns the current cursor right away.
+    A cursor from before a restart or older than the log returns reset: true,
+    after which the client reloads /reports and continues from the new cursor.
+    """
+    since = request.args.get('since')
+    wait = min(max(request.args.get('wait', CHANGES_DEFAULT_WAIT_SECONDS, type=float), 0), CHANGES_MAX_WAIT_SECONDS)
+
+    with change_log_updated:
+        if not since:
+            return jsonify({"status": "success", "cursor": change_cursor(change_log_seq), "reset": False, "changes": []})
+        epoch, _, seq = since.partition(':')
+        try:
+            seq = int(seq)
+        except ValueError:
+            return jsonify({
+                "status": "error",
+                "message": f"Invalid cursor: {since}"
+            }), 400
+        oldest_seq = change_log[0]['seq'] if change_log else change_log_seq + 1
+        if epoch != change_log_epoch or seq > change_log_seq or seq < oldest_seq - 1:
+            return jsonify({"status": "success", "cursor": change_cursor(change_log_seq), "reset": True, "changes": []})
+
+        change_log_updated.wait_for(lambda: change_log_seq > seq, wait)
+        changes = [change for change in change_log if change['seq'] > seq]
+        cursor = change_cursor(change_log_seq)
+
+    return jsonify({
+        "status": "success",
+        "cursor": cursor,
+        "reset": False,
+        "changes": changes
+    })
+
+@app.route('/reports/batch', methods=['POST'])
+def get_reports_batch():
+    filenames = (request.json or {}).get('filenames', [])
+    reports = []
+    missing = []
+    
+    for filename in filenames:
+        try:
+            report_data = read_report_file(filename)
+            if report_data is None:
+                report_data = read_archived_report(filename)
+            if report_data is None:
+                missing.append(filename)
+                continue
+            reports.append({
+                "filename": filename,
+                "report": report_data
+            })
+        except Exception as e:
+            app.logger.error(f"Error reading report {filename}: {str(e)}")
+            missing.append(filename)
+    
+    return jsonify({
+        "status": "success",
+        "reports": reports,
+        "missing": missing
+    })
+
+def stored_report_response(member):
+    """Serve a stored report body, passing the gzip bytes through when possible."""
+    if client_accepts_gzip():
+        response = Response(member, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = Response(gzip.decompress(member), mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+@app.route('/reports/search', methods=['GET'])
+def search_reports_route():
+    """Rank reports whose output, error or steps match q, optionally filtered."""
+    query = (request.args.get('q') or '').strip()
+    if not query:
         return jsonify({
             "status": "error",
-            "message": f"Report {filename} not found"
-        }), 404
-    
+            "message": "Missing search query q"
+        }), 400
+
+    try:
+        date_from = parse_search_date(request.args.get('from'), end_of_day=False)
+        date_to = parse_search_date(request.args.get('to'), end_of_day=True)
+        limit = min(int(request.args.get('limit', SEARCH_DEFAULT_LIMIT)), SEARCH_MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 400
+
+    started = time.perf_counter()
     try:
-        with open(report_path, 'r') as f:
-            report_data = json.load(f)
+        hits = search_reports(query, request.args.get('test'), request.args.get('browser'),
+                              date_from, date_to, limit)
+    except Exception as e:
+        app.logger.error(f"Error searching reports for {query!r}: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": f"Error searching reports: {str(e)}"
+        }), 500
+
+    return jsonify({
+        "status": "success",
+        "query": query,
+        "hits": hits,
+        "tookMs": round((time.perf_counter() - started) * 1000, 2)
+    })
+
+def load_report(filename, include_output=True):
+    report_data = read_report_file(filename, include_output)
+    if report_data is None:
+        report_data = read_archived_report(filename)
+    return report_data
+
+@app.route('/reports/<filename>', methods=['GET'])
+def get_report(filename):
+    """Return a report; ?fields=name,status,... returns only those top-level fields."""
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    try:
+        if fields:
+            report_data = load_report(filename, include_output='output' in fields)
+            if report_data is None:
+                return jsonify({
+                    "status": "error",
+                    "message": f"Report {filename} not found"
+                }), 404
+            if 'outputInfo' in fields and 'outputInfo' not in report_data:
+                # Reports saved before outputs were measured
+                line_index = build_line_index((report_data.get('output') or '').encode('utf-8'))
+                report_data['outputInfo'] = {"bytes": line_index['bytes'], "lines": line_index['lines'], "external": False}
+            return jsonify({
+                "status": "success",
+                "report": {field: report_data[field] for field in fields if field in report_data}
+            })
+
+        report_path = report_storage_path(filename)
+        # Reports with a sidecar output are reassembled; all others are served as stored
+        if os.path.exists(report_path) and not os.path.exists(output_sidecar_path(filename)):
+            if client_accepts_gzip():
+                response = send_file(report_path, mimetype='application/json')
+                response.headers['Content-Encoding'] = 'gzip'
+                response.headers['Vary'] = 'Accept-Encoding'
+                return response
+            with open(report_path, 'rb') as f:
+                return stored_report_response(f.read())
+
+        entry = load_archive_index().get(filename)
+        if entry and entry.get('envelope'):
+            return stored_report_response(read_archived_member(filename))
+
+        report_data = load_report(filename)
+        if report_data is None:
+            return jsonify({
+                "status": "error",
+                "message": f"Report {filename} not found"
+            }), 404
         return jsonify({
             "status": "success",
             "report": report_data
@@ -128,19 +1518,126 @@ def get_report(filename):
             "message": f"Error reading report: {str(e)}"
         }), 500
 
+@app.route('/reports/<filename>/output', methods=['GET'])
+def get_report_output(filename):
+    """Return a range of a report's output.
+
+    unit=lines (default) or bytes; offset and limit select the range, head=N and
+    tail=N the first or last N units. Large outputs are read from their sidecar
+    file by seeking through the line index; others are sliced from the report.
+    """
+    unit = request.args.get('unit', 'lines')
+    if unit not in OUTPUT_DEFAULT_LIMIT:
+        return jsonify({
+            "status": "error",
+            "message": f"Invalid unit {unit}, expected lines or bytes"
+        }), 400
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = int(request.args.get('head') or request.args.get('tail') or request.args.get('limit')
+                    or OUTPUT_DEFAULT_LIMIT[unit])
+        limit = max(0, min(limit, OUTPUT_MAX_LIMIT[unit]))
+    except ValueError:
+        return jsonify({
+            "status": "error",
+            "message": "offset, limit, head and tail must be integers"
+        }), 400
+
+    try:
+        sidecar_path = output_sidecar_path(filename)
+        if os.path.exists(sidecar_path):
+            with open(output_line_index_path(filename), 'r') as f:
+                line_index = json.load(f)
+            output_file = open(sidecar_path, 'rb')
+        else:
+            report_data = load_report(filename)
+            if report_data is None:
+                return jsonify({
+                    "status": "error",
+                    "message": f"Report {filename} not found"
+                }), 404
+            data = (report_data.get('output') or '').encode('utf-8')
+            line_index = build_line_index(data)
+            output_file = io.BytesIO(data)
+
+        total = line_index[unit]
+        if request.args.get('tail'):
+            offset = max(0, total - limit)
+        offset = min(offset, total)
+        with output_file:
+            chunk = read_output_range(output_file, line_index, unit, offset, min(limit, total - offset))
+    except Exception as e:
+        app.logger.error(f"Error reading output of report {filename}: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": f"Error reading report output: {str(e)}"
+        }), 500
+
+    end = offset + (len(chunk) if unit == 'bytes' else min(limit, total - offset))
+    return jsonify({
+        "status": "success",
+        "filename": filename,
+        "unit": unit,
+        "offset": offset,
+        "totalBytes": line_index['bytes'],
+        "totalLines": line_index['lines'],
+        # Byte ranges may split a multi-byte character; it is replaced, not dropped
+        "text": chunk.decode('utf-8', errors='replace'),
+        "nextOffset": end if end < total else None
+    })
+
+@app.route('/reports/compact', methods=['POST'])
+def compact_reports_now():
+    try:
+        result = compact_reports()
+        return jsonify({
+            "status": "success",
+            "message": f"Archived {result['archived']} reports, expired {result['expired']} archive segments"
+        })
+    except Exception as e:
+        app.logger.error(f"Error compacting reports: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": f"Error compacting reports: {str(e)}"
+        }), 500
+
+def running_run_ids():
+    if not os.path.exists(runs_dir):
+        return []
+    running = []
+    for filename in os.listdir(runs_dir):
+        if filename.endswith('.json'):
+            run = load_run(filename[:-len('.json')])
+            if run is not None and run['status'] == 'running':
+                running.append(run['runId'])
+    return running
+
 @app.route('/reports/delete-all', methods=['POST'])
 def delete_all_reports():
-    reports_dir = 'reports'
-    screenshots_dir = os.path.join(reports_dir, 'screenshots')
+    """Delete every report with its screenshots, outputs, runs and archive.
+
+    Refused while a run is running, since its run record is still being written.
+    Test history and locator stats are kept: they are not reports and drive
+    scheduling. The performance trend links to reports, so it is cleared.
+    """
     deleted_count = 0
     
     try:
+        running = running_run_ids()
+        if running:
+            return jsonify({
+                "status": "error",
+                "message": f"Cannot delete reports while runs are running: {', '.join(running)}"
+            }), 409
+
+        # Let queued reports land first so none are written back after the delete
+        wait_for_report_writes(timeout=REPORT_WRITE_FLUSH_TIMEOUT_SECONDS)
+
         # Delete all report files
         if os.path.exists(reports_dir):
             for filename in os.listdir(reports_dir):
-                if filename.endswith('.json'):
-                    file_path = os.path.join(reports_dir, filename)
-                    os.remove(file_path)
+                if report_filename_from_path(filename):
+                    os.remove(os.path.join(reports_dir, filename))
                     deleted_count += 1
         
         # Delete all screenshots
@@ -149,6 +1646,36 @@ def delete_all_reports():
                 file_path = os.path.join(screenshots_dir, filename)
                 os.remove(file_path)
                 deleted_count += 1
+
+        # Delete all sidecar outputs
+        if os.path.exists(outputs_dir):
+            for filename in os.listdir(outputs_dir):
+                os.remove(os.path.join(outputs_dir, filename))
+
+        # Delete all run records, except runs started since the check above
+        with runs_lock:
+            started = set(running_run_ids())
+            if os.path.exists(runs_dir):
+                for filename in os.listdir(runs_dir):
+                    run_id = filename.split('.', 1)[0]
+                    if run_id not in started:
+                        os.remove(os.path.join(runs_dir, filename))
+
+        # Delete all archive segments and the archive index
+        with archive_lock:
+            if os.path.exists(archive_dir):
+                for filename in os.listdir(archive_dir):
+                    os.remove(os.path.join(archive_dir, filename))
+                    if filename.endswith('.ndjson.gz'):
+                        deleted_count += 1
+
+        with perf_trend_lock:
+            if os.path.exists(perf_trend_path):
+                os.remove(perf_trend_path)
+
+        clear_search_index()
+        # Every watching client has to reload its list
+        publish_change({"type": "reset"})
         
         return jsonify({
             "status": "success",
@@ -161,65 +1688,1034 @@ def delete_all_reports():
             "message": f"Error deleting reports: {str(e)}"
         }), 500
 
+@app.route('/runs', methods=['GET'])
+def get_runs():
+    runs = []
+    if os.path.exists(runs_dir):
+        for filename in os.listdir(runs_dir):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                run = load_run(filename[:-len('.json')])
+                # The listing carries run metadata only; reports come from /runs/<id>/reports
+                run['reports'] = len(run['reports'])
+                runs.append(run)
+            except Exception as e:
+                app.logger.error(f"Error reading run {filename}: {str(e)}")
+    
+    runs.sort(key=lambda r: r.get('startedAt') or '', reverse=True)
+    
+    return jsonify({
+        "status": "success",
+        "runs": runs
+    })
+
+@app.route('/runs/<run_id>', methods=['GET'])
+def get_run(run_id):
+    run = load_run(run_id)
+    if run is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Run {run_id} not found"
+        }), 404
+    return jsonify({
+        "status": "success",
+        "run": run
+    })
+
+@app.route('/runs/<run_id>/cancel', methods=['POST'])
+def cancel_run(run_id):
+    """Stop a running run: queued jobs are dropped and running tests are stopped.
+
+    The request that started the run returns once the stopped tests have reported,
+    with the run finished as cancelled. Runs of other instances are cancelled
+    through the hub, which tells their instance.
+    """
+    run = load_run(run_id)
+    if run is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Run {run_id} not found"
+        }), 404
+    with run_result_queues_lock:
+        result_queue = run_result_queues.get(run_id)
+    owner = run.get('instance', INSTANCE_ID)
+    if run['status'] != 'running' or (result_queue is None and owner == INSTANCE_ID):
+        return jsonify({
+            "status": "error",
+            "message": f"Run {run_id} is not running"
+        }), 409
+    if result_queue is not None:
+        result_queue.put({"type": "cancel"})
+    else:
+        try:
+            send_to_hub({"type": "cancel-run", "runId": run_id, "reason": "cancelled"})
+        except Exception as e:
+            app.logger.error(f"Error cancelling run {run_id} of instance {owner}: {str(e)}")
+            return jsonify({
+                "status": "error",
+                "message": f"Could not reach the Node server to cancel run {run_id}"
+            }), 503
+    app.logger.info(f"Cancelling run {run_id}")
+    return jsonify({
+        "status": "success",
+        "message": f"Cancelling run {run_id}"
+    })
+
+@app.route('/runs/<run_id>/reports', methods=['GET'])
+def get_run_reports(run_id):
+    run = load_run(run_id)
+    if run is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Run {run_id} not found"
+        }), 404
+    
+    reports = []
+    missing = []
+    for entry in run['reports']:
+        filename = entry['filename']
+        try:
+            report_data = read_report_file(filename)
+            if report_data is None:
+                report_data = read_archived_report(filename)
+            if report_data is None:
+                missing.append(filename)
+                continue
+            reports.append({
+                "filename": filename,
+                "report": report_data
+            })
+        except Exception as e:
+            app.logger.error(f"Error reading report {filename}: {str(e)}")
+            missing.append(filename)
+    
+    return jsonify({
+        "status": "success",
+        "run": run,
+        "reports": reports,
+        "missing": missing
+    })
+
+@app.route('/workers', methods=['GET'])
+def get_workers():
+    workers = workers_snapshot['workers']
+    return jsonify({
+        "status": "success",
+        "workers": workers,
+        "totalSlots": sum(w.get('capacity', 0) for w in workers),
+        "busySlots": sum(len(w.get('running', [])) for w in workers),
+        "queued": sum(w.get('queued', 0) for w in workers) + workers_snapshot['unplaced'],
+        "awaitingReconnect": workers_snapshot.get('awaitingReconnect', 0),
+        "updatedAt": workers_snapshot['updatedAt']
+    })
+
+def load_test_files(framework):
+    """Read the test cases of a framework from test_cases/."""
+    test_cases_dir = os.path.join(os.path.dirname(__file__), 'test_cases')
+    test_files = []
+
+    if framework == 'Robot':
+        test_files = [f for f in os.listdir(test_cases_dir) if f.endswith('.robot')]
+    elif framework == 'Selenium':
+        test_files = [f for f in os.listdir(test_cases_dir) if f.endswith('.py') and f != '__init__.py']
+
+    app.logger.info(f"Found {len(test_files)} {framework} test files: {test_files}")
+
+    tests = []
+    for test_file in sorted(test_files):
+        test_path = os.path.join(test_cases_dir, test_file)
+        with open(test_path, 'r') as f:
+            test_content = f.read()
+        tests.append({
+            'name': test_file,
+            'content': test_content,
+            'hash': content_hash(test_content),
+            'mtime': os.path.getmtime(test_path)
+        })
+    return tests
+
+def load_support_files():
+    """Read the shared locator registry and helpers that tests import from support/."""
+    support_files = {}
+    if os.path.isdir(support_files_dir):
+        for filename in sorted(os.listdir(support_files_dir)):
+            if filename.endswith(('.py', '.json')):
+                with open(os.path.join(support_files_dir, filename), 'r') as f:
+                    support_files[filename] = f.read()
+    return support_files
+
+def load_locator_stats():
+    if not os.path.exists(locator_stats_path):
+        return {}
+    try:
+        with open(locator_stats_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        app.logger.error(f"Error reading locator stats: {str(e)}")
+        return {}
+
+def record_locator_profile(test_name, browser, samples):
+    """Fold a report's locator timings into the per-locator aggregates."""
+    if not samples:
+        return
+    with locator_stats_lock:
+        stats = load_locator_stats()
+        for sample in samples:
+            entry = stats.setdefault(sample.get('name') or sample.get('value'), {
+                "strategy": sample.get('strategy'),
+                "value": sample.get('value'),
+                "lookups": 0,
+                "totalMs": 0.0,
+                "maxMs": 0.0,
+                "retries": 0,
+                "failures": 0,
+                "tests": [],
+                "browsers": []
+            })
+            elapsed_ms = sample.get('elapsedMs') or 0
+            entry['strategy'] = sample.get('strategy')
+            entry['value'] = sample.get('value')
+            entry['lookups'] += 1
+            entry['totalMs'] += elapsed_ms
+            entry['maxMs'] = max(entry['maxMs'], elapsed_ms)
+            entry['retries'] += sample.get('retries') or 0
+            if sample.get('status') != 'found':
+                entry['failures'] += 1
+            if test_name not in entry['tests']:
+                entry['tests'].append(test_name)
+            if browser and browser not in entry['browsers']:
+                entry['browsers'].append(browser)
+            if sample.get('suggestions'):
+                entry['suggestions'] = sample['suggestions']
+
+        try:
+            if not os.path.exists(reports_dir):
+                os.makedirs(reports_dir)
+            with open(locator_stats_path, 'w') as f:
+                json.dump(stats, f, indent=4)
+        except Exception as e:
+            app.logger.error(f"Error saving locator stats: {str(e)}")
+
+def load_perf_trend():
+    if not os.path.exists(perf_trend_path):
+        return {}
+    try:
+        with open(perf_trend_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        app.logger.error(f"Error reading performance trend: {str(e)}")
+        return {}
+
+def record_perf_metrics(test_name, browser, run_id, report_filename, perf_metrics):
+    """Add one trend point per page sampled by a report: each metric's worst step on that page."""
+    if not perf_metrics or not perf_metrics.get('series'):
+        return
+    browser = (browser or 'chrome').lower()
+    with perf_trend_lock:
+        trend = load_perf_trend()
+        for page, series in perf_metrics['series'].items():
+            values = {}
+            for metric, samples in series.items():
+                samples = [value for value in samples if value is not None]
+                if samples:
+                    values[metric] = max(samples)
+            points = trend.setdefault(page, {}).setdefault(browser, [])
+            points.append({
+                "at": time.time(),
+                "test": test_name,
+                "runId": run_id,
+                "report": report_filename,
+                "values": values
+            })
+            del points[:-PERF_TREND_MAX_POINTS]
+
+        try:
+            if not os.path.exists(reports_dir):
+                os.makedirs(reports_dir)
+            write_file_atomic(perf_trend_path, json.dumps(trend).encode('utf-8'))
+        except Exception as e:
+            app.logger.error(f"Error saving performance trend: {str(e)}")
+
+def median(values):
+    ordered = sorted(values)
+    middle = len(ordered) // 2
+    return ordered[middle] if len(ordered) % 2 else (ordered[middle - 1] + ordered[middle]) / 2
+
+def perf_summary(points):
+    """Each metric's latest value against the median of the earlier points."""
+    summary = {}
+    latest = points[-1]['values']
+    for metric, value in latest.items():
+        earlier = [p['values'][metric] for p in points[:-1] if metric in p['values']]
+        entry = {"latest": value, "median": None, "changePercent": None, "regression": False}
+        if earlier:
+            baseline = median(earlier)
+            entry['median'] = baseline
+            if baseline:
+                entry['changePercent'] = round((value - baseline) / baseline * 100, 1)
+                entry['regression'] = value > baseline * PERF_REGRESSION_RATIO
+        summary[metric] = entry
+    return summary
+
+def test_steps(content, framework):
+    """The steps of a test source, as comparable strings."""
+    if framework == 'Robot':
+        body = content.split('*** Test Cases ***', 1)[-1]
+        return [' '.join(re.split(r' {2,}|\t+', line.strip())) for line in body.splitlines()
+                if line[:1] in (' ', '\t') and line.strip() and not line.strip().startswith('#')]
+    return [':'.join(part for part in match.groups() if part) for match in SELENIUM_STEP_PATTERN.finditer(content)]
+
+def test_checkpoints(test, framework):
+    """The checkpoints of a test in order, each with a hash of the steps before it."""
+    pattern = CHECKPOINT_PATTERNS.get(framework)
+    if pattern is None:
+        return []
+    content = test['content']
+    return [(match.group(1), content_hash('\n'.join(test_steps(content[:match.start()], framework))))
+            for match in pattern.finditer(content)]
+
+def plan_shared_prefixes(jobs):
+    """Group jobs by their deepest checkpoint shared with another job.
+
+    The shortest job of each group runs in full and saves the browser state at the
+    checkpoint (job['checkpoint']); the others get forkOf, the leader's jobId, and
+    resume, the checkpoints the fork skips. Returns the number of forked jobs.
+    """
+    chains = {}
+    for job in jobs:
+        checkpoints = test_checkpoints(job['test'], job['framework'])
+        chains[job['jobId']] = [((job['framework'], job['browser'], job.get('dataset'), name, steps_hash), name)
+                                for name, steps_hash in checkpoints]
+    shared = Counter(key for chain in chains.values() for key, _ in chain)
+
+    groups = {}
+    for job in jobs:
+        chain = chains[job['jobId']]
+        for depth in reversed(range(len(chain))):
+            if shared[chain[depth][0]] >= 2:
+                groups.setdefault(chain[depth][0], []).append((job, [name for _, name in chain[:depth + 1]]))
+                break
+
+    forked = 0
+    for key, members in groups.items():
+        if len(members) < 2:
+            continue
+        members.sort(key=lambda member: member[0]['estimatedDurationMs'] or 0)
+        leader = members[0][0]
+        leader['checkpoint'] = {'save': key[3]}
+        for job, resume in members[1:]:
+            job['forkOf'] = leader['jobId']
+            job['resume'] = resume
+            forked += 1
+        app.logger.info(f"Shared prefix up to {key[3]} on {key[1]}: {leader['test']['name']} runs it for "
+                        f"{', '.join(job['test']['name'] for job, _ in members[1:])}")
+    return forked
+
+def load_datasets():
+    if not os.path.exists(datasets_path):
+        return {}
+    with open(datasets_path, 'r') as f:
+        return json.load(f)
+
+def execute_jobs(run_id, jobs, client_id, retry_policy, network_policy=None, shared_prefix=False,
+                 screenshot_policy=None, timeouts=None):
+    """Queue every job on the hub up front, then save results as they complete.
+
+    Returns the run's final status: 'completed', or 'cancelled' / 'timedout' when the
+    run was cancelled or reached its deadline. Stopping a run cancels its queued jobs
+    on the hub and stops the running ones; their results are still saved if they
+    arrive within RUN_STOP_GRACE_SECONDS.
+
+    Each job carries its test, browser and framework, plus a dataset name and its
+    params for matrix runs. Results are matched back to jobs by jobId. Jobs are
+    journaled before they are sent; jobs of a resumed run already carry their jobId
+    and are sent again with it, which the hub ignores if it still has them.
+
+    With shared_prefix, jobs forked from another job's checkpoint are held until that
+    job's result arrives with the saved browser state (see plan_shared_prefixes).
+    Forks are journaled like any job, so a resumed run sends them as full tests.
+    """
+    with run_result_queues_lock:
+        result_queue = run_result_queues.setdefault(run_id, queue.Queue())
+    support_files = load_support_files()
+
+    try:
+        new_jobs = [job for job in jobs if 'jobId' not in job]
+        for job in new_jobs:
+            job['jobId'] = uuid.uuid4().hex
+        timeouts = dict(timeouts or {})
+        if new_jobs and timeouts.get('runMs') and not timeouts.get('deadline'):
+            # Absolute, so a resumed run keeps the original deadline
+            timeouts['deadline'] = int(time.time() * 1000) + timeouts['runMs']
+        if new_jobs:
+            append_run_journal(run_id, [{
+                "event": "started",
+                "clientId": client_id,
+                "retryPolicy": retry_policy,
+                "networkPolicy": network_policy,
+                "screenshotPolicy": screenshot_policy,
+                "timeouts": timeouts
+            }] + [{
+                "event": "queued",
+                "jobId": job['jobId'],
+                "test": job['test']['name'],
+                "hash": job['test']['hash'],
+                "browser": job['browser'],
+                "framework": job['framework'],
+                "dataset": job.get('dataset'),
+                "params": job.get('params'),
+                "estimatedDurationMs": job['estimatedDurationMs']
+            } for job in new_jobs])
+        if shared_prefix:
+            app.logger.info(f"Run {run_id} forks {plan_shared_prefixes(jobs)} of {len(jobs)} jobs from shared prefixes")
+
+        pending = {}
+        # Forked jobs waiting for their leader's checkpoint, by the leader's jobId
+        held = {}
+
+        def send_job(job, checkpoint=None):
+            test = job['test']
+            job_id = job['jobId']
+            pending[job_id] = job
+            app.logger.info(f"Starting test: {test['name']} on {job['browser']} (job {job_id})")
+
+            test_case = {
+                'name': test['name'],
+                'browser': job['browser'],
+                'framework': job['framework'],
+                'content': test['content'],
+                'runId': run_id,
+                'jobId': job_id,
+                'estimatedDurationMs': job['estimatedDurationMs'],
+                'retryPolicy': retry_policy,
+                'supportFiles': support_files
+            }
+            if job.get('dataset'):
+                test_case['dataset'] = job['dataset']
+                test_case['params'] = job['params']
+            if network_policy:
+                test_case['networkPolicy'] = network_policy
+            if screenshot_policy:
+                test_case['screenshotPolicy'] = screenshot_policy
+            if timeouts.get('testMs'):
+                test_case['timeoutMs'] = timeouts['testMs']
+            if timeouts.get('deadline'):
+                test_case['deadline'] = timeouts['deadline']
+            if checkpoint:
+                test_case['checkpoint'] = checkpoint
+            # Kept to resubmit it if the hub restarts
+            job['testCase'] = test_case
+
+            send_to_hub({
+                "type": "test-case",
+                "clientId": client_id,
+                "runId": run_id,
+                "testCase": test_case
+            })
+            app.logger.info(f"Sent test case to Node server: {test['name']} (framework: {job['framework']})")
+
+        # Queue every test up front so the hub can keep all worker slots busy
+        for job in jobs:
+            if job.get('forkOf'):
+                held.setdefault(job['forkOf'], []).append(job)
+            else:
+                send_job(job, job.get('checkpoint'))
+
+        def stop_run(reason, notify_hub=True):
+            """Cancel the run's queued jobs on the hub and stop its running tests."""
+            app.logger.warning(f"Stopping run {run_id} ({reason}) with {len(pending)} unfinished jobs")
+            cancelled = [job['jobId'] for forks in held.values() for job in forks]
+            held.clear()
+            if cancelled:
+                append_run_journal(run_id, [{"event": "cancelled", "jobId": job_id} for job_id in cancelled])
+            if not notify_hub:
+                return
+            try:
+                send_to_hub({"type": "cancel-run", "runId": run_id, "reason": reason})
+            except Exception as e:
+                app.logger.error(f"Error cancelling run {run_id} on the Node server: {str(e)}")
+
+        # Wait for test results, which arrive in completion order
+        report_filenames = []
+        stop_reason = None
+        give_up_at = None
+        deadline = timeouts['deadline'] / 1000 if timeouts.get('deadline') else None
+        while pending:
+            wait_until = give_up_at or deadline
+            try:
+                result_data = result_queue.get(timeout=None if wait_until is None else max(0, wait_until - time.time()))
+            except queue.Empty:
+                if stop_reason is None:
+                    stop_reason = 'timedout'
+                    stop_run('timeout')
+                    give_up_at = time.time() + RUN_STOP_GRACE_SECONDS
+                    continue
+                app.logger.warning(f"Run {run_id} gave up waiting for {len(pending)} stopped jobs")
+                append_run_journal(run_id, [{"event": "cancelled", "jobId": job_id} for job_id in pending])
+                break
+
+            if result_data.get('type') == 'cancel':
+                if stop_reason is None:
+                    stop_reason = 'cancelled'
+                    stop_run('cancelled')
+                    give_up_at = time.time() + RUN_STOP_GRACE_SECONDS
+                continue
+            if result_data.get('type') == 'resubmit-jobs':
+                # Jobs this run has finished with are acknowledged so the hub drops them
+                for job_id in result_data.get('jobIds', []):
+                    if job_id in pending and stop_reason is None:
+                        send_to_hub({
+                            "type": "test-case",
+                            "clientId": client_id,
+                            "runId": run_id,
+                            "testCase": pending[job_id]['testCase']
+                        })
+                    else:
+                        acknowledge_result(job_id)
+                app.logger.info(f"Resubmitted unfinished jobs of run {run_id} to the restarted Node server")
+                continue
+            if result_data.get('type') == 'run-cancelled':
+                if stop_reason is None:
+                    # Cancelled through another instance; the hub has already stopped it
+                    stop_reason = 'timedout' if result_data.get('reason') == 'timeout' else 'cancelled'
+                    stop_run(result_data.get('reason', 'cancelled'), notify_hub=False)
+                    give_up_at = time.time() + RUN_STOP_GRACE_SECONDS
+                # Jobs the hub dropped before they started; no result will come for them
+                dropped = [job_id for job_id in result_data.get('dropped', []) if pending.pop(job_id, None)]
+                if dropped:
+                    append_run_journal(run_id, [{"event": "cancelled", "jobId": job_id} for job_id in dropped])
+                app.logger.info(f"Node server dropped {len(dropped)} queued jobs of run {run_id}, "
+                                f"stopping {result_data.get('stopped', 0)} running tests")
+                continue
+
+            test_result = result_data['result']
+            job_id = result_data.get('jobId')
+            if job_id and job_id not in pending:
+                # Already collected, e.g. redelivered by the hub after a reconnect
+                acknowledge_result(job_id)
+                app.logger.info(f"Ignoring duplicate result for {test_result.get('name')} (job {job_id})")
+                continue
+            if job_id is None:
+                # Hubs that do not echo job ids: match on the test name instead
+                job_id = next((j for j, job in pending.items() if job['test']['name'] == test_result.get('name')), None)
+            if job_id is None:
+                app.logger.warning(f"Ignoring unexpected result for {test_result.get('name')}")
+                continue
+
+            job = pending.pop(job_id)
+            test = job['test']
+            test_result['runId'] = run_id
+            # The saved browser state only travels to the forks and is never stored
+            checkpoint_state = test_result.pop('checkpointState', None)
+            forks = held.pop(job_id, [])
+            if forks:
+                test_result['sharedPrefix'] = {
+                    "checkpoint": job['checkpoint']['save'],
+                    "saved": checkpoint_state is not None,
+                    "forks": len(forks)
+                }
+            if job.get('forkedFrom'):
+                test_result['forkedFrom'] = job['forkedFrom']
+            tag = None
+            if job.get('dataset'):
+                test_result['dataset'] = job['dataset']
+                tag = f"{job['browser']}-{job['dataset']}"
+            # Shaped runs report their savings; unshaped passing runs feed the baseline
+            network = test_result.get('network') or {}
+            page_load_ms = None
+            if network.get('pageLoads'):
+                page_load_ms = round(sum(load['loadMs'] for load in network['pageLoads']), 1)
+                if network.get('applied'):
+                    network['savings'] = network_savings(test['name'], job['browser'], page_load_ms)
+                    page_load_ms = None
+                elif test_result.get('status') != 'passed' or job.get('forkedFrom'):
+                    page_load_ms = None
+            report_filename = save_report(test_result, tag, job_id)
+            if report_filename:
+                report_filenames.append(report_filename)
+                add_run_report(run_id, report_filename, test_result)
+            for fork in forks:
+                if checkpoint_state is None:
+                    app.logger.warning(f"{test['name']} did not reach checkpoint {job['checkpoint']['save']}, "
+                                       f"running {fork['test']['name']} in full")
+                    send_job(fork)
+                    continue
+                fork['forkedFrom'] = {
+                    "checkpoint": job['checkpoint']['save'],
+                    "jobId": job_id,
+                    "report": report_filename
+                }
+                send_job(fork, {"resume": fork['resume'], "state": checkpoint_state})
+            append_run_journal(run_id, [{
+                "event": "completed",
+                "jobId": job_id,
+                "report": report_filename,
+                "status": test_result.get('status')
+            }])
+            acknowledge_result(result_data.get('jobId'))
+            if test_result.get('cancelled'):
+                # Says nothing about the test; keep it out of its history
+                app.logger.info(f"Received result for cancelled test {test['name']}")
+                continue
+            # Forks skip their prefix, and stopped tests did not finish, so their
+            # duration would skew the test's estimate
+            record_test_result(test['name'], test['hash'], test_result.get('status'), job['browser'],
+                               None if job.get('forkedFrom') or test_result.get('stopReason') else test_result.get('durationMs'),
+                               len(test_result.get('attempts') or []) or 1, page_load_ms,
+                               test_result.get('resources'))
+            record_locator_profile(test['name'], job['browser'], test_result.get('locatorProfile'))
+            record_perf_metrics(test['name'], job['browser'], run_id, report_filename, test_result.get('perfMetrics'))
+            app.logger.info(f"Received and queued result for {test['name']}")
+
+        # Every test has been collected; let the run finish once its reports are on disk
+        if not wait_for_report_writes(report_filenames, REPORT_WRITE_FLUSH_TIMEOUT_SECONDS):
+            app.logger.warning(f"Run {run_id} finished before all of its reports were saved")
+        return stop_reason or 'completed'
+    finally:
+        with run_result_queues_lock:
+            run_result_queues.pop(run_id, None)
+
+def unfinished_jobs(run_id):
+    """Rebuild a run's unfinished jobs from its journal.
+
+    Returns (jobs, client_id, retry_policy, network_policy, screenshot_policy, timeouts), or None
+    if the run has no journal.
+    Test content is reloaded from disk; jobs whose test file is gone are dropped.
+    """
+    events = read_run_journal(run_id)
+    if not events:
+        return None
+    client_id = None
+    retry_policy = None
+    network_policy = None
+    screenshot_policy = None
+    timeouts = None
+    queued = {}
+    for event in events:
+        if event['event'] == 'started':
+            client_id = event.get('clientId')
+            retry_policy = event.get('retryPolicy')
+            network_policy = event.get('networkPolicy')
+            screenshot_policy = event.get('screenshotPolicy')
+            timeouts = event.get('timeouts')
+        elif event['event'] == 'queued':
+            queued[event['jobId']] = event
+        elif event['event'] in ('completed', 'cancelled'):
+            queued.pop(event['jobId'], None)
+
+    tests_by_framework = {}
+    jobs = []
+    for job_id, event in queued.items():
+        framework = event['framework']
+        if framework not in tests_by_framework:
+            tests_by_framework[framework] = {t['name']: t for t in load_test_files(framework)}
+        test = tests_by_framework[framework].get(event['test'])
+        if test is None:
+            app.logger.warning(f"Dropping job {job_id} of run {run_id}: test {event['test']} no longer exists")
+            continue
+        job = {
+            'jobId': job_id,
+            'test': test,
+            'browser': event['browser'],
+            'framework': framework,
+            'estimatedDurationMs': event.get('estimatedDurationMs')
+        }
+        if event.get('dataset'):
+            job['dataset'] = event['dataset']
+            job['params'] = event.get('params') or {}
+        jobs.append(job)
+    return jobs, client_id, retry_policy, network_policy, screenshot_policy, timeouts
+
+def resume_run(run_id, jobs, client_id, retry_policy, network_policy, screenshot_policy, timeouts):
+    try:
+        status = execute_jobs(run_id, jobs, client_id, retry_policy, network_policy,
+                              screenshot_policy=screenshot_policy, timeouts=timeouts)
+        finish_run(run_id, status)
+        app.logger.info(f"Resumed run {run_id} {status}")
+    except Exception as e:
+        finish_run(run_id, 'failed')
+        app.logger.error(f"Error resuming run {run_id}: {str(e)}")
+
+def resume_unfinished_runs():
+    """Resume runs left running by a previous backend process.
+
+    Call before the hub reader starts: each run's result queue is registered here,
+    so results the hub redelivers on registration are routed to it.
+    """
+    if not os.path.exists(runs_dir):
+        return
+    for filename in os.listdir(runs_dir):
+        if not filename.endswith('.json'):
+            continue
+        run_id = filename[:-len('.json')]
+        try:
+            run = load_run(run_id)
+            # Runs of other instances sharing the report store are theirs to resume
+            if run['status'] != 'running' or run.get('instance', INSTANCE_ID) != INSTANCE_ID:
+                continue
+            resumable = unfinished_jobs(run_id)
+            if resumable is None:
+                app.logger.warning(f"Run {run_id} was interrupted and has no journal to resume from")
+                finish_run(run_id, 'interrupted')
+                continue
+
+            jobs, client_id, retry_policy, network_policy, screenshot_policy, timeouts = resumable
+            with runs_lock:
+                run = load_run(run_id)
+                run['resumedAt'] = datetime.now().isoformat()
+                save_run(run)
+            with run_result_queues_lock:
+                run_result_queues[run_id] = queue.Queue()
+            app.logger.info(f"Resuming run {run_id} with {len(jobs)} unfinished jobs")
+            threading.Thread(target=resume_run,
+                             args=(run_id, jobs, client_id, retry_policy, network_policy, screenshot_policy, timeouts),
+                             name=f"resume-{run_id}", daemon=True).start()
+        except Exception as e:
+            app.logger.error(f"Error resuming run {run_id}: {str(e)}")
+
+@app.route('/baselines', methods=['GET'])
+def get_baselines():
+    return jsonify({
+        "status": "success",
+        "available": visual_diff.available(),
+        "baselines": baseline_store.entries()
+    })
+
+@app.route('/baselines/approve', methods=['POST'])
+def approve_baselines():
+    """Approve the screenshots of a report (all, or the listed ones) as baselines."""
+    data = request.json or {}
+    filename = data.get('filename')
+    report = read_report_file(filename) if filename else None
+    if report is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Report {filename} not found"
+        }), 404
+
+    wanted = data.get('screenshots') or list(report.get('screenshots', {}))
+    approved = {}
+    for screenshot_name in wanted:
+        screenshot_path = report.get('screenshots', {}).get(screenshot_name)
+        if not screenshot_path or not os.path.exists(screenshot_path):
+            app.logger.warning(f"Screenshot {screenshot_name} of {filename} not found, skipping")
+            continue
+        approved[screenshot_name] = baseline_store.approve(
+            report['name'], report.get('browser'), screenshot_name, screenshot_path, source=filename)
+
+    app.logger.info(f"Approved {len(approved)} baselines from {filename}")
+    return jsonify({
+        "status": "success",
+        "message": f"Approved {len(approved)} baselines",
+        "baselines": approved
+    })
+
+@app.route('/locators/slowest', methods=['GET'])
+def get_slowest_locators():
+    """Locators ranked by mean lookup time, with ID/CSS alternatives seen in the live DOM."""
+    limit = request.args.get('limit', 20, type=int)
+    locators = []
+    for name, entry in load_locator_stats().items():
+        locators.append({
+            "name": name,
+            "strategy": entry['strategy'],
+            "value": entry['value'],
+            "absoluteXPath": entry['strategy'] == 'xpath' and (entry['value'] or '').startswith('/html'),
+            "lookups": entry['lookups'],
+            "meanMs": round(entry['totalMs'] / entry['lookups'], 1) if entry['lookups'] else 0.0,
+            "maxMs": entry['maxMs'],
+            "retries": entry['retries'],
+            "failures": entry['failures'],
+            "tests": entry['tests'],
+            "browsers": entry['browsers'],
+            "suggestions": entry.get('suggestions', [])
+        })
+    locators.sort(key=lambda l: -l['meanMs'])
+
+    return jsonify({
+        "status": "success",
+        "locators": locators[:limit]
+    })
+
+@app.route('/perf/trend', methods=['GET'])
+def get_perf_trend():
+    """Application performance per page over time.
+
+    Without `page`, every page and browser with each metric's latest value, the median
+    of the earlier points and a regression flag. With `page`, its points oldest first,
+    optionally narrowed to one `browser` and one `metric`.
+    """
+    page = request.args.get('page')
+    browser = request.args.get('browser', '').lower() or None
+    metric = request.args.get('metric')
+    limit = request.args.get('limit', 100, type=int)
+
+    with perf_trend_lock:
+        trend = load_perf_trend()
+
+    if not page:
+        pages = []
+        for page_name, browsers in sorted(trend.items()):
+            for browser_name, points in sorted(browsers.items()):
+                if not points or (browser and browser_name != browser):
+                    continue
+                summary = perf_summary(points)
+                regressions = sorted(name for name, entry in summary.items() if entry['regression'])
+                if metric:
+                    summary = {name: entry for name, entry in summary.items() if name == metric}
+                pages.append({
+                    "page": page_name,
+                    "browser": browser_name,
+                    "points": len(points),
+                    "lastAt": points[-1]['at'],
+                    "metrics": summary,
+                    "regressions": regressions
+                })
+        return jsonify({
+            "status": "success",
+            "pages": pages
+        })
+
+    if page not in trend:
+        return jsonify({
+            "status": "error",
+            "message": f"No performance data for page {page}"
+        }), 404
+
+    series = {}
+    for browser_name, points in sorted(trend[page].items()):
+        if browser and browser_name != browser:
+            continue
+        points = points[-limit:] if limit > 0 else points
+        if metric:
+            points = [{**point, "values": {metric: point['values'][metric]}}
+                      for point in points if metric in point['values']]
+        series[browser_name] = points
+
+    return jsonify({
+        "status": "success",
+        "page": page,
+        "series": series
+    })
+
+@app.route('/stats', methods=['GET'])
+def get_stats():
+    """Per-test pass/fail/flaky counts and resource usage from the test history, flakiest first."""
+    tests = []
+    for name, entry in load_test_history().items():
+        runs = entry.get('runs', 0)
+        flaky_runs = entry.get('flakyRuns', 0)
+        tests.append({
+            "name": name,
+            "runs": runs,
+            "passed": entry.get('passedRuns', 0),
+            "failed": entry.get('failedRuns', 0),
+            "flaky": flaky_runs,
+            "flakyRate": round(flaky_runs / runs, 3) if runs else 0.0,
+            "retries": entry.get('retries', 0),
+            "lastStatus": entry.get('lastStatus'),
+            "lastFlakyAt": entry.get('lastFlakyAt'),
+            "durations": entry.get('durations', {}),
+            "resources": entry.get('resources', {})
+        })
+    tests.sort(key=lambda t: (-t['flakyRate'], -t['flaky'], t['name']))
+
+    return jsonify({
+        "status": "success",
+        "tests": tests,
+        "flakyTests": [t['name'] for t in tests if t['flaky'] > 0],
+        # Tests whose driver or browser processes outlived them on some browser
+        "leakingTests": [t['name'] for t in tests
+                         if any(usage.get('orphanedRuns') for usage in t['resources'].values())]
+    })
+
 @app.route('/execute-tests', methods=['POST'])
 def execute_tests():
+    run_id = None
     try:
         data = request.json
         browser = data.get('browser')
         framework = data.get('framework')
-        client_id = data.get('clientId')
-        app.logger.info(f"Received execute request: browser={browser}, framework={framework}, clientId={client_id}")
+        # Without a clientId the hub places tests across the whole worker pool
+        client_id = data.get('clientId') or None
+        mode = data.get('mode') or 'all'
+        app.logger.info(f"Received execute request: browser={browser}, framework={framework}, clientId={client_id or 'pool'}, mode={mode}")
 
-        test_cases_dir = os.path.join(os.path.dirname(__file__), 'test_cases')
-        test_files = []
-        
-        if framework == 'Robot':
-            test_files = [f for f in os.listdir(test_cases_dir) if f.endswith('.robot')]
-        elif framework == 'Selenium':
-            test_files = [f for f in os.listdir(test_cases_dir) if f.endswith('.py') and f != '__init__.py']
-        
-        app.logger.info(f"Found {len(test_files)} test files: {test_files}")
-        
-        if not test_files:
+        if mode not in RUN_MODES:
+            return jsonify({"error": f"Invalid mode: {mode}. Supported modes: {', '.join(RUN_MODES)}"}), 400
+        try:
+            network_policy = network_policy_from_request(data)
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": f"Invalid network policy: {str(e)}"}), 400
+        try:
+            screenshot_policy = screenshot_policy_from_request(data)
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({"error": f"Invalid screenshot policy: {str(e)}"}), 400
+        try:
+            timeouts = timeouts_from_request(data)
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({"error": f"Invalid timeouts: {str(e)}"}), 400
+
+        tests = load_test_files(framework)
+        if not tests:
             return jsonify({"error": f"No {framework} test files found"}), 400
 
-        for test_file in test_files:
-            app.logger.info(f"Starting test: {test_file}")
-            with open(os.path.join(test_cases_dir, test_file), 'r') as f:
-                test_content = f.read()
-            
-            test_case = {
-                'name': test_file,
-                'browser': browser,
-                'framework': framework,
-                'content': test_content
-            }
-            
-            ws.send(json.dumps({
-                "type": "test-case",
-                "clientId": client_id,
-                "testCase": test_case
-            }))
-            app.logger.info(f"Sent test case to Node server: {test_file} (framework: {framework})")
-            
-            # Wait for test result
-            while True:
-                result = ws.recv()
-                result_data = json.loads(result)
-                if result_data['type'] == 'test-result':
-                    save_report(result_data['result'])
-                    app.logger.info(f"Received and saved result for {test_file}")
-                    break
-                time.sleep(0.1)
+        tests = select_and_order_tests(tests, mode, browser)
+        app.logger.info(f"Selected {len(tests)} tests for mode {mode}: {[t['name'] for t in tests]}")
+
+        if not tests:
+            return jsonify({"message": f"No tests selected for mode {mode}", "tests": []})
+
+        shared_prefix = bool(data.get('sharedPrefix'))
+        run = create_run(browser, framework, client_id, mode, [t['name'] for t in tests], network=network_policy,
+                         shared_prefix=shared_prefix, screenshots=screenshot_policy, timeouts=timeouts)
+        run_id = run['runId']
+        app.logger.info(f"Created run {run_id}")
+        status = execute_jobs(run_id, [{
+            'test': test,
+            'browser': browser,
+            'framework': framework,
+            'estimatedDurationMs': test['estimatedDurationMs']
+        } for test in tests], client_id, retry_policy_from_request(data), network_policy, shared_prefix,
+            screenshot_policy, timeouts)
         
+        finish_run(run_id, status)
         app.logger.info("All test cases sent to Electron")
-        return jsonify({"message": f"Executed {len(test_files)} test cases"})
+        return jsonify({
+            "message": f"Executed {len(tests)} test cases",
+            "runId": run_id,
+            "runStatus": status,
+            "tests": [t['name'] for t in tests]
+        })
     except Exception as e:
+        if run_id:
+            finish_run(run_id, 'failed')
         app.logger.error(f"Error in execute_tests: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+@app.route('/execute-matrix', methods=['POST'])
+def execute_matrix():
+    """Run every test for each browser x framework x dataset combination as one run.
+
+    Jobs are queued on the hub together, so the combinations fan out across all
+    free worker slots instead of running one /execute-tests call after another.
+    """
+    run_id = None
+    try:
+        data = request.json
+        try:
+            browsers, frameworks, dataset_names = matrix_from_request(data)
+        except TypeError as e:
+            return jsonify({"error": f"Invalid matrix: {str(e)}"}), 400
+        client_id = data.get('clientId') or None
+        mode = data.get('mode') or 'all'
+        app.logger.info(f"Received matrix request: browsers={browsers}, frameworks={frameworks}, datasets={dataset_names}, clientId={client_id or 'pool'}, mode={mode}")
+
+        if not browsers or not frameworks:
+            return jsonify({"error": "At least one browser and one framework are required"}), 400
+        if mode not in RUN_MODES:
+            return jsonify({"error": f"Invalid mode: {mode}. Supported modes: {', '.join(RUN_MODES)}"}), 400
+        try:
+            network_policy = network_policy_from_request(data)
+        except (ValueError, TypeError) as e:
+            return jsonify({"error": f"Invalid network policy: {str(e)}"}), 400
+        try:
+            screenshot_policy = screenshot_policy_from_request(data)
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({"error": f"Invalid screenshot policy: {str(e)}"}), 400
+        try:
+            timeouts = timeouts_from_request(data)
+        except (ValueError, TypeError, AttributeError) as e:
+            return jsonify({"error": f"Invalid timeouts: {str(e)}"}), 400
+
+        datasets = load_datasets()
+        unknown = [name for name in dataset_names if name not in datasets]
+        if unknown:
+            return jsonify({"error": f"Unknown datasets: {', '.join(unknown)}. Available: {', '.join(datasets)}"}), 400
+        invalid = [name for name in dataset_names if not re.fullmatch(r'[A-Za-z0-9-]+', name)]
+        if invalid:
+            return jsonify({"error": f"Dataset names may only contain letters, digits and '-': {', '.join(invalid)}"}), 400
+
+        jobs = []
+        for framework in frameworks:
+            tests = load_test_files(framework)
+            if not tests:
+                return jsonify({"error": f"No {framework} test files found"}), 400
+            for browser in browsers:
+                # Estimates and selection are per browser, so each combination gets its own copies
+                selected = select_and_order_tests([dict(t) for t in tests], mode, browser)
+                for dataset in dataset_names:
+                    jobs.extend({
+                        'test': test,
+                        'browser': browser,
+                        'framework': framework,
+                        'dataset': dataset,
+                        'params': datasets[dataset],
+                        'estimatedDurationMs': test['estimatedDurationMs']
+                    } for test in selected)
+
+        # Longest first across the whole matrix, so the hub's placement packs slots tightly
+        jobs.sort(key=lambda job: -(job['estimatedDurationMs'] or 0))
+        labels = [f"{job['test']['name']} [{job['browser']}/{job['dataset']}]" for job in jobs]
+        app.logger.info(f"Expanded matrix into {len(jobs)} jobs")
+
+        if not jobs:
+            return jsonify({"message": f"No tests selected for mode {mode}", "tests": []})
+
+        shared_prefix = bool(data.get('sharedPrefix'))
+        run = create_run(None, None, client_id, mode, labels, matrix={
+            "browsers": browsers,
+            "frameworks": frameworks,
+            "datasets": dataset_names
+        }, network=network_policy, shared_prefix=shared_prefix, screenshots=screenshot_policy, timeouts=timeouts)
+        run_id = run['runId']
+        app.logger.info(f"Created matrix run {run_id}")
+
+        status = execute_jobs(run_id, jobs, client_id, retry_policy_from_request(data), network_policy,
+                              shared_prefix, screenshot_policy, timeouts)
+
+        finish_run(run_id, status)
+        return jsonify({
+            "message": f"Executed {len(jobs)} matrix jobs",
+            "runId": run_id,
+            "runStatus": status,
+            "tests": labels
+        })
+    except Exception as e:
+        if run_id:
+            finish_run(run_id, 'failed')
+        app.logger.error(f"Error in execute_matrix: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+
+@app.after_request
+def compress_response(response):
+    """Gzip large JSON responses (report lists, batches) for clients that accept it."""
+    if (response.direct_passthrough
+            or response.status_code != 200
+            or response.mimetype != 'application/json'
+            or 'Content-Encoding' in response.headers
+            or not client_accepts_gzip()):
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=6))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
 if __name__ == '__main__':
     if not os.path.exists('logs'):
         os.makedirs('logs')
-    connect_to_node_server()
-    app.run(port=5000, debug=True)
\ No newline at end of file
+    # The debug reloader also runs this block in its watcher process; only the
+    # serving process should talk to the hub and run background jobs.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        connect_to_node_server()
+        resume_unfinished_runs()
+        start_ws_reader()
+        start_compactor()
+        start_search_backfill()
+    app.run(port=PORT, debug=True)
\ No newline at end of file
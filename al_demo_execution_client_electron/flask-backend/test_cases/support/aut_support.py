@@ -0,0 +1,171 @@
+"""Helpers shared by the Selenium test cases.
+
+find() resolves a name from the locator registry and waits for the element,
+recording how long the lookup took and how many times WebDriverWait polled.
+Slow or absolute-XPath lookups also record alternative ID/CSS locators found
+in the live DOM. All samples are written to locator_profile.json in the
+working directory when the process exits, where the worker picks them up.
+Each successful lookup also records the timing of a newly loaded page and
+samples the page's performance metrics for the step (see perf_metrics.py).
+
+The worker's watchdog sends SIGTERM to a test that ran out of time or was
+cancelled. Importing this module turns that signal into an exception in the
+test, so it still takes its error screenshot, quits the driver and writes its
+profiles at exit before the watchdog kills what is left.
+"""
+import atexit
+import json
+import signal
+import sys
+import threading
+import time
+
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.ui import WebDriverWait
+
+from locators import LOCATORS
+from network_policy import record_page_load
+from perf_metrics import record_step
+
+STRATEGIES = {
+    "id": By.ID,
+    "name": By.NAME,
+    "xpath": By.XPATH,
+    "css": By.CSS_SELECTOR,
+    "link": By.LINK_TEXT,
+    "class": By.CLASS_NAME,
+    "tag": By.TAG_NAME,
+}
+
+PROFILE_PATH = "locator_profile.json"
+POLL_FREQUENCY = 0.25
+# Lookups slower than this get alternative locators suggested, as do absolute XPaths
+SUGGEST_SLOWER_THAN_MS = 500
+
+# Returns locators that match only the given element, best first
+SUGGEST_SCRIPT = r"""
+const el = arguments[0];
+const unique = (css) => {
+    try { return document.querySelectorAll(css).length === 1; } catch (e) { return false; }
+};
+const quote = (s) => s.replace(/\\/g, '\\\\').replace(/"/g, '\\"');
+const found = [];
+if (el.id && unique('#' + CSS.escape(el.id))) {
+    found.push('id=' + el.id);
+}
+const name = el.getAttribute('name');
+if (name && unique(el.tagName.toLowerCase() + '[name="' + quote(name) + '"]')) {
+    found.push('name=' + name);
+}
+for (const attr of el.getAttributeNames()) {
+    if (attr.startsWith('data-') || attr === 'aria-label' || attr === 'title') {
+        const css = el.tagName.toLowerCase() + '[' + attr + '="' + quote(el.getAttribute(attr)) + '"]';
+        if (unique(css)) {
+            found.push('css=' + css);
+        }
+    }
+}
+if (el.tagName === 'A' && el.textContent.trim()) {
+    const text = el.textContent.trim();
+    const links = Array.from(document.querySelectorAll('a')).filter((a) => a.textContent.trim() === text);
+    if (links.length === 1) {
+        found.push('link=' + text);
+    }
+}
+// Short CSS path anchored at the closest ancestor with an id
+let path = [];
+let node = el;
+while (node && node.nodeType === 1 && !(node !== el && node.id)) {
+    let step = node.tagName.toLowerCase();
+    const classes = Array.from(node.classList).filter((c) => /^[A-Za-z][\w-]*$/.test(c)).slice(0, 2);
+    if (classes.length) {
+        step += '.' + classes.join('.');
+    }
+    const siblings = node.parentElement ? Array.from(node.parentElement.children).filter((c) => c.tagName === node.tagName) : [];
+    if (siblings.length > 1) {
+        step += ':nth-of-type(' + (siblings.indexOf(node) + 1) + ')';
+    }
+    path.unshift(step);
+    node = node.parentElement;
+}
+if (node && node.id) {
+    const css = '#' + CSS.escape(node.id) + ' > ' + path.join(' > ');
+    if (unique(css)) {
+        found.push('css=' + css);
+    }
+}
+return found;
+"""
+
+_samples = []
+
+
+def is_absolute_xpath(strategy, value):
+    return strategy == "xpath" and value.startswith("/html")
+
+
+def suggest_alternatives(driver, element):
+    try:
+        return driver.execute_script(SUGGEST_SCRIPT, element) or []
+    except Exception as e:
+        print(f"Could not suggest locators: {str(e)}")
+        return []
+
+
+def record_sample(sample):
+    _samples.append(sample)
+
+
+def write_profile(path=PROFILE_PATH):
+    if not _samples:
+        return
+    with open(path, "w") as f:
+        json.dump(_samples, f, indent=2)
+
+
+atexit.register(write_profile)
+
+
+def stop_on_sigterm(signum, frame):
+    raise TimeoutError("Stopped by the worker's watchdog")
+
+
+# Robot suites load this module through locator_listener.py; Robot stops gracefully on SIGTERM itself
+if "robot" not in sys.modules and threading.current_thread() is threading.main_thread():
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+
+
+def find(driver, name, timeout=20, condition=EC.presence_of_element_located):
+    """Wait for the registry locator `name` and return its element, profiling the lookup."""
+    strategy, value = LOCATORS[name]
+    locator = (STRATEGIES[strategy], value)
+    polls = 0
+
+    def poll(d):
+        nonlocal polls
+        polls += 1
+        return condition(locator)(d)
+
+    started = time.perf_counter()
+    element = None
+    try:
+        element = WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(poll)
+        return element
+    finally:
+        elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        sample = {
+            "name": name,
+            "strategy": strategy,
+            "value": value,
+            "elapsedMs": elapsed_ms,
+            "retries": max(0, polls - 1),
+            "status": "found" if element is not None else "timeout",
+        }
+        if element is not None and (is_absolute_xpath(strategy, value) or elapsed_ms >= SUGGEST_SLOWER_THAN_MS):
+            sample["suggestions"] = suggest_alternatives(driver, element)
+        record_sample(sample)
+        print(f"Located {name} in {elapsed_ms}ms after {sample['retries']} retries ({sample['status']})")
+        if element is not None:
+            record_page_load(driver)
+            record_step(driver, name, elapsed_ms)
@@ -0,0 +1,137 @@
+"""Checkpoints that let tests with a common prefix share it.
+
+Tests mark the end of each shared stretch of navigation with a checkpoint and
+wrap the steps before it in a resume check:
+
+    if not resume(driver, 'login'):
+        ...log in...
+        checkpoint(driver, 'login')
+
+In shared-prefix runs the backend picks one test of each group to run in full.
+That test saves the browser state (URL, cookies, local and session storage) at
+the checkpoint named in AUT_CHECKPOINT_SAVE, to checkpoint_state.json in the
+working directory. The other tests of the group are forked from that state:
+AUT_CHECKPOINT_STATE points at it, and AUT_CHECKPOINT_RESUME lists the
+checkpoints it covers, so resume() restores the state on its first call and
+tells the test to skip every covered block. Outside shared-prefix runs both
+calls do nothing and the test runs from the start.
+
+Robot suites import this file as a library for the Resume Checkpoint and Save
+Checkpoint keywords, which work on SeleniumLibrary's current browser.
+"""
+import json
+import os
+from urllib.parse import urlparse
+
+# Keywords exposed to Robot; Python tests import the functions they need directly
+__all__ = ["resume_checkpoint", "save_checkpoint"]
+
+STATE_PATH = "checkpoint_state.json"
+
+STORAGE_SCRIPT = r"""
+const dump = (storage) => Object.fromEntries(Object.keys(storage).map((key) => [key, storage.getItem(key)]));
+return {localStorage: dump(window.localStorage), sessionStorage: dump(window.sessionStorage)};
+"""
+
+# Seeds storage from arguments[0] (or, as a new-document script, from the JSON below) on the saved origin
+SEED_STORAGE_SCRIPT = r"""
+(function (state) {
+    if (location.origin !== state.origin) {
+        return;
+    }
+    for (const [key, value] of Object.entries(state.localStorage)) {
+        window.localStorage.setItem(key, value);
+    }
+    for (const [key, value] of Object.entries(state.sessionStorage)) {
+        window.sessionStorage.setItem(key, value);
+    }
+})(%s);
+"""
+
+_restored = {"done": False}
+
+
+def forked():
+    """True when this test is forked from another test's checkpoint."""
+    return bool(os.environ.get("AUT_CHECKPOINT_RESUME"))
+
+
+def covered(name):
+    return name in os.environ.get("AUT_CHECKPOINT_RESUME", "").split(",")
+
+
+def origin(url):
+    parts = urlparse(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+def checkpoint(driver, name):
+    """Save the browser state if this test is the one its group's forks start from."""
+    if os.environ.get("AUT_CHECKPOINT_SAVE") != name:
+        return False
+    state = {"name": name, "url": driver.current_url, "cookies": driver.get_cookies()}
+    state.update(driver.execute_script(STORAGE_SCRIPT))
+    with open(STATE_PATH, "w") as f:
+        json.dump(state, f)
+    print(f"Saved checkpoint {name} at {state['url']} ({len(state['cookies'])} cookies)")
+    return True
+
+
+def restore(driver, state):
+    seed = dict(state, origin=origin(state["url"]))
+    if hasattr(driver, "execute_cdp_cmd"):
+        # Chromium: set cookies and seed storage before the page's own scripts run, in one page load
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setCookies", {"cookies": [{
+            "name": cookie["name"],
+            "value": cookie["value"],
+            "domain": cookie.get("domain"),
+            "path": cookie.get("path", "/"),
+            "secure": cookie.get("secure", False),
+            "httpOnly": cookie.get("httpOnly", False),
+            **({"expires": cookie["expiry"]} if "expiry" in cookie else {}),
+            **({"sameSite": cookie["sameSite"]} if cookie.get("sameSite") else {}),
+        } for cookie in state["cookies"]]})
+        script = driver.execute_cdp_cmd("Page.addScriptToEvaluateOnNewDocument",
+                                        {"source": SEED_STORAGE_SCRIPT % json.dumps(seed)})
+        try:
+            driver.get(state["url"])
+        finally:
+            driver.execute_cdp_cmd("Page.removeScriptToEvaluateOnNewDocument", {"identifier": script["identifier"]})
+        return
+
+    # Other browsers only take cookies for the current origin: open it first, then the saved URL
+    driver.get(f"{seed['origin']}/favicon.ico")
+    for cookie in state["cookies"]:
+        driver.add_cookie(cookie)
+    driver.execute_script(SEED_STORAGE_SCRIPT % "arguments[0]", seed)
+    driver.get(state["url"])
+
+
+def resume(driver, name):
+    """True if the block ending at checkpoint `name` is covered by the fork and must be skipped.
+
+    The saved state is restored on the first call that returns True.
+    """
+    if not covered(name):
+        return False
+    if not _restored["done"]:
+        with open(os.environ["AUT_CHECKPOINT_STATE"], "r") as f:
+            state = json.load(f)
+        restore(driver, state)
+        _restored["done"] = True
+        print(f"Resumed from checkpoint {state['name']} at {driver.current_url}")
+    return True
+
+
+def _selenium_driver():
+    from robot.libraries.BuiltIn import BuiltIn
+    return BuiltIn().get_library_instance("SeleniumLibrary").driver
+
+
+def resume_checkpoint(name):
+    return resume(_selenium_driver(), name)
+
+
+def save_checkpoint(name):
+    checkpoint(_selenium_driver(), name)
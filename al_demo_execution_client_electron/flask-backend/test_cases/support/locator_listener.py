@@ -0,0 +1,83 @@
+"""Robot Framework listener that profiles SeleniumLibrary locator lookups.
+
+Run with `--pythonpath support --listener support/locator_listener.py`. Every
+SeleniumLibrary keyword whose first argument is a locator is timed; samples use
+the registry name when the locator comes from support/locators.py and are
+written to locator_profile.json, the same file the Python helper produces.
+Robot keywords poll internally, so retry counts are not available here.
+
+The run's network policy is applied as soon as Open Browser returns, and page
+loads are timed after keywords that navigate or wait (see network_policy.py).
+The same keywords sample the page's performance metrics (see perf_metrics.py).
+"""
+from robot.libraries.BuiltIn import BuiltIn
+
+from aut_support import (SUGGEST_SLOWER_THAN_MS, STRATEGIES, is_absolute_xpath,
+                         record_sample, suggest_alternatives, write_profile)
+from locators import get_variables
+from network_policy import apply_policy, record_page_load
+from perf_metrics import record_step
+
+ROBOT_LISTENER_API_VERSION = 2
+
+_names_by_locator = {locator: name for name, locator in get_variables().items()}
+
+# Keywords after which a new document may have finished loading
+PAGE_LOAD_KEYWORDS = {'Go To', 'Go Back', 'Reload Page', 'Click Element', 'Click Button', 'Click Link', 'Submit Form'}
+
+
+def _resolve(argument):
+    if '${' not in argument:
+        return argument
+    try:
+        return BuiltIn().replace_variables(argument)
+    except Exception:
+        return argument
+
+
+def _driver():
+    return BuiltIn().get_library_instance('SeleniumLibrary').driver
+
+
+def end_keyword(name, attrs):
+    # NOT RUN (dry runs) and skipped keywords never touched the page
+    if attrs.get('libname') != 'SeleniumLibrary' or attrs.get('status') not in ('PASS', 'FAIL'):
+        return
+    if attrs.get('status') == 'PASS':
+        keyword = attrs.get('kwname', '')
+        if keyword == 'Open Browser':
+            apply_policy(_driver())
+        elif keyword in PAGE_LOAD_KEYWORDS or keyword.startswith('Wait Until'):
+            driver = _driver()
+            record_page_load(driver)
+            step = _names_by_locator.get(_resolve(attrs['args'][0]), keyword) if attrs.get('args') else keyword
+            record_step(driver, step, attrs.get('elapsedtime'))
+    if not attrs.get('args'):
+        return
+    locator = _resolve(attrs['args'][0])
+    strategy, _, value = locator.partition('=')
+    if strategy not in STRATEGIES or not value:
+        return
+
+    sample = {
+        "name": _names_by_locator.get(locator, locator),
+        "keyword": attrs.get('kwname'),
+        "strategy": strategy,
+        "value": value,
+        "elapsedMs": attrs.get('elapsedtime'),
+        "retries": None,
+        "status": "found" if attrs.get('status') == 'PASS' else "failed",
+    }
+    if attrs.get('status') == 'PASS' and (is_absolute_xpath(strategy, value)
+                                          or attrs.get('elapsedtime', 0) >= SUGGEST_SLOWER_THAN_MS):
+        try:
+            selenium = BuiltIn().get_library_instance('SeleniumLibrary')
+            element = selenium.find_element(locator)
+            sample["suggestions"] = suggest_alternatives(selenium.driver, element)
+        except Exception as e:
+            print(f"Could not suggest locators for {locator}: {str(e)}")
+    record_sample(sample)
+
+
+def close():
+    write_profile()
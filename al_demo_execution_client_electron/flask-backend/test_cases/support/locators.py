@@ -0,0 +1,36 @@
+"""Shared element locators for the Selenium and Robot test cases.
+
+Each entry maps a name to a (strategy, value) pair using SeleniumLibrary's
+strategy names. Python tests resolve names through aut_support.find(); Robot
+suites load this file with `Variables    support/locators.py`, which exposes
+every locator as ${NAME} in strategy=value form.
+"""
+
+_MAIN_MENU = "/html/body/div[1]/div[1]/div[1]/div[1]/div[2]/div[1]/ul[1]"
+
+LOCATORS = {
+    # Login form
+    "LOGIN_USERNAME": ("name", "UserName"),
+    "LOGIN_PASSWORD": ("name", "Password"),
+    "LOGIN_BUTTON": ("xpath", "/html/body/div[1]/div[3]/div[2]/div[1]/div[1]/form[1]/div[4]/div[2]/button[1]"),
+
+    # Main menu
+    "MENU_CLIENTS": ("xpath", f"{_MAIN_MENU}/li[1]/a[1]"),
+    "MENU_DIVISIONS": ("xpath", f"{_MAIN_MENU}/li[1]/ul[1]/li[3]/a[1]"),
+    "MENU_ADMIN": ("xpath", f"{_MAIN_MENU}/li[8]/a[1]"),
+    "MENU_USERS": ("xpath", f"{_MAIN_MENU}/li[8]/ul[1]/li[1]/a[1]"),
+
+    # Divisions page
+    "DIVISION_GRID_NEXT_PAGE": ("xpath", "//*[@id='grdDivision']/div[4]/a[5]/span[1]"),
+    "DIVISION_EDIT": ("xpath", "//*[@id='editClient']/i[1]"),
+    "DIVISION_NAME_FIELD": ("name", "DivisionName"),
+    "DIVISION_UPDATE": ("xpath", "//*[@id='form1']/div[3]/div[1]/div[1]/div[1]/button[2]"),
+
+    # User menu
+    "USER_MENU": ("xpath", "//*[@id='logoutForm']/ul[1]/li[1]/a[1]"),
+    "LOGOUT_LINK": ("xpath", "//*[@id='logoutForm']/ul[1]/li[1]/ul[1]/li[2]/a[1]"),
+}
+
+
+def get_variables():
+    return {name: f"{strategy}={value}" for name, (strategy, value) in LOCATORS.items()}
@@ -0,0 +1,149 @@
+"""Network shaping for test runs and page-load timing for every test.
+
+The worker passes a run's policy as JSON in AUT_NETWORK_POLICY:
+
+    {"blockUrls": ["*googletagmanager.com*"], "blockResourceTypes": ["image", "font"],
+     "cache": true, "throttle": {"latencyMs": 40, "downloadKbps": 4096, "uploadKbps": 1024}}
+
+On Chromium browsers (Chrome, Edge) the policy is applied over the DevTools
+protocol right after the driver starts: blocked URL patterns, resource types
+mapped to file-extension patterns, and optional throttling. With "cache" the
+browser keeps its disk cache in AUT_CACHE_DIR, which the worker shares between
+the tests run in the same slot. Firefox runs unshaped.
+
+Page loads are timed on every browser, with or without a policy, so shaped runs
+can be compared with unshaped ones. Timings are written to network_profile.json
+in the working directory when the process exits, where the worker picks them up.
+Robot suites import this file as a variables file for ${BROWSER_OPTIONS}.
+"""
+import atexit
+import json
+import os
+
+PROFILE_PATH = "network_profile.json"
+CHROMIUM_BROWSERS = ("chrome", "edge")
+
+# Network.setBlockedURLs only matches URLs, so resource types become extension patterns
+RESOURCE_TYPE_EXTENSIONS = {
+    "image": ("png", "jpg", "jpeg", "gif", "webp", "svg", "ico", "bmp"),
+    "font": ("woff", "woff2", "ttf", "otf", "eot"),
+    "media": ("mp4", "webm", "mp3", "ogg", "wav"),
+}
+
+# Timing of the current document, or null until its load event has fired
+PAGE_LOAD_SCRIPT = r"""
+const nav = performance.getEntriesByType('navigation')[0];
+if (!nav || nav.loadEventEnd <= 0) {
+    return null;
+}
+const resources = performance.getEntriesByType('resource');
+return {
+    timeOrigin: performance.timeOrigin,
+    url: location.href,
+    loadMs: nav.loadEventEnd,
+    domContentLoadedMs: nav.domContentLoadedEventEnd,
+    resources: resources.length,
+    transferBytes: resources.reduce((total, r) => total + (r.transferSize || 0), nav.transferSize || 0)
+};
+"""
+
+_profile = {"policy": None, "applied": False, "blockedPatterns": [], "pageLoads": []}
+_seen_documents = set()
+
+
+def load_policy():
+    policy = os.environ.get("AUT_NETWORK_POLICY")
+    if not policy:
+        return None
+    try:
+        return json.loads(policy)
+    except ValueError as e:
+        print(f"Ignoring invalid AUT_NETWORK_POLICY: {str(e)}")
+        return None
+
+
+def blocked_patterns(policy):
+    patterns = list(policy.get("blockUrls") or [])
+    for resource_type in policy.get("blockResourceTypes") or []:
+        for extension in RESOURCE_TYPE_EXTENSIONS.get(resource_type.lower(), ()):
+            patterns.extend([f"*.{extension}", f"*.{extension}?*"])
+    return patterns
+
+
+def browser_arguments(browser):
+    """Command-line arguments the policy needs, for a browser that is about to start."""
+    policy = load_policy()
+    cache_dir = os.environ.get("AUT_CACHE_DIR")
+    if policy and policy.get("cache") and cache_dir and browser.lower() in CHROMIUM_BROWSERS:
+        return [f"--disk-cache-dir={cache_dir}"]
+    return []
+
+
+def add_browser_arguments(options, browser):
+    for argument in browser_arguments(browser):
+        options.add_argument(argument)
+    return options
+
+
+def apply_policy(driver):
+    """Apply the run's policy to a freshly started driver; True if it was applied."""
+    policy = load_policy()
+    _profile["policy"] = policy
+    if not policy:
+        return False
+    if not hasattr(driver, "execute_cdp_cmd"):
+        print(f"Network policy needs a Chromium browser, running {driver.name} unshaped")
+        return False
+
+    try:
+        driver.execute_cdp_cmd("Network.enable", {})
+        patterns = blocked_patterns(policy)
+        if patterns:
+            driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": patterns})
+        throttle = policy.get("throttle")
+        if throttle:
+            driver.execute_cdp_cmd("Network.emulateNetworkConditions", {
+                "offline": False,
+                "latency": throttle.get("latencyMs", 0),
+                # kbit/s to bytes/s; -1 disables throttling in that direction
+                "downloadThroughput": throttle["downloadKbps"] * 128 if throttle.get("downloadKbps") else -1,
+                "uploadThroughput": throttle["uploadKbps"] * 128 if throttle.get("uploadKbps") else -1,
+            })
+    except Exception as e:
+        print(f"Could not apply network policy: {str(e)}")
+        return False
+
+    _profile["applied"] = True
+    _profile["blockedPatterns"] = patterns
+    print(f"Network policy applied: {len(patterns)} blocked patterns, throttle {throttle or 'off'}")
+    return True
+
+
+def record_page_load(driver):
+    """Record the current document's load timing once its load event has fired."""
+    try:
+        timing = driver.execute_script(PAGE_LOAD_SCRIPT)
+    except Exception:
+        return
+    if not timing or timing["timeOrigin"] in _seen_documents:
+        return
+    _seen_documents.add(timing.pop("timeOrigin"))
+    timing["loadMs"] = round(timing["loadMs"], 1)
+    timing["domContentLoadedMs"] = round(timing["domContentLoadedMs"], 1)
+    _profile["pageLoads"].append(timing)
+
+
+def write_profile(path=PROFILE_PATH):
+    if not _profile["pageLoads"] and not _profile["applied"]:
+        return
+    with open(path, "w") as f:
+        json.dump(_profile, f, indent=2)
+
+
+atexit.register(write_profile)
+
+
+def get_variables(browser="chrome"):
+    arguments = browser_arguments(browser)
+    options = ";".join(f'add_argument("{argument}")' for argument in arguments)
+    return {"BROWSER_OPTIONS": options or None}
@@ -0,0 +1,179 @@
+"""Performance metrics of the application under test, sampled per step.
+
+A step is sampled after each navigation or click: aut_support.find() samples
+once the next element is found, and locator_listener.py after keywords that
+navigate, click or wait. Each sample holds:
+
+  - navigation: Navigation Timing of the document, the first time it is seen
+  - resources: Resource Timing entries loaded since the previous sample
+  - metrics: CDP Performance.getMetrics counters, on Chromium browsers only
+
+Steps that loaded nothing (same document, no new resources) are skipped.
+
+The remaining steps are grouped by page, which is the URL path with numeric
+segments replaced by ":id". They are written to perf_metrics.json in the
+working directory when the process exits, together with one series per page
+and metric.
+"""
+import atexit
+import json
+import re
+from urllib.parse import urlparse
+
+PROFILE_PATH = "perf_metrics.json"
+# Slowest resources kept per step
+SLOWEST_RESOURCES = 3
+
+# CDP metric names kept, and their names in the report; durations are seconds in CDP
+CDP_METRICS = {
+    "Nodes": "nodes",
+    "Documents": "documents",
+    "JSEventListeners": "jsEventListeners",
+    "JSHeapUsedSize": "jsHeapUsedBytes",
+    "LayoutCount": "layoutCount",
+    "RecalcStyleCount": "recalcStyleCount",
+    "LayoutDuration": "layoutMs",
+    "RecalcStyleDuration": "recalcStyleMs",
+    "ScriptDuration": "scriptMs",
+    "TaskDuration": "taskMs",
+}
+
+# Timing of the current document and its resources not sampled yet: arguments are the
+# timeOrigin of the document sampled last and how many of its resources were sampled
+STEP_SCRIPT = r"""
+const seen = arguments[0] === performance.timeOrigin ? arguments[1] : 0;
+const nav = performance.getEntriesByType('navigation')[0];
+const entries = performance.getEntriesByType('resource');
+const resources = entries.slice(seen);
+return {
+    timeOrigin: performance.timeOrigin,
+    url: location.href,
+    title: document.title,
+    navigation: nav && nav.loadEventEnd > 0 ? {
+        ttfbMs: nav.responseStart,
+        domInteractiveMs: nav.domInteractive,
+        domContentLoadedMs: nav.domContentLoadedEventEnd,
+        loadMs: nav.loadEventEnd,
+        documentBytes: nav.transferSize || 0
+    } : null,
+    resourceCount: entries.length,
+    resources: resources.map((r) => ({
+        name: r.name,
+        type: r.initiatorType,
+        startMs: r.startTime,
+        endMs: r.responseEnd,
+        transferBytes: r.transferSize || 0
+    }))
+};
+"""
+
+_steps = []
+# The document sampled last, how many of its resources were sampled and whether its navigation was
+_document = {"timeOrigin": None, "resources": 0, "navigation": False}
+_cdp_sessions = set()
+
+
+def page_name(url):
+    path = urlparse(url).path.rstrip("/") or "/"
+    return re.sub(r"/\d+(?=/|$)", "/:id", path)
+
+
+def cdp_metrics(driver):
+    """Chromium performance counters, or None on other browsers."""
+    if not hasattr(driver, "execute_cdp_cmd"):
+        return None
+    try:
+        if driver.session_id not in _cdp_sessions:
+            driver.execute_cdp_cmd("Performance.enable", {})
+            _cdp_sessions.add(driver.session_id)
+        raw = {m["name"]: m["value"] for m in driver.execute_cdp_cmd("Performance.getMetrics", {})["metrics"]}
+    except Exception as e:
+        print(f"Could not read CDP performance metrics: {str(e)}")
+        return None
+    metrics = {}
+    for name, key in CDP_METRICS.items():
+        if name in raw:
+            metrics[key] = round(raw[name] * 1000, 1) if key.endswith("Ms") else raw[name]
+    return metrics
+
+
+def summarize_resources(resources):
+    if not resources:
+        return None
+    slowest = sorted(resources, key=lambda r: r["endMs"] - r["startMs"], reverse=True)[:SLOWEST_RESOURCES]
+    return {
+        "count": len(resources),
+        "transferBytes": sum(r["transferBytes"] for r in resources),
+        "durationMs": round(max(r["endMs"] for r in resources) - min(r["startMs"] for r in resources), 1),
+        "slowest": [{"name": r["name"], "type": r["type"], "durationMs": round(r["endMs"] - r["startMs"], 1)}
+                    for r in slowest],
+    }
+
+
+def record_step(driver, step, element_ms=None):
+    """Sample the page after a step; element_ms is how long the step waited for its element."""
+    try:
+        timing = driver.execute_script(STEP_SCRIPT, _document["timeOrigin"], _document["resources"])
+    except Exception:
+        return
+    if not timing:
+        return
+    if timing["timeOrigin"] != _document["timeOrigin"]:
+        _document.update(timeOrigin=timing["timeOrigin"], resources=0, navigation=False)
+    navigation = None
+    if timing["navigation"] and not _document["navigation"]:
+        _document["navigation"] = True
+        navigation = {key: round(value, 1) for key, value in timing["navigation"].items()}
+    _document["resources"] = timing["resourceCount"]
+    resources = summarize_resources(timing["resources"])
+    if navigation is None and resources is None:
+        return
+    metrics = cdp_metrics(driver)
+
+    _steps.append({
+        "step": step,
+        "page": page_name(timing["url"]),
+        "url": timing["url"],
+        "title": timing["title"],
+        "elementMs": element_ms,
+        "navigation": navigation,
+        "resources": resources,
+        "metrics": metrics,
+    })
+
+
+def flatten(sample):
+    """The numeric values of a sample, under the names used by the series and the trend."""
+    values = {}
+    if sample.get("elementMs") is not None:
+        values["elementMs"] = sample["elementMs"]
+    values.update(sample.get("navigation") or {})
+    resources = sample.get("resources")
+    if resources:
+        values["resourceCount"] = resources["count"]
+        values["resourceBytes"] = resources["transferBytes"]
+        values["resourceMs"] = resources["durationMs"]
+    values.update(sample.get("metrics") or {})
+    return values
+
+
+def series(steps):
+    """{page: {metric: [value per step, None where not sampled]}}"""
+    pages = {}
+    for sample in steps:
+        pages.setdefault(sample["page"], []).append(flatten(sample))
+    result = {}
+    for page, samples in pages.items():
+        names = sorted({name for values in samples for name in values})
+        result[page] = {name: [values.get(name) for values in samples] for name in names}
+    return result
+
+
+def write_profile(path=PROFILE_PATH):
+    if not _steps:
+        return
+    with open(path, "w") as f:
+        json.dump({"steps": _steps, "series": series(_steps)}, f, indent=2)
+
+
+atexit.register(write_profile)
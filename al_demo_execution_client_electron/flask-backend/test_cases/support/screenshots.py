@@ -0,0 +1,136 @@
+"""Screenshot capture policy shared by the Python tests and the Robot suites.
+
+Tests call capture(driver, name) wherever they want a screenshot and
+capture_failure(driver) when they fail. AUT_SCREENSHOT_POLICY, set by the worker
+from the run's policy, decides which screenshots are written to the working
+directory, where the worker collects them:
+
+  - all: every screenshot, as soon as it is taken (the default)
+  - on-failure: the last AUT_SCREENSHOT_BUFFER screenshots are kept in memory
+    and written only when the test fails, together with error.png
+  - first-and-last: the first screenshot right away and the latest one when the
+    process exits
+  - on-visual-change: a screenshot only when it differs visibly from the last
+    one written
+
+error.png is written on failure in every mode.
+
+Robot suites import this file as a library for the Capture Step Screenshot and
+Capture Failure Screenshot keywords, which work on SeleniumLibrary's current
+browser.
+"""
+import atexit
+import hashlib
+import io
+import os
+from collections import deque
+
+# Keywords exposed to Robot; Python tests import the functions they need directly
+__all__ = ["capture_step_screenshot", "capture_failure_screenshot"]
+
+POLICIES = ("all", "on-failure", "first-and-last", "on-visual-change")
+DEFAULT_BUFFER_SIZE = 5
+ERROR_SCREENSHOT = "error.png"
+# Mean per-pixel difference (0-255) of the grayscale thumbnails that counts as a visual change
+VISUAL_CHANGE_THRESHOLD = 2.0
+THUMBNAIL_SIZE = (64, 64)
+
+try:
+    from PIL import Image
+except ImportError:
+    # Without Pillow any byte difference counts as a change
+    Image = None
+
+
+def policy():
+    mode = os.environ.get("AUT_SCREENSHOT_POLICY", "all")
+    return mode if mode in POLICIES else "all"
+
+
+def buffer_size():
+    try:
+        return max(1, int(os.environ.get("AUT_SCREENSHOT_BUFFER", DEFAULT_BUFFER_SIZE)))
+    except ValueError:
+        return DEFAULT_BUFFER_SIZE
+
+
+# Screenshots taken but not written yet, oldest first: (name, png)
+_buffer = deque(maxlen=buffer_size())
+# What the last written screenshot looked like, for on-visual-change
+_last_written = {"count": 0, "fingerprint": None}
+
+
+def write(name, png):
+    with open(name, "wb") as f:
+        f.write(png)
+    _last_written["count"] += 1
+    print(f"Saved screenshot {name} ({len(png)} bytes)")
+
+
+def fingerprint(png):
+    """A grayscale thumbnail of the screenshot, or its hash without Pillow."""
+    if Image is not None:
+        try:
+            with Image.open(io.BytesIO(png)) as image:
+                return list(image.convert("L").resize(THUMBNAIL_SIZE).getdata())
+        except Exception as e:
+            print(f"Could not decode screenshot, comparing bytes: {str(e)}")
+    return hashlib.sha1(png).hexdigest()
+
+
+def changed(previous, current):
+    if previous is None:
+        return True
+    if isinstance(current, str) or isinstance(previous, str):
+        return current != previous
+    return sum(abs(a - b) for a, b in zip(previous, current)) / len(current) > VISUAL_CHANGE_THRESHOLD
+
+
+def capture(driver, name):
+    """Take a step screenshot; the policy decides whether and when it is written."""
+    mode = policy()
+    png = driver.get_screenshot_as_png()
+    if mode == "all" or (mode == "first-and-last" and _last_written["count"] == 0):
+        write(name, png)
+    elif mode == "on-visual-change":
+        current = fingerprint(png)
+        if changed(_last_written["fingerprint"], current):
+            write(name, png)
+            _last_written["fingerprint"] = current
+        else:
+            print(f"Skipped screenshot {name}: no visual change")
+    elif mode == "first-and-last":
+        # Only the latest is kept; it is written when the process exits
+        _buffer.clear()
+        _buffer.append((name, png))
+    else:
+        _buffer.append((name, png))
+        print(f"Buffered screenshot {name}")
+
+
+def capture_failure(driver):
+    """Write the buffered screenshots that led up to the failure, then error.png."""
+    while _buffer:
+        write(*_buffer.popleft())
+    write(ERROR_SCREENSHOT, driver.get_screenshot_as_png())
+
+
+def flush_last():
+    if policy() == "first-and-last" and _buffer:
+        write(*_buffer.pop())
+
+
+atexit.register(flush_last)
+
+
+def _selenium_driver():
+    from robot.libraries.BuiltIn import BuiltIn
+    return BuiltIn().get_library_instance("SeleniumLibrary").driver
+
+
+def capture_step_screenshot(name):
+    capture(_selenium_driver(), name)
+
+
+def capture_failure_screenshot():
+    capture_failure(_selenium_driver())
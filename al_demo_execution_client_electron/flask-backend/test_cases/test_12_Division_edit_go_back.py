@@ -1,5 +1,4 @@
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.chrome.service import Service as ChromeService
 from selenium.webdriver.firefox.service import Service as FirefoxService
@@ -7,13 +6,22 @@ from selenium.webdriver.edge.service import Service as EdgeService
 from webdriver_manager.chrome import ChromeDriverManager
 from webdriver_manager.firefox import GeckoDriverManager
 from webdriver_manager.microsoft import EdgeChromiumDriverManager
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 import time
 import unittest
 import os
 import sys
 
+# Shared locator registry and profiling helpers; the worker ships them in support/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'support'))
+from aut_support import find
+from network_policy import add_browser_arguments, apply_policy
+from screenshots import capture, capture_failure
+from checkpoints import checkpoint, forked, resume
+
+# Test data; matrix runs inject a dataset through TEST_* environment variables
+USERNAME = os.environ.get('TEST_USERNAME', 'Monica')
+PASSWORD = os.environ.get('TEST_PASSWORD', 'Monica@123')
+
 class DivisionEditGoBackTest(unittest.TestCase):
 
     def setUp(self):
@@ -36,6 +44,7 @@ class DivisionEditGoBackTest(unittest.TestCase):
                 options.add_argument('--disable-gpu')
                 options.add_argument('--no-sandbox')
                 options.add_argument('--disable-dev-shm-usage')
+                add_browser_arguments(options, browser)
                 self.driver = webdriver.Edge(options=options)
             else:
                 options = webdriver.ChromeOptions()
@@ -43,13 +52,17 @@ class DivisionEditGoBackTest(unittest.TestCase):
                 options.add_argument('--disable-gpu')
                 options.add_argument('--no-sandbox')
                 options.add_argument('--disable-dev-shm-usage')
+                add_browser_arguments(options, browser)
                 self.driver = webdriver.Chrome(options=options)
 
             print(f"{browser.capitalize()} driver initialized: {self.driver}")
-            # Navigate to the login page
-            print("Navigating to login page...")
-            self.driver.get("http://logistics.pearlarc.com/")
-            print(f"Current URL: {self.driver.current_url}")
+            # Block, cache and throttle per the run's network policy before the first page load
+            apply_policy(self.driver)
+            # Navigate to the login page, unless the test is forked from a shared prefix's checkpoint
+            if not forked():
+                print("Navigating to login page...")
+                self.driver.get("http://logistics.pearlarc.com/")
+                print(f"Current URL: {self.driver.current_url}")
         except Exception as e:
             print(f"Error in setUp: {str(e)}")
             raise
@@ -63,75 +76,59 @@ class DivisionEditGoBackTest(unittest.TestCase):
             current_dir = os.getcwd()
             print(f"Current directory: {current_dir}")
             
-            # Take screenshot before login
-            screenshot_path = os.path.join(current_dir, 'before_login.png')
-            driver.save_screenshot(screenshot_path)
-            print(f"Saved screenshot before login at: {screenshot_path}")
+            if not resume(driver, 'login'):
+                # Take screenshot before login
+                capture(driver, 'before_login.png')
             
-            # Login first
-            print("Finding username field...")
-            username_field = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.NAME, "UserName"))
-            )
-            username_field.send_keys("Monica")
-            print("Entered username: Monica")
+                # Login first
+                print("Finding username field...")
+                username_field = find(driver, 'LOGIN_USERNAME')
+                username_field.send_keys(USERNAME)
+                print(f"Entered username: {USERNAME}")
             
-            print("Finding password field...")
-            password_field = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.NAME, "Password"))
-            )
-            password_field.send_keys("Monica@123")
-            print("Entered password: Monica@123")
+                print("Finding password field...")
+                password_field = find(driver, 'LOGIN_PASSWORD')
+                password_field.send_keys(PASSWORD)
+                print(f"Entered password: {PASSWORD}")
             
-            print("Finding login button...")
-            login_button = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, "/html/body/div[1]/div[3]/div[2]/div[1]/div[1]/form[1]/div[4]/div[2]/button[1]"))
-            )
-            login_button.click()
-            print("Clicked login button")
-            time.sleep(2)
+                print("Finding login button...")
+                login_button = find(driver, 'LOGIN_BUTTON')
+                login_button.click()
+                print("Clicked login button")
+                time.sleep(2)
             
-            # Take screenshot after login
-            screenshot_path = os.path.join(current_dir, 'after_login.png')
-            driver.save_screenshot(screenshot_path)
-            print(f"Saved screenshot after login at: {screenshot_path}")
+                # Take screenshot after login
+                capture(driver, 'after_login.png')
+                checkpoint(driver, 'login')
             
-            # Click on CLIENTS menu
-            print("Clicking on CLIENTS menu...")
-            clients_menu = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, "/html/body/div[1]/div[1]/div[1]/div[1]/div[2]/div[1]/ul[1]/li[1]/a[1]"))
-            )
-            clients_menu.click()
-            print("Clicked on CLIENTS menu")
-            time.sleep(2)
+            if not resume(driver, 'divisions'):
+                # Click on CLIENTS menu
+                print("Clicking on CLIENTS menu...")
+                clients_menu = find(driver, 'MENU_CLIENTS')
+                clients_menu.click()
+                print("Clicked on CLIENTS menu")
+                time.sleep(2)
             
-            # Click on Divisions submenu
-            print("Clicking on Divisions submenu...")
-            divisions_submenu = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, "/html/body/div[1]/div[1]/div[1]/div[1]/div[2]/div[1]/ul[1]/li[1]/ul[1]/li[3]/a[1]"))
-            )
-            divisions_submenu.click()
-            print("Clicked on Divisions submenu")
-            time.sleep(2)
+                # Click on Divisions submenu
+                print("Clicking on Divisions submenu...")
+                divisions_submenu = find(driver, 'MENU_DIVISIONS')
+                divisions_submenu.click()
+                print("Clicked on Divisions submenu")
+                time.sleep(2)
             
-            # Take screenshot of Divisions page
-            screenshot_path = os.path.join(current_dir, 'divisions_page.png')
-            driver.save_screenshot(screenshot_path)
-            print(f"Saved screenshot of Divisions page at: {screenshot_path}")
+                # Take screenshot of Divisions page
+                capture(driver, 'divisions_page.png')
+                checkpoint(driver, 'divisions')
             
             # Click on edit icon
             print("Clicking on edit icon...")
-            edit_icon = WebDriverWait(driver, 20).until(
-                EC.presence_of_element_located((By.XPATH, "//*[@id='editClient']/i[1]"))
-            )
+            edit_icon = find(driver, 'DIVISION_EDIT')
             edit_icon.click()
             print("Clicked on edit icon")
             time.sleep(2)
             
             # Take screenshot of edit page
-            screenshot_path = os.path.join(current_dir, 'edit_page.png')
-            driver.save_screenshot(screenshot_path)
-            print(f"Saved screenshot of edit page at: {screenshot_path}")
+            capture(driver, 'edit_page.png')
             
             # Go back to divisions page (browser back button)
             print("Going back to divisions page...")
@@ -140,9 +137,7 @@ class DivisionEditGoBackTest(unittest.TestCase):
             time.sleep(2)
             
             # Take screenshot after going back
-            screenshot_path = os.path.join(current_dir, 'after_go_back.png')
-            driver.save_screenshot(screenshot_path)
-            print(f"Saved screenshot after going back at: {screenshot_path}")
+            capture(driver, 'after_go_back.png')
             
             print(f"Current URL after navigation: {driver.current_url}")
             print(f"Page title: {driver.title}")
@@ -151,9 +146,7 @@ class DivisionEditGoBackTest(unittest.TestCase):
             print(f"Error during test: {str(e)}")
             # Take screenshot on error
             try:
-                screenshot_path = os.path.join(os.getcwd(), 'error.png')
-                driver.save_screenshot(screenshot_path)
-                print(f"Saved error screenshot at: {screenshot_path}")
+                capture_failure(driver)
             except Exception as screenshot_error:
                 print(f"Could not save error screenshot: {str(screenshot_error)}")
             raise
@@ -185,4 +178,7 @@ if __name__ == '__main__':
 
     # Run the test suite
     runner = unittest.TextTestRunner()
-    runner.run(suite)
\ No newline at end of file
+    result = runner.run(suite)
+
+    # Exit non-zero on failure so the runner can tell passed and failed tests apart
+    sys.exit(0 if result.wasSuccessful() else 1)
\ No newline at end of file
@@ -1,5 +1,4 @@
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.chrome.service import Service as ChromeService
 from selenium.webdriver.firefox.service import Service as FirefoxService
@@ -12,6 +11,16 @@ import unittest
 import os
 import sys
 
+# Shared locator registry and profiling helpers; the worker ships them in support/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'support'))
+from aut_support import find
+from network_policy import add_browser_arguments, apply_policy
+from screenshots import capture, capture_failure
+
+# Test data; matrix runs inject a dataset through TEST_* environment variables
+USERNAME = os.environ.get('TEST_USERNAME', 'Monica')
+PASSWORD = os.environ.get('TEST_PASSWORD', 'Monica@123')
+
 class LoginTest(unittest.TestCase):
     def setUp(self):
         try:
@@ -33,6 +42,7 @@ class LoginTest(unittest.TestCase):
                 options.add_argument('--disable-gpu')
                 options.add_argument('--no-sandbox')
                 options.add_argument('--disable-dev-shm-usage')
+                add_browser_arguments(options, browser)
                 self.driver = webdriver.Edge(options=options)
             else:
                 options = webdriver.ChromeOptions()
@@ -40,9 +50,12 @@ class LoginTest(unittest.TestCase):
                 options.add_argument('--disable-gpu')
                 options.add_argument('--no-sandbox')
                 options.add_argument('--disable-dev-shm-usage')
+                add_browser_arguments(options, browser)
                 self.driver = webdriver.Chrome(options=options)
 
             print(f"{browser.capitalize()} driver initialized: {self.driver}")
+            # Block, cache and throttle per the run's network policy before the first page load
+            apply_policy(self.driver)
             # Navigate to the login page
             print("Navigating to login page...")
             self.driver.get("http://logistics.pearlarc.com/")
@@ -62,25 +75,23 @@ class LoginTest(unittest.TestCase):
             print(f"Current directory: {current_dir}")
 
             # Take screenshot before login
-            screenshot_path = os.path.join(current_dir, 'before_login.png')
-            driver.save_screenshot(screenshot_path)
-            print(f"Saved screenshot before login at: {screenshot_path}")
+            capture(driver, 'before_login.png')
 
             # Find and enter username
             print("Finding username field...")
-            username_field = driver.find_element(By.NAME, "UserName")
-            username_field.send_keys("Monica")
-            print("Entered username: Monica")
+            username_field = find(driver, 'LOGIN_USERNAME')
+            username_field.send_keys(USERNAME)
+            print(f"Entered username: {USERNAME}")
 
             # Find and enter password
             print("Finding password field...")
-            password_field = driver.find_element(By.NAME, "Password")
-            password_field.send_keys("Monica@123")
-            print("Entered password: Monica@123")
+            password_field = find(driver, 'LOGIN_PASSWORD')
+            password_field.send_keys(PASSWORD)
+            print(f"Entered password: {PASSWORD}")
 
             # Find and click login button
             print("Finding login button...")
-            login_button = driver.find_element(By.XPATH, "/html/body/div[1]/div[3]/div[2]/div[1]/div[1]/form[1]/div[4]/div[2]/button[1]")
+            login_button = find(driver, 'LOGIN_BUTTON')
             login_button.click()
             print("Clicked login button")
 
@@ -89,9 +100,7 @@ class LoginTest(unittest.TestCase):
             time.sleep(5)
 
             # Take screenshot after login
-            screenshot_path = os.path.join(current_dir, 'after_login.png')
-            driver.save_screenshot(screenshot_path)
-            print(f"Saved screenshot after login at: {screenshot_path}")
+            capture(driver, 'after_login.png')
 
             print(f"Current URL after login: {driver.current_url}")
             print(f"Page title: {driver.title}")
@@ -99,9 +108,7 @@ class LoginTest(unittest.TestCase):
             print(f"Error during test: {str(e)}")
             # Take screenshot on error
             try:
-                screenshot_path = os.path.join(os.getcwd(), 'error.png')
-                driver.save_screenshot(screenshot_path)
-                print(f"Saved error screenshot at: {screenshot_path}")
+                capture_failure(driver)
             except Exception as screenshot_error:
                 print(f"Could not save error screenshot: {str(screenshot_error)}")
             raise
@@ -133,4 +140,7 @@ if __name__ == '__main__':
 
     # Run the test suite
     runner = unittest.TextTestRunner()
-    runner.run(suite)
\ No newline at end of file
+    result = runner.run(suite)
+
+    # Exit non-zero on failure so the runner can tell passed and failed tests apart
+    sys.exit(0 if result.wasSuccessful() else 1)
\ No newline at end of file
@@ -0,0 +1,36 @@
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# app.py creates its stores under REPORTS_DIR when imported; keep them out of the tree
+os.environ.setdefault('REPORTS_DIR', tempfile.mkdtemp(prefix='reports-'))
+
+
+@pytest.fixture
+def client():
+    import app
+    app.app.config['TESTING'] = True
+    with app.app.test_client() as client:
+        yield client
+
+
+@pytest.fixture
+def reports():
+    """An empty report store: no reports, screenshots, archive, runs or index entries."""
+    import app
+    app.wait_for_report_writes(timeout=10)
+    for name in os.listdir(app.reports_dir):
+        path = os.path.join(app.reports_dir, name)
+        # Lock files and the open search index are shared with the running app
+        if name == 'locks' or name.startswith('index.db'):
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    app.clear_search_index()
+    return app
@@ -0,0 +1,50 @@
+import threading
+import time
+from collections import deque
+
+import app
+
+
+def changes(client, since, wait=0):
+    return client.get('/reports/changes', query_string={"since": since, "wait": wait}).get_json()
+
+
+def test_cursor_returns_only_changes_after_it(client):
+    cursor = client.get('/reports/changes').get_json()['cursor']
+    app.publish_change({"type": 'report', "filename": 'report_a.json'}, relay=False)
+    app.publish_change({"type": 'run', "runId": 'r1', "status": 'completed'}, relay=False)
+
+    page = changes(client, cursor)
+    assert not page['reset']
+    assert [change['type'] for change in page['changes']] == ['report', 'run']
+
+    empty = changes(client, page['cursor'])
+    assert (empty['changes'], empty['cursor']) == ([], page['cursor'])
+
+
+def test_waiting_request_returns_when_a_change_is_published(client):
+    cursor = client.get('/reports/changes').get_json()['cursor']
+    publisher = threading.Timer(0.2, app.publish_change, [{"type": 'report', "filename": 'report_b.json'}],
+                                {"relay": False})
+    publisher.start()
+
+    started = time.monotonic()
+    page = changes(client, cursor, wait=10)
+    publisher.join()
+
+    assert time.monotonic() - started < 5
+    assert [change['filename'] for change in page['changes']] == ['report_b.json']
+
+
+def test_cursors_from_another_epoch_or_beyond_the_log_ask_for_a_reset(client, monkeypatch):
+    monkeypatch.setattr(app, 'change_log', deque(maxlen=2))
+    cursor = client.get('/reports/changes').get_json()['cursor']
+    for i in range(3):
+        app.publish_change({"type": 'report', "filename": f'report_{i}.json'}, relay=False)
+    current = client.get('/reports/changes').get_json()['cursor']
+    epoch, _, seq = current.partition(':')
+
+    for stale in (cursor, f"previous-start:{seq}", f"{epoch}:{int(seq) + 1}"):
+        page = changes(client, stale)
+        assert (page['reset'], page['changes'], page['cursor']) == (True, [], current)
+    assert client.get('/reports/changes?since=garbage:x').status_code == 400
@@ -0,0 +1,56 @@
+import gzip
+import json
+
+import app
+
+
+def save(report, job_id='00000001'):
+    filename = app.save_report(report, job_id=job_id)
+    assert app.wait_for_report_writes([filename], 10)
+    return filename
+
+
+def test_encoded_report_round_trips_as_the_response_body():
+    report = {"name": 'test_a.py', "status": 'passed', "steps": [{"step": 'Login', "status": 'passed'}]}
+
+    member = app.encode_report(report)
+
+    assert json.loads(gzip.decompress(member)) == {"status": 'success', "report": report}
+    assert app.decode_report(member) == report
+    # Archives from before reports were stored as response bodies hold bare reports
+    assert app.decode_report(gzip.compress(json.dumps(report).encode())) == report
+
+
+def test_stored_report_is_served_gzipped_or_decoded(reports, client):
+    filename = save({"name": 'test_a.py', "status": 'passed', "output": 'ok'})
+
+    response = client.get(f'/reports/{filename}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))['report']['status'] == 'passed'
+
+    response = client.get(f'/reports/{filename}')
+    assert 'Content-Encoding' not in response.headers
+    assert response.get_json()['report']['output'] == 'ok'
+
+
+def test_archived_report_is_served_from_its_gzip_member(reports, client, monkeypatch):
+    filename = save({"name": 'test_a.py', "status": 'failed', "output": 'boom'})
+    monkeypatch.setattr(app, 'RETENTION_MAX_BYTES', 0)
+    assert app.compact_reports()['archived'] == 1
+
+    response = client.get(f'/reports/{filename}', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(response.data))['report']['output'] == 'boom'
+    assert client.get(f'/reports/{filename}').get_json()['report']['status'] == 'failed'
+
+
+def test_large_json_responses_are_compressed_for_clients_that_accept_gzip(reports, client):
+    for i in range(5):
+        save({"name": f'test_{i}.py', "status": 'passed', "output": 'x' * 500}, job_id=f'{i:08d}')
+
+    compressed = client.get('/reports', headers={'Accept-Encoding': 'gzip'})
+    plain = client.get('/reports')
+
+    assert compressed.headers['Content-Encoding'] == 'gzip'
+    assert json.loads(gzip.decompress(compressed.data)) == plain.get_json()
+    assert len(compressed.data) < len(plain.data)
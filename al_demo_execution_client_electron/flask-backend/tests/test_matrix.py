@@ -0,0 +1,51 @@
+import pytest
+
+import app
+
+
+@pytest.fixture
+def executed(monkeypatch):
+    """Capture the jobs of matrix runs instead of sending them to the hub."""
+    calls = []
+
+    def execute_jobs(run_id, jobs, *args, **kwargs):
+        calls.append(jobs)
+        return 'completed'
+
+    monkeypatch.setattr(app, 'execute_jobs', execute_jobs)
+    monkeypatch.setattr(app, 'load_test_history', lambda: {})
+    monkeypatch.setattr(app, 'load_datasets', lambda: {'default': {}, 'admin': {'user': 'admin'}})
+    monkeypatch.setattr(app, 'load_test_files', lambda framework: [
+        {"name": f"{framework}_a", "hash": 'h', "mtime": 0, "content": ''},
+        {"name": f"{framework}_b", "hash": 'h', "mtime": 0, "content": ''},
+    ])
+    return calls
+
+
+def test_matrix_expands_every_combination(client, executed):
+    response = client.post('/execute-matrix', json={
+        "browsers": ['Chrome', 'Firefox'], "frameworks": ['Selenium'], "datasets": ['default', 'admin']
+    })
+
+    assert response.status_code == 200
+    jobs = executed[0]
+    assert len(jobs) == 2 * 2 * 2
+    assert {(job['browser'], job['dataset']) for job in jobs} == {
+        ('chrome', 'default'), ('chrome', 'admin'), ('firefox', 'default'), ('firefox', 'admin')
+    }
+    assert all(job['params'] == {'user': 'admin'} for job in jobs if job['dataset'] == 'admin')
+    assert app.load_run(response.get_json()['runId'])['matrix']['browsers'] == ['chrome', 'firefox']
+
+
+@pytest.mark.parametrize('body', [
+    {"browsers": 'chrome', "frameworks": ['Selenium']},
+    {"browsers": ['chrome', 3], "frameworks": ['Selenium']},
+    {"browsers": ['chrome'], "frameworks": ['Selenium'], "datasets": 'default'},
+    {"browsers": ['chrome'], "frameworks": [{"name": 'Selenium'}]},
+])
+def test_malformed_matrix_is_rejected(client, executed, body):
+    response = client.post('/execute-matrix', json=body)
+
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith('Invalid matrix')
+    assert not executed
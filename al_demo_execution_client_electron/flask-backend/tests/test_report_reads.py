@@ -0,0 +1,76 @@
+import io
+import os
+
+import pytest
+
+import app
+
+OUTPUT = ''.join(f"line {i}\n" for i in range(10))
+
+
+@pytest.fixture
+def small_stride(monkeypatch):
+    monkeypatch.setattr(app, 'OUTPUT_LINE_INDEX_STRIDE', 3)
+
+
+def save(report, job_id='00000001'):
+    filename = app.save_report(report, job_id=job_id)
+    assert app.wait_for_report_writes([filename], 10)
+    return filename
+
+
+def test_line_index_counts_lines_and_records_every_stride(small_stride):
+    line_index = app.build_line_index(OUTPUT.encode())
+
+    assert line_index['lines'] == 10
+    assert line_index['bytes'] == len(OUTPUT)
+    assert line_index['offsets'] == [0, OUTPUT.index('line 3'), OUTPUT.index('line 6'), OUTPUT.index('line 9')]
+    assert app.build_line_index(b'no newline')['lines'] == 1
+
+
+@pytest.mark.parametrize('offset, limit', [(0, 2), (2, 3), (3, 1), (5, 5), (9, 1)])
+def test_line_ranges_seek_through_the_index(small_stride, offset, limit):
+    data = OUTPUT.encode()
+    line_index = app.build_line_index(data)
+
+    chunk = app.read_output_range(io.BytesIO(data), line_index, 'lines', offset, limit)
+
+    assert chunk.decode() == ''.join(OUTPUT.splitlines(keepends=True)[offset:offset + limit])
+
+
+def test_fields_project_the_report(reports, client):
+    filename = save({"name": 'test_a.py', "status": 'passed', "output": OUTPUT, "steps": []})
+
+    report = client.get(f'/reports/{filename}?fields=name,status,outputInfo').get_json()['report']
+
+    assert report == {"name": 'test_a.py', "status": 'passed',
+                      "outputInfo": {"bytes": len(OUTPUT), "lines": 10, "external": False}}
+
+
+@pytest.mark.parametrize('sidecar', [False, True], ids=['inline', 'sidecar'])
+def test_output_is_paged_by_lines_and_bytes(reports, client, monkeypatch, small_stride, sidecar):
+    monkeypatch.setattr(app, 'OUTPUT_SIDECAR_MIN_BYTES', 10 if sidecar else 1024 * 1024)
+    filename = save({"name": 'test_a.py', "status": 'passed', "output": OUTPUT})
+    assert os.path.exists(app.output_sidecar_path(filename)) == sidecar
+    url = f'/reports/{filename}/output'
+
+    page = client.get(f'{url}?offset=4&limit=4').get_json()
+    assert page['text'] == 'line 4\nline 5\nline 6\nline 7\n'
+    assert (page['totalLines'], page['nextOffset']) == (10, 8)
+    last = client.get(f'{url}?offset=8&limit=4').get_json()
+    assert (last['text'], last['nextOffset']) == ('line 8\nline 9\n', None)
+
+    assert client.get(f'{url}?head=1').get_json()['text'] == 'line 0\n'
+    assert client.get(f'{url}?tail=2').get_json()['text'] == 'line 8\nline 9\n'
+    page = client.get(f'{url}?unit=bytes&offset=7&limit=6').get_json()
+    assert (page['text'], page['nextOffset']) == ('line 1', 13)
+
+    # The full report carries its output wherever it is stored
+    assert client.get(f'/reports/{filename}').get_json()['report']['output'] == OUTPUT
+
+
+def test_invalid_output_ranges_are_rejected(reports, client):
+    filename = save({"name": 'test_a.py', "status": 'passed', "output": OUTPUT})
+
+    assert client.get(f'/reports/{filename}/output?unit=words').status_code == 400
+    assert client.get(f'/reports/{filename}/output?limit=ten').status_code == 400
@@ -0,0 +1,70 @@
+import base64
+import os
+import time
+
+import pytest
+
+import app
+
+HOUR = 3600
+
+
+def hot(filename, name='test_a.py', age_hours=0.0, size=100):
+    return {"filename": filename, "name": name, "mtime": time.time() - age_hours * HOUR, "size": size}
+
+
+@pytest.fixture(autouse=True)
+def limits(monkeypatch):
+    monkeypatch.setattr(app, 'RETENTION_MAX_AGE_HOURS', 24)
+    monkeypatch.setattr(app, 'RETENTION_MAX_PER_TEST', 2)
+    monkeypatch.setattr(app, 'RETENTION_MAX_BYTES', 1000)
+
+
+def test_reports_older_than_the_age_limit_are_archived():
+    selected = app.select_reports_to_archive([hot('old', age_hours=25), hot('new', name='test_b.py', age_hours=1)])
+
+    assert selected == {'old'}
+
+
+def test_only_the_newest_reports_of_each_test_are_kept():
+    reports = [hot(f"a{i}", age_hours=i) for i in range(4)] + [hot('b0', name='test_b.py', age_hours=5)]
+
+    assert app.select_reports_to_archive(reports) == {'a2', 'a3'}
+
+
+def test_oldest_reports_go_first_once_over_the_size_limit():
+    reports = [hot('a', age_hours=3, size=600), hot('b', name='test_b.py', age_hours=2, size=600),
+               hot('c', name='test_c.py', age_hours=1, size=300)]
+
+    assert app.select_reports_to_archive(reports) == {'a'}
+
+
+def test_compaction_counts_and_removes_screenshots_and_reads_only_archived_reports(reports, monkeypatch):
+    screenshot = base64.b64encode(b'\x89PNG' + b'x' * 2000).decode()
+    filenames = [
+        app.save_report({"name": 'test_a.py', "status": 'passed', "output": 'ok', "screenshots": {"page.png": screenshot}},
+                        job_id=f"{i:08d}")
+        for i in range(3)
+    ]
+    assert app.wait_for_report_writes(filenames, 10)
+    # Oldest first, as the retention limits see them
+    for age, filename in enumerate(reversed(filenames)):
+        os.utime(app.hot_report_path(filename), (time.time() - age * 60,) * 2)
+    app.index_reports([(filename, {"name": 'test_a.py'}) for filename in filenames])
+
+    loaded = []
+    read_report_file = app.read_report_file
+    monkeypatch.setattr(app, 'read_report_file', lambda filename, *args, **kwargs:
+                        loaded.append(filename) or read_report_file(filename, *args, **kwargs))
+    monkeypatch.setattr(app, 'RETENTION_MAX_PER_TEST', 20)
+    # Room for one report with its screenshot, but not two
+    monkeypatch.setattr(app, 'RETENTION_MAX_BYTES', 3000)
+
+    assert app.compact_reports()['archived'] == 2
+    assert sorted(loaded) == sorted(filenames[:2])
+    assert app.list_report_files() == [filenames[2]]
+    assert len(os.listdir(app.screenshots_dir)) == 1
+
+    archived = app.read_archived_report(filenames[0])
+    assert archived['screenshots'] == {}
+    assert archived['screenshotsRemoved'] == ['page.png']
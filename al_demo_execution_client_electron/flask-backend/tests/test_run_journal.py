@@ -0,0 +1,70 @@
+import threading
+
+import pytest
+
+import app
+
+TESTS = {
+    'Selenium': [{"name": 'test_a.py', "hash": 'a', "mtime": 0, "content": ''},
+                 {"name": 'test_b.py', "hash": 'b', "mtime": 0, "content": ''}]
+}
+
+
+@pytest.fixture(autouse=True)
+def test_files(monkeypatch):
+    monkeypatch.setattr(app, 'load_test_files', lambda framework: TESTS.get(framework, []))
+
+
+def queued(job_id, test, **extra):
+    return {"event": 'queued', "jobId": job_id, "test": test, "hash": 'h', "browser": 'chrome',
+            "framework": 'Selenium', "estimatedDurationMs": 1000, **extra}
+
+
+def test_unfinished_jobs_are_rebuilt_from_the_journal(reports):
+    app.append_run_journal('r1', [
+        {"event": 'started', "clientId": 'w1', "retryPolicy": {"maxAttempts": 2}, "timeouts": {"deadline": 5}},
+        queued('j1', 'test_a.py'),
+        queued('j2', 'test_b.py', dataset='admin', params={"user": 'admin'}),
+        queued('j3', 'test_a.py'),
+        queued('j4', 'test_gone.py'),
+        {"event": 'completed', "jobId": 'j1', "report": 'report_a.json', "status": 'passed'},
+        {"event": 'cancelled', "jobId": 'j3'},
+    ])
+    # A torn line from a crash mid-append is skipped
+    with open(app.run_journal_path('r1'), 'a') as f:
+        f.write('{"event": "completed", "jobI')
+
+    jobs, client_id, retry_policy, network_policy, screenshot_policy, timeouts = app.unfinished_jobs('r1')
+
+    assert [(job['jobId'], job['test']['name']) for job in jobs] == [('j2', 'test_b.py')]
+    assert (jobs[0]['dataset'], jobs[0]['params']) == ('admin', {"user": 'admin'})
+    assert (client_id, retry_policy, timeouts) == ('w1', {"maxAttempts": 2}, {"deadline": 5})
+    assert app.unfinished_jobs('no-journal') is None
+
+
+def test_interrupted_runs_of_this_instance_are_resumed(reports, monkeypatch):
+    resumed = {}
+
+    def execute_jobs(run_id, jobs, *args, **kwargs):
+        resumed[run_id] = [job['jobId'] for job in jobs]
+        return 'completed'
+
+    monkeypatch.setattr(app, 'execute_jobs', execute_jobs)
+    journaled = app.create_run('chrome', 'Selenium', None, 'all', ['test_a.py'])['runId']
+    app.append_run_journal(journaled, [{"event": 'started'}, queued('j1', 'test_a.py')])
+    unjournaled = app.create_run('chrome', 'Selenium', None, 'all', ['test_a.py'])['runId']
+    other = app.create_run('chrome', 'Selenium', None, 'all', ['test_a.py'])
+    other['instance'] = 'another-backend'
+    app.save_run(other)
+    app.append_run_journal(other['runId'], [{"event": 'started'}, queued('j2', 'test_a.py')])
+
+    app.resume_unfinished_runs()
+    for thread in threading.enumerate():
+        if thread.name.startswith('resume-'):
+            thread.join(10)
+
+    assert resumed == {journaled: ['j1']}
+    assert app.load_run(journaled)['status'] == 'completed'
+    assert 'resumedAt' in app.load_run(journaled)
+    assert app.load_run(unjournaled)['status'] == 'interrupted'
+    assert app.load_run(other['runId'])['status'] == 'running'
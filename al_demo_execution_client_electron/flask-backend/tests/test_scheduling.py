@@ -0,0 +1,52 @@
+import app
+
+
+def make_test(name, mtime=0, test_hash='h'):
+    return {"name": name, "hash": test_hash, "mtime": mtime}
+
+
+def order(monkeypatch, tests, history, mode='all'):
+    monkeypatch.setattr(app, 'load_test_history', lambda: history)
+    return [t['name'] for t in app.select_and_order_tests(tests, mode, browser='Chrome')]
+
+
+def durations(ms):
+    return {"durations": {"chrome": ms}, "lastPassedHash": 'h'}
+
+
+def test_failing_then_changed_then_the_rest_each_longest_first(monkeypatch):
+    history = {
+        'fail_short.py': {**durations(1000), "lastStatus": 'failed', "lastFailedAt": 200},
+        'fail_long.py': {**durations(9000), "lastStatus": 'failed', "lastFailedAt": 100},
+        'changed_short.py': {**durations(2000), "lastPassedHash": 'old'},
+        'changed_long.py': {**durations(8000), "lastPassedHash": 'old'},
+        'stable_short.py': durations(3000),
+        'stable_long.py': durations(7000),
+    }
+    tests = [make_test(name) for name in sorted(history)]
+
+    assert order(monkeypatch, tests, history) == [
+        'fail_long.py', 'fail_short.py',
+        'changed_long.py', 'changed_short.py',
+        'stable_long.py', 'stable_short.py',
+    ]
+    assert tests[0]['estimatedDurationMs'] == 8000
+
+
+def test_tests_without_history_count_as_changed_and_go_last_in_their_group(monkeypatch):
+    history = {'changed.py': {**durations(5000), "lastPassedHash": 'old'}}
+    tests = [make_test('new.py'), make_test('changed.py')]
+
+    assert order(monkeypatch, tests, history) == ['changed.py', 'new.py']
+
+
+def test_modes_filter_before_ordering(monkeypatch):
+    history = {
+        'fail.py': {**durations(1000), "lastStatus": 'failed'},
+        'changed.py': {**durations(2000), "lastPassedHash": 'old'},
+        'stable.py': durations(3000),
+    }
+    tests = [make_test(name) for name in history]
+
+    assert order(monkeypatch, tests, history, 'failed-only') == ['fail.py']
+    assert order(monkeypatch, [make_test(n) for n in history], history, 'changed-only') == ['changed.py']
@@ -0,0 +1,37 @@
+import app
+
+LOGIN = "find(driver, 'username').send_keys(user)\nfind(driver, 'login').click()\ncheckpoint(driver, 'logged_in')\n"
+MENU = "find(driver, 'menu').click()\ncheckpoint(driver, 'menu_open')\n"
+
+
+def job(job_id, content, estimate, browser='chrome'):
+    return {"jobId": job_id, "test": {"name": f"{job_id}.py", "content": content}, "framework": 'Selenium',
+            "browser": browser, "estimatedDurationMs": estimate}
+
+
+def test_jobs_fork_from_the_shortest_job_at_their_deepest_shared_checkpoint():
+    jobs = {j['jobId']: j for j in [
+        job('menu_long', LOGIN + MENU + "find(driver, 'edit').click()\n", 9000),
+        job('menu_short', LOGIN + MENU + "find(driver, 'delete').click()\n", 3000),
+        job('login_long', LOGIN + "find(driver, 'profile').click()\n", 8000),
+        job('login_short', LOGIN + "find(driver, 'logout').click()\n", 2000),
+        job('other_login', "find(driver, 'email').send_keys(user)\ncheckpoint(driver, 'logged_in')\n", 1000),
+        job('firefox', LOGIN + MENU, 500, browser='firefox'),
+    ]}
+
+    assert app.plan_shared_prefixes(list(jobs.values())) == 2
+
+    assert jobs['menu_short']['checkpoint'] == {"save": 'menu_open'}
+    assert (jobs['menu_long']['forkOf'], jobs['menu_long']['resume']) == ('menu_short', ['logged_in', 'menu_open'])
+    assert jobs['login_short']['checkpoint'] == {"save": 'logged_in'}
+    assert (jobs['login_long']['forkOf'], jobs['login_long']['resume']) == ('login_short', ['logged_in'])
+    # Different steps before the checkpoint, or another browser, share nothing
+    for job_id in ('other_login', 'firefox'):
+        assert 'forkOf' not in jobs[job_id] and 'checkpoint' not in jobs[job_id]
+
+
+def test_a_job_alone_at_its_deepest_shared_checkpoint_runs_in_full():
+    jobs = [job('a', LOGIN + MENU, 1000), job('b', LOGIN + MENU, 2000), job('c', LOGIN, 3000)]
+
+    assert app.plan_shared_prefixes(jobs) == 1
+    assert 'forkOf' not in jobs[2] and 'checkpoint' not in jobs[2]
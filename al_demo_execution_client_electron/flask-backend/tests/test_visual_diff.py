@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import visual_diff
+
+pytestmark = pytest.mark.skipif(not visual_diff.available(), reason="numpy/Pillow not installed")
+
+
+def save_png(path, color, box=None):
+    from PIL import Image
+    image = Image.new('RGB', (64, 64), color)
+    if box:
+        image.paste((255, 0, 0), box)
+    image.save(path)
+    return str(path)
+
+
+def test_changed_screenshot_without_masks_reports_changed(tmp_path):
+    store = visual_diff.BaselineStore(str(tmp_path / 'baselines'))
+    store.approve('test_a.py', 'chrome', 'page.png', save_png(tmp_path / 'baseline.png', (255, 255, 255)))
+
+    result = store.compare('test_a.py', 'chrome', 'page.png',
+                           save_png(tmp_path / 'current.png', (255, 255, 255), (0, 0, 16, 16)),
+                           str(tmp_path / 'diff.png'))
+
+    assert not os.path.exists(tmp_path / 'baselines' / 'masks.json')
+    assert result['status'] == 'changed'
+    assert result['changedPixels'] == 256
+    assert os.path.exists(tmp_path / 'diff.png')
+
+
+def test_identical_screenshot_matches_without_decoding(tmp_path):
+    store = visual_diff.BaselineStore(str(tmp_path / 'baselines'))
+    path = save_png(tmp_path / 'baseline.png', (255, 255, 255))
+    store.approve('test_a.py', 'chrome', 'page.png', path)
+
+    result = store.compare('test_a.py', 'chrome', 'page.png', path, str(tmp_path / 'diff.png'))
+
+    assert result['status'] == 'match'
+    assert not os.path.exists(tmp_path / 'diff.png')
+
+
+def save_gradient_png(path, changed_pixel=None):
+    import numpy as np
+    from PIL import Image
+    pixels = np.tile(np.arange(0, 256, 4, dtype=np.uint8)[None, :, None], (64, 1, 3))
+    if changed_pixel:
+        pixels[changed_pixel] = (255, 0, 0)
+    Image.fromarray(pixels).save(path)
+    return str(path)
+
+
+def test_perceptually_identical_screenshot_is_unchanged_without_pixel_diff(tmp_path, monkeypatch):
+    store = visual_diff.BaselineStore(str(tmp_path / 'baselines'))
+    store.approve('test_a.py', 'chrome', 'page.png', save_gradient_png(tmp_path / 'baseline.png'))
+    current = save_gradient_png(tmp_path / 'current.png', (30, 30))
+
+    result = store.compare('test_a.py', 'chrome', 'page.png', current, str(tmp_path / 'diff.png'))
+
+    assert result['status'] == 'unchanged'
+    assert result['hammingDistance'] == 0
+    assert not store.cache
+
+    monkeypatch.setattr(visual_diff, 'PHASH_THRESHOLD', -1)
+    result = store.compare('test_a.py', 'chrome', 'page.png', current, str(tmp_path / 'diff.png'))
+
+    assert result['status'] == 'match'
+    assert result['changedPixels'] == 1
@@ -0,0 +1,248 @@
+"""Visual regression of test screenshots against approved baselines.
+
+Baselines live in <baselines_dir>/<browser>/<test>/<screenshot> with an
+index.json holding each baseline's SHA-256 and perceptual hash, so identical
+screenshots are recognised without decoding any image. Ignore masks are read
+from <baselines_dir>/masks.json:
+
+    {"test_13_Division_edit.py/after_update.png": [[x, y, width, height], ...],
+     "*/after_login.png": [...]}
+
+NumPy and Pillow are optional; without them comparisons report "unavailable".
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import numpy as np
+    from PIL import Image
+except ImportError:
+    np = None
+    Image = None
+
+# A pixel counts as changed when any channel differs by more than this
+PIXEL_THRESHOLD = int(os.environ.get('VISUAL_DIFF_PIXEL_THRESHOLD', 24))
+# Screenshots with at most this fraction of changed (unmasked) pixels still match
+MATCH_TOLERANCE = float(os.environ.get('VISUAL_DIFF_TOLERANCE', 0.001))
+# Screenshots whose perceptual hash is at most this many bits from the baseline's are
+# reported "unchanged" without a pixel diff. The hash is taken from a 9x8 thumbnail, so
+# this trades small changes (a digit, a one-line message) for skipping the decode of the
+# baseline; -1 always diffs the pixels.
+PHASH_THRESHOLD = int(os.environ.get('VISUAL_DIFF_PHASH_THRESHOLD', 0))
+# Changed pixels are grouped into square blocks of this size to report regions
+REGION_SIZE = 32
+MAX_REGIONS = 20
+# Decoded baselines kept in memory, keyed by path and mtime
+BASELINE_CACHE_SIZE = 64
+
+
+def available():
+    return np is not None
+
+
+def file_sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def perceptual_hash(image):
+    """64-bit difference hash (dHash) of a PIL image, as 16 hex digits."""
+    small = np.asarray(image.convert('L').resize((9, 8), Image.BILINEAR), dtype=np.int16)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return f"{int(np.packbits(bits).view('>u8')[0]):016x}"
+
+
+def hamming_distance(hash_a, hash_b):
+    return bin(int(hash_a, 16) ^ int(hash_b, 16)).count('1')
+
+
+def load_rgb(path):
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+def changed_regions(changed):
+    """Bounding boxes of the REGION_SIZE blocks with changed pixels, most changed first."""
+    height, width = changed.shape
+    rows = -(-height // REGION_SIZE)
+    cols = -(-width // REGION_SIZE)
+    padded = np.zeros((rows * REGION_SIZE, cols * REGION_SIZE), dtype=bool)
+    padded[:height, :width] = changed
+    counts = padded.reshape(rows, REGION_SIZE, cols, REGION_SIZE).sum(axis=(1, 3))
+
+    block_rows, block_cols = np.nonzero(counts)
+    order = np.argsort(-counts[block_rows, block_cols])[:MAX_REGIONS]
+    return [{
+        "x": int(block_cols[i] * REGION_SIZE),
+        "y": int(block_rows[i] * REGION_SIZE),
+        "width": int(min(REGION_SIZE, width - block_cols[i] * REGION_SIZE)),
+        "height": int(min(REGION_SIZE, height - block_rows[i] * REGION_SIZE)),
+        "changedPixels": int(counts[block_rows[i], block_cols[i]])
+    } for i in order], int(len(block_rows))
+
+
+def render_diff(baseline, changed, diff_path):
+    """Write the baseline dimmed to grey with changed pixels painted red."""
+    grey = (baseline.mean(axis=2) * 0.4 + 150).astype(np.uint8)
+    diff = np.repeat(grey[:, :, None], 3, axis=2)
+    diff[changed] = (255, 0, 0)
+    Image.fromarray(diff).save(diff_path, optimize=False, compress_level=1)
+
+
+class BaselineStore:
+    def __init__(self, baselines_dir):
+        self.baselines_dir = baselines_dir
+        self.index_path = os.path.join(baselines_dir, 'index.json')
+        self.masks_path = os.path.join(baselines_dir, 'masks.json')
+        self.lock = threading.Lock()
+        self.index = None
+        self.index_mtime = None
+        # No masks.json has the same mtime (None) as the initial state
+        self.masks = {}
+        self.masks_mtime = None
+        self.cache = OrderedDict()
+
+    @staticmethod
+    def key(browser, test_name, screenshot_name):
+        return f"{(browser or 'chrome').lower()}/{test_name}/{screenshot_name}"
+
+    def load_index(self):
+        # Reloaded when changed on disk, e.g. by another backend sharing the store
+        mtime = os.path.getmtime(self.index_path) if os.path.exists(self.index_path) else None
+        if self.index is None or mtime != self.index_mtime:
+            self.index = {}
+            if mtime is not None:
+                with open(self.index_path, 'r') as f:
+                    self.index = json.load(f)
+            self.index_mtime = mtime
+        return self.index
+
+    def save_index(self):
+        os.makedirs(self.baselines_dir, exist_ok=True)
+        tmp_path = self.index_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=4)
+        os.replace(tmp_path, self.index_path)
+        self.index_mtime = os.path.getmtime(self.index_path)
+
+    def load_masks(self):
+        mtime = os.path.getmtime(self.masks_path) if os.path.exists(self.masks_path) else None
+        if mtime != self.masks_mtime:
+            self.masks = {}
+            if mtime is not None:
+                with open(self.masks_path, 'r') as f:
+                    self.masks = json.load(f)
+            self.masks_mtime = mtime
+        return self.masks
+
+    def mask_for(self, test_name, screenshot_name, shape):
+        """Boolean array of the pixels to ignore, or None if nothing is masked."""
+        with self.lock:
+            masks = self.load_masks()
+        rects = []
+        for key in (f"{test_name}/{screenshot_name}", f"*/{screenshot_name}", f"{test_name}/*", "*/*"):
+            rects.extend(masks.get(key, []))
+        if not rects:
+            return None
+        mask = np.zeros(shape, dtype=bool)
+        for x, y, width, height in rects:
+            mask[max(0, y):max(0, y + height), max(0, x):max(0, x + width)] = True
+        return mask
+
+    def baseline_pixels(self, path):
+        # Decoded outside the lock; two threads missing the same baseline both decode it
+        cache_key = (path, os.path.getmtime(path))
+        with self.lock:
+            pixels = self.cache.get(cache_key)
+            if pixels is not None:
+                self.cache.move_to_end(cache_key)
+                return pixels
+        pixels = load_rgb(path)
+        with self.lock:
+            self.cache[cache_key] = pixels
+            if len(self.cache) > BASELINE_CACHE_SIZE:
+                self.cache.popitem(last=False)
+        return pixels
+
+    def compare(self, test_name, browser, screenshot_name, screenshot_path, diff_path):
+        """Compare a screenshot with its baseline and return the diff summary."""
+        if not available():
+            return {"status": "unavailable"}
+
+        with self.lock:
+            entry = self.load_index().get(self.key(browser, test_name, screenshot_name))
+        sha256 = file_sha256(screenshot_path)
+        if entry is None:
+            return {"status": "new", "sha256": sha256}
+        # Byte-identical screenshots need no decoding at all
+        if entry['sha256'] == sha256:
+            return {"status": "match", "score": 0.0, "changedPixels": 0, "hammingDistance": 0, "sha256": sha256}
+
+        with Image.open(screenshot_path) as image:
+            phash = perceptual_hash(image)
+            size = list(image.size)
+            result = {"sha256": sha256, "phash": phash}
+            if entry.get('phash'):
+                result['hammingDistance'] = hamming_distance(phash, entry['phash'])
+                if result['hammingDistance'] <= PHASH_THRESHOLD and entry.get('size') == size:
+                    result.update({"status": "unchanged", "score": 0.0})
+                    return result
+            current = np.asarray(image.convert('RGB'))
+
+        baseline = self.baseline_pixels(os.path.join(self.baselines_dir, entry['path']))
+        if baseline.shape != current.shape:
+            result.update({"status": "size-mismatch", "score": 1.0,
+                           "size": list(current.shape[1::-1]), "baselineSize": list(baseline.shape[1::-1])})
+            return result
+
+        changed = (np.abs(current.astype(np.int16) - baseline.astype(np.int16)).max(axis=2) > PIXEL_THRESHOLD)
+        mask = self.mask_for(test_name, screenshot_name, changed.shape)
+        considered = changed.size
+        if mask is not None:
+            changed &= ~mask
+            considered -= int(mask.sum())
+
+        changed_pixels = int(changed.sum())
+        score = changed_pixels / considered if considered else 0.0
+        result.update({
+            "status": "match" if score <= MATCH_TOLERANCE else "changed",
+            "score": round(score, 6),
+            "changedPixels": changed_pixels
+        })
+        if changed_pixels:
+            result['regions'], result['changedRegions'] = changed_regions(changed)
+            render_diff(baseline, changed, diff_path)
+            result['diffImage'] = diff_path
+        return result
+
+    def approve(self, test_name, browser, screenshot_name, screenshot_path, source=None):
+        """Make a screenshot the baseline for its test, browser and screenshot name."""
+        key = self.key(browser, test_name, screenshot_name)
+        relative_path = key
+        target_path = os.path.join(self.baselines_dir, relative_path)
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        shutil.copyfile(screenshot_path, target_path)
+
+        entry = {
+            "path": relative_path,
+            "sha256": file_sha256(target_path),
+            "approvedAt": time.time(),
+            "source": source
+        }
+        if available():
+            with Image.open(target_path) as image:
+                entry['phash'] = perceptual_hash(image)
+                entry['size'] = list(image.size)
+        with self.lock:
+            self.load_index()[key] = entry
+            self.save_index()
+        return entry
+
+    def entries(self):
+        with self.lock:
+            return dict(self.load_index())
@@ -1,6 +1,7 @@
 const WebSocket = require('ws');
 const winston = require('winston');
 const fs = require('fs').promises;
+const { appendFileSync, existsSync, mkdirSync, readFileSync, renameSync, writeFileSync } = require('fs');
 const path = require('path');
 
 // Logger setup
@@ -30,8 +31,245 @@ const wss = new WebSocket.Server({ port: 8080 });
 logger.info('Node WebSocket server running on ws://localhost:8080');
 
 const clients = new Map();
-const flaskClient = new Set();
+// Flask backends by instance id. Several instances may share the hub: results,
+// cancellations and resends go only to the instance that submitted the job (its
+// owner), and wait for it while it is away.
+const flaskClients = new Map();
+// Messages for owners that are not connected, sent when they register again. Results
+// are not kept here: they stay in the job table until acknowledged and are resent from there.
+const flaskOutbox = new Map();
 const clientState = new Map();
+// Pool tests that no connected worker can run yet, held while workers are still probing
+// their environment (or none is connected at all) and placed when a capable one registers.
+// A test that no worker can run once they have all reported their capabilities fails.
+const unplacedQueue = [];
+
+// Duration assumed for tests without history when estimating a worker's backlog
+const DEFAULT_ESTIMATE_MS = 60000;
+// Tests without an estimate are spread round-robin across capable workers
+let roundRobinCursor = 0;
+// Lookahead: the head of a busy worker's queue is announced with prefetch-test so the
+// worker can prepare it while its slots are still running. Up to this many tests per
+// slot are announced ahead; 0 turns prefetching off.
+const PREFETCH_PER_SLOT = Math.max(0, parseInt(process.env.HUB_PREFETCH_PER_SLOT ?? '1', 10) || 0);
+
+// Every job the hub has accepted, by job id, until Flask acknowledges its result:
+// { testCase, owner, state: 'queued' | 'dispatched' | 'completed', result }, where owner
+// is the id of the Flask instance that submitted it. Changes are
+// appended to the journal so a restarted hub can pick up where it left off.
+const jobs = new Map();
+const JOURNAL_PATH = process.env.HUB_JOURNAL_PATH || path.join(__dirname, 'data', 'journal.ndjson');
+// The journal keeps only what routes and places a job. Test content, support files and
+// results stay in memory: after a restart the hub knows its jobs as stubs ({ stub: true })
+// and asks their owners to resubmit them, and results it held are lost, so their tests run again.
+const JOURNAL_FIELDS = ['jobId', 'runId', 'name', 'browser', 'framework', 'dataset', 'estimatedDurationMs'];
+// The journal is rewritten with only the live jobs once it grows past this size
+const JOURNAL_COMPACT_BYTES = parseInt(process.env.HUB_JOURNAL_COMPACT_BYTES, 10) || 1024 * 1024;
+let journalBytes = 0;
+// Tests that were running on a worker that went away (or on any worker, after a hub
+// restart) wait this long for the worker to reconnect and report them in flight
+// before they are rescheduled
+const RECONNECT_GRACE_MS = parseInt(process.env.HUB_RECONNECT_GRACE_MS, 10) || 15000;
+const awaitingReconnect = new Map();
+
+function journalEntry(testCase) {
+  const entry = {};
+  JOURNAL_FIELDS.forEach((field) => {
+    if (testCase[field] !== undefined) {
+      entry[field] = testCase[field];
+    }
+  });
+  return entry;
+}
+
+function journal(event) {
+  const line = JSON.stringify(event) + '\n';
+  try {
+    appendFileSync(JOURNAL_PATH, line);
+    journalBytes += Buffer.byteLength(line);
+  } catch (err) {
+    logger.error(`Error writing job journal: ${err.message}`);
+  }
+  if (journalBytes > JOURNAL_COMPACT_BYTES) {
+    compactJournal();
+  }
+}
+
+// Rewrite the journal with only the live jobs
+function compactJournal() {
+  const lines = [];
+  jobs.forEach((job, jobId) => {
+    lines.push(JSON.stringify({ event: 'queued', testCase: journalEntry(job.testCase), owner: job.owner }));
+    if (job.state === 'dispatched') {
+      lines.push(JSON.stringify({ event: 'dispatched', jobId }));
+    } else if (job.state === 'completed') {
+      lines.push(JSON.stringify({ event: 'completed', jobId }));
+    }
+  });
+  const text = lines.map((line) => line + '\n').join('');
+  try {
+    writeFileSync(`${JOURNAL_PATH}.tmp`, text);
+    renameSync(`${JOURNAL_PATH}.tmp`, JOURNAL_PATH);
+    journalBytes = Buffer.byteLength(text);
+  } catch (err) {
+    logger.error(`Error compacting job journal: ${err.message}`);
+  }
+}
+
+// Rebuild the job table from the journal and rewrite it with only the live jobs
+function replayJournal() {
+  mkdirSync(path.dirname(JOURNAL_PATH), { recursive: true });
+  if (!existsSync(JOURNAL_PATH)) {
+    return;
+  }
+  readFileSync(JOURNAL_PATH, 'utf8').split('\n').forEach((line) => {
+    let event;
+    try {
+      event = JSON.parse(line);
+    } catch (err) {
+      // Blank line, or a torn last write
+      return;
+    }
+    if (event.event === 'queued') {
+      jobs.set(event.testCase.jobId, { testCase: event.testCase, owner: event.owner, state: 'queued', result: null, stub: true });
+    } else if (event.event === 'dispatched' && jobs.has(event.jobId)) {
+      jobs.get(event.jobId).state = 'dispatched';
+    } else if (event.event === 'completed' && jobs.has(event.jobId)) {
+      // The result was not journaled: its owner acks it if it has it, or resubmits the test
+      jobs.get(event.jobId).state = 'queued';
+    } else if (event.event === 'acked' || event.event === 'cancelled') {
+      jobs.delete(event.jobId);
+    }
+  });
+  compactJournal();
+
+  // Queued tests are placed once their owner resubmits them; running ones first wait for
+  // their worker
+  let held = 0;
+  jobs.forEach((job) => {
+    if (job.state === 'dispatched') {
+      holdForReconnect(job.testCase);
+      held++;
+    }
+  });
+  logger.info(`Recovered ${jobs.size} jobs from the journal (${jobs.size - held} awaiting their owner, ${held} awaiting their worker)`);
+}
+
+// Ask a Flask instance for the test cases of its jobs that were recovered as stubs
+function requestResubmission(flaskWs, instance) {
+  const byRun = new Map();
+  jobs.forEach((job, jobId) => {
+    if (job.stub && (job.owner === instance || !job.owner)) {
+      const runId = job.testCase.runId;
+      byRun.set(runId, [...(byRun.get(runId) || []), jobId]);
+    }
+  });
+  byRun.forEach((jobIds, runId) => {
+    flaskWs.send(JSON.stringify({ type: 'resubmit-jobs', runId, jobIds }));
+    logger.info(`Asked Flask backend ${instance} to resubmit ${jobIds.length} jobs of run ${runId}`);
+  });
+}
+
+function holdForReconnect(testCase) {
+  delete testCase.pinned;
+  awaitingReconnect.set(testCase.jobId, testCase);
+  setTimeout(() => {
+    if (awaitingReconnect.delete(testCase.jobId)) {
+      const job = jobs.get(testCase.jobId);
+      if (job && job.stub) {
+        // Placed when its owner resubmits it
+        job.state = 'queued';
+        logger.info(`No worker reported job ${testCase.jobId} (${testCase.name}) in flight, waiting for its owner to resubmit it`);
+        return;
+      }
+      logger.info(`No worker reported job ${testCase.jobId} (${testCase.name}) in flight, rescheduling it`);
+      placeTest(testCase);
+      broadcastWorkers();
+    }
+  }, RECONNECT_GRACE_MS);
+}
+
+// Put tests a (re)connecting worker is still running back into its slots
+function adoptInFlight(clientId, inFlight) {
+  const state = clientState.get(clientId);
+  inFlight.forEach((running) => {
+    const job = jobs.get(running.jobId);
+    const testCase = awaitingReconnect.get(running.jobId) || (job && job.testCase) ||
+      { jobId: running.jobId, name: running.name, runId: running.runId, browser: running.browser };
+    awaitingReconnect.delete(running.jobId);
+    removeQueued(running.jobId);
+
+    const slot = running.slot < state.capacity && state.slots[running.slot] === null ? running.slot : state.slots.indexOf(null);
+    if (slot === -1) {
+      logger.warn(`Client ${clientId} reported job ${running.jobId} in flight but has no free slot for it`);
+      return;
+    }
+    testCase.startedAt = testCase.startedAt || Date.now();
+    state.slots[slot] = testCase;
+    if (job && job.state !== 'completed') {
+      job.state = 'dispatched';
+      journal({ event: 'dispatched', jobId: running.jobId, clientId });
+    }
+    logger.info(`Client ${clientId} is still running job ${running.jobId} (${testCase.name}) in slot ${slot}`);
+  });
+}
+
+// Drop a job from the unplaced queue and every worker queue
+function removeQueued(jobId) {
+  const dropFrom = (queue) => {
+    const index = queue.findIndex((testCase) => testCase.jobId === jobId);
+    if (index !== -1) {
+      queue.splice(index, 1);
+    }
+  };
+  dropFrom(unplacedQueue);
+  clientState.forEach((state, clientId) => {
+    dropFrom(state.queue);
+    cancelPrefetch(clientId, jobId);
+  });
+}
+
+function flaskInstanceOf(ws) {
+  return Array.from(flaskClients).find(([, flaskWs]) => flaskWs === ws)?.[0];
+}
+
+// Send a message to the Flask instance that owns a job or run; false if it is not
+// connected. Messages without an owner (jobs from before instance ids) go to any instance.
+function sendToOwner(owner, message) {
+  const flaskWs = owner ? flaskClients.get(owner) : flaskClients.values().next().value;
+  if (!flaskWs) {
+    return false;
+  }
+  flaskWs.send(JSON.stringify(message));
+  return true;
+}
+
+function runOwner(runId) {
+  for (const job of jobs.values()) {
+    if (job.testCase.runId === runId) {
+      return job.owner;
+    }
+  }
+  return undefined;
+}
+
+// Send a Flask instance every unacknowledged result it owns, and the messages held for it
+function resendResults(flaskWs, instance) {
+  const held = flaskOutbox.get(instance) || [];
+  flaskOutbox.delete(instance);
+  held.forEach((message) => flaskWs.send(JSON.stringify(message)));
+
+  let count = 0;
+  jobs.forEach((job, jobId) => {
+    if (job.state === 'completed' && (job.owner === instance || !job.owner)) {
+      flaskWs.send(JSON.stringify({ type: 'test-result', runId: job.testCase.runId, jobId, result: job.result }));
+      count++;
+    }
+  });
+  if (count > 0) {
+    logger.info(`Resent ${count} unacknowledged test results to Flask backend ${instance}`);
+  }
+}
 
 wss.on('connection', (ws) => {
   logger.info('New connection established');
@@ -43,43 +281,160 @@ wss.on('connection', (ws) => {
 
       if (data.type === 'register-electron') {
         const clientId = Math.random().toString(36).substring(2, 15);
+        const capacity = Math.max(1, parseInt(data.capacity, 10) || 1);
         clients.set(clientId, ws);
-        clientState.set(clientId, { busy: false, queue: [] });
-        ws.send(JSON.stringify({ type: 'registration', clientId }));
-        logger.info(`Electron client registered with ID: ${clientId}`);
+        clientState.set(clientId, {
+          capacity,
+          capabilities: data.capabilities || {},
+          slots: new Array(capacity).fill(null),
+          queue: [],
+          // Job ids announced to the worker with prefetch-test that are still in its queue
+          prefetched: new Set()
+        });
+        ws.send(JSON.stringify({ type: 'registration', clientId, capacity }));
+        logger.info(`Electron client registered with ID: ${clientId}, capacity: ${capacity}, capabilities: ${JSON.stringify(data.capabilities || {})}`);
+        // A reconnecting worker reports the tests it kept running while it was away
+        adoptInFlight(clientId, data.inFlight || []);
+
+        // Place tests that were waiting for a capable worker, then let the new worker steal
+        unplacedQueue.splice(0).forEach(placeTest);
+        sendNextTest(clientId);
+        broadcastWorkers();
+      } else if (data.type === 'update-capabilities') {
+        // Sent once a worker that registered as pending has finished probing its environment
+        const clientId = Array.from(clients).find(([, clientWs]) => clientWs === ws)?.[0];
+        const state = clientId && clientState.get(clientId);
+        if (state) {
+          state.capabilities = data.capabilities || {};
+          logger.info(`Client ${clientId} updated capabilities: ${JSON.stringify(state.capabilities)}`);
+          if (state.capabilities.error) {
+            logger.warn(`Client ${clientId} could not probe its environment (${state.capabilities.error}), sending it any test`);
+          }
+          unplacedQueue.splice(0).forEach(placeTest);
+          sendNextTest(clientId);
+          broadcastWorkers();
+        }
       } else if (data.type === 'register-flask') {
-        flaskClient.add(ws);
-        logger.info('Flask backend registered');
+        // Backends without an instance id get one for this connection only
+        const instance = data.instance || Math.random().toString(36).substring(2, 15);
+        const previous = flaskClients.get(instance);
+        if (previous && previous !== ws) {
+          logger.warn(`Flask instance ${instance} registered again, replacing its previous connection`);
+        }
+        flaskClients.set(instance, ws);
+        logger.info(`Flask backend registered as instance ${instance}`);
+        ws.send(JSON.stringify({ type: 'workers-update', workers: describeWorkers() }));
+        resendResults(ws, instance);
+        requestResubmission(ws, instance);
+      } else if (data.type === 'result-ack') {
+        // Flask has recorded the result; the job can be forgotten
+        if (jobs.delete(data.jobId)) {
+          journal({ event: 'acked', jobId: data.jobId });
+          if (jobs.size === 0) {
+            compactJournal();
+          }
+        }
+      } else if (data.type === 'cancel-run') {
+        // Any instance may cancel a run; the reply goes to the one collecting its results
+        const owner = runOwner(data.runId) || flaskInstanceOf(ws);
+        const reason = data.reason || 'cancelled';
+        const { dropped, stopped } = cancelRun(data.runId, reason);
+        const reply = { type: 'run-cancelled', runId: data.runId, reason, dropped, stopped };
+        if (!sendToOwner(owner, reply) && owner) {
+          logger.info(`Flask instance ${owner} is not connected, holding the cancellation of run ${data.runId} for it`);
+          flaskOutbox.set(owner, [...(flaskOutbox.get(owner) || []), reply]);
+        }
+        broadcastWorkers();
+      } else if (data.type === 'change') {
+        // A Flask instance saved a report or changed a run; the others add it to their change feeds
+        const relayed = JSON.stringify(data);
+        flaskClients.forEach((flaskWs) => {
+          if (flaskWs !== ws) {
+            flaskWs.send(relayed);
+          }
+        });
       } else if (data.type === 'test-case') {
         const clientId = data.clientId;
-        const client = clients.get(clientId);
-        if (!client) {
-          logger.error(`No client found for ID: ${clientId}`);
+        const testCase = data.testCase;
+        testCase.jobId = testCase.jobId || Math.random().toString(36).substring(2, 15);
+
+        // A job recovered from the journal gets its content back and can be placed
+        const recovered = jobs.get(testCase.jobId);
+        if (recovered && recovered.stub) {
+          Object.assign(recovered.testCase, testCase);
+          delete recovered.stub;
+          logger.info(`Received test case ${testCase.name} for job ${testCase.jobId} recovered from the journal`);
+          if (recovered.state === 'queued') {
+            placeTest(recovered.testCase);
+          }
+          broadcastWorkers();
           return;
         }
+        // Flask resubmits the unfinished jobs of a run it resumes; keep the copy we have
+        if (jobs.has(testCase.jobId)) {
+          logger.info(`Job ${testCase.jobId} (${testCase.name}) is already ${jobs.get(testCase.jobId).state}, ignoring resubmission`);
+          return;
+        }
+        const owner = flaskInstanceOf(ws);
+        jobs.set(testCase.jobId, { testCase, owner, state: 'queued', result: null });
+        journal({ event: 'queued', testCase: journalEntry(testCase), owner });
 
-        const state = clientState.get(clientId);
-        state.queue.push(data.testCase);
-        logger.info(`Queued test case ${data.testCase.name} for client ${clientId}`);
-
-        if (!state.busy) {
+        if (clientId && clients.has(clientId)) {
+          // A test aimed at a specific worker stays there and is never stolen
+          testCase.pinned = true;
+          clientState.get(clientId).queue.push(testCase);
+          logger.info(`Queued test case ${testCase.name} (job ${testCase.jobId}) for client ${clientId}`);
           sendNextTest(clientId);
+        } else {
+          if (clientId) {
+            logger.warn(`No client found for ID: ${clientId}, scheduling test case ${testCase.name} on the worker pool`);
+          }
+          placeTest(testCase);
         }
+        broadcastWorkers();
       } else if (data.type === 'test-result') {
         const clientId = data.clientId;
         const state = clientState.get(clientId);
-        state.busy = false;
-
-        flaskClient.forEach((flaskWs) => {
-          flaskWs.send(JSON.stringify({
-            type: 'test-result',
-            result: data.result
-          }));
-          logger.info('Sent test result to Flask backend');
+        if (state) {
+          releaseSlot(state, data.jobId);
+        }
+
+        const job = jobs.get(data.jobId);
+        if (job && job.state === 'completed') {
+          logger.info(`Ignoring duplicate result for job ${data.jobId} (${job.testCase.name})`);
+          if (state) {
+            sendNextTest(clientId);
+          }
+          return;
+        }
+        // The worker may have finished it while disconnected and sent it from its outbox
+        if (awaitingReconnect.delete(data.jobId)) {
+          logger.info(`Job ${data.jobId} finished while its worker was disconnected`);
+        }
+        if (job) {
+          Object.assign(job, { state: 'completed', result: data.result });
+          journal({ event: 'completed', jobId: data.jobId });
+        }
+        const owner = job ? job.owner : runOwner(data.runId);
+        const sent = sendToOwner(owner, {
+          type: 'test-result',
+          runId: data.runId,
+          jobId: data.jobId,
+          result: data.result
         });
+        if (sent) {
+          logger.info(`Sent test result for job ${data.jobId} to Flask backend`);
+        } else if (job) {
+          logger.warn(`${owner ? `Flask instance ${owner} is not` : 'No Flask backend'} connected, holding result for job ${data.jobId} until it registers`);
+        } else {
+          logger.warn(`No Flask backend to take the result of unknown job ${data.jobId}, dropping it`);
+        }
 
-        logger.info(`Client state for ${clientId}: ${JSON.stringify(state)}`);
-        sendNextTest(clientId);
+        if (state) {
+          logger.info(`Client state for ${clientId}: ${describeState(state)}`);
+          sendNextTest(clientId);
+        }
+        broadcastWorkers();
       }
     } catch (err) {
       logger.error(`Error processing message: ${err.message}`);
@@ -90,37 +445,357 @@ wss.on('connection', (ws) => {
     logger.info('Connection closed');
     for (const [clientId, clientWs] of clients) {
       if (clientWs === ws) {
+        const state = clientState.get(clientId);
         clients.delete(clientId);
         clientState.delete(clientId);
         logger.info(`Client ${clientId} disconnected`);
+
+        // Reschedule the worker's queue now; its running tests may still finish if it
+        // reconnects in time, so those are held for the grace period first
+        // Cancelled tests are not rescheduled; their results are still forwarded if the
+        // worker sends them after reconnecting
+        const running = state.slots.filter((slot) => slot !== null && !slot.cancelling);
+        running.forEach(holdForReconnect);
+        state.queue.forEach((testCase) => {
+          delete testCase.pinned;
+          placeTest(testCase);
+        });
+        // Held tests now fail if the worker was the last one still probing its environment
+        unplacedQueue.splice(0).forEach(placeTest);
+        if (running.length + state.queue.length > 0) {
+          logger.info(`Rescheduled ${state.queue.length} queued test cases from disconnected client ${clientId}, holding ${running.length} running ones for ${RECONNECT_GRACE_MS}ms`);
+        }
+        broadcastWorkers();
         break;
       }
     }
-    flaskClient.delete(ws);
+    const instance = flaskInstanceOf(ws);
+    if (instance) {
+      flaskClients.delete(instance);
+      logger.info(`Flask backend ${instance} disconnected`);
+    }
   });
 });
 
+function workerLoad(state) {
+  const busy = state.slots.filter((slot) => slot !== null).length;
+  return (busy + state.queue.length) / state.capacity;
+}
+
+// A worker that advertised no capabilities, or failed to probe them ({ error }), is assumed
+// to run anything; a worker still probing its environment runs nothing until it sends
+// update-capabilities
+function canRun(state, testCase) {
+  const capabilities = state.capabilities || {};
+  if (capabilities.pending) {
+    return false;
+  }
+  const browsers = capabilities.browsers || {};
+  if (testCase.browser && Object.keys(browsers).length > 0 && !(testCase.browser.toLowerCase() in browsers)) {
+    return false;
+  }
+  if (testCase.framework === 'Robot' && capabilities.robot === null) {
+    return false;
+  }
+  if (testCase.framework === 'Selenium' && capabilities.python === null) {
+    return false;
+  }
+  return true;
+}
+
+function estimateOf(testCase) {
+  return typeof testCase.estimatedDurationMs === 'number' ? testCase.estimatedDurationMs : DEFAULT_ESTIMATE_MS;
+}
+
+// Estimated ms of work left on a worker: the unfinished part of running tests plus its queue
+function estimatedBacklog(state) {
+  const now = Date.now();
+  let backlog = 0;
+  state.slots.forEach((slot) => {
+    if (slot !== null && !slot.cancelling) {
+      backlog += Math.max(0, estimateOf(slot) - (now - slot.startedAt));
+    }
+  });
+  state.queue.forEach((testCase) => backlog += estimateOf(testCase));
+  return backlog;
+}
+
+// Queue a test on a worker that can run it. Tests with a duration estimate go to the
+// worker that is predicted to finish its backlog first; since Flask submits them
+// longest-first within each priority group (failing, changed, the rest) this is
+// longest-processing-time placement per group. Tests without history are placed round-robin.
+function placeTest(testCase) {
+  const capable = Array.from(clientState).filter(([, state]) => canRun(state, testCase));
+
+  if (capable.length === 0) {
+    if (mayGainCapableWorker()) {
+      unplacedQueue.push(testCase);
+      logger.warn(`No capable worker for test case ${testCase.name} (browser: ${testCase.browser}, framework: ${testCase.framework}), holding it until one registers`);
+    } else {
+      failUnplaceable(testCase);
+    }
+    return;
+  }
+
+  let target;
+  if (typeof testCase.estimatedDurationMs === 'number') {
+    let targetFinish = Infinity;
+    for (const [clientId, state] of capable) {
+      const finish = estimatedBacklog(state) / state.capacity;
+      if (finish < targetFinish) {
+        target = clientId;
+        targetFinish = finish;
+      }
+    }
+    logger.info(`Placed test case ${testCase.name} (job ${testCase.jobId}, ~${Math.round(testCase.estimatedDurationMs)}ms) on client ${target} (predicted finish in ${Math.round(targetFinish)}ms)`);
+  } else {
+    target = capable[roundRobinCursor++ % capable.length][0];
+    logger.info(`Placed test case ${testCase.name} (job ${testCase.jobId}, no history) on client ${target} round-robin`);
+  }
+
+  clientState.get(target).queue.push(testCase);
+  sendNextTest(target);
+}
+
+// Whether a worker that can run a held test may still show up: none is connected yet, or
+// some are still probing their environment. Held tests are placed again when a worker
+// registers, updates its capabilities or disconnects.
+function mayGainCapableWorker() {
+  return clientState.size === 0 ||
+    Array.from(clientState.values()).some((state) => state.capabilities && state.capabilities.pending);
+}
+
+// Complete a test no worker can run with a failed "no capable worker" report
+function failUnplaceable(testCase) {
+  const error = `No capable worker: no connected worker can run ${testCase.framework || 'this'} tests` +
+    (testCase.browser ? ` in ${testCase.browser}` : '');
+  const result = {
+    name: testCase.name,
+    runId: testCase.runId || null,
+    status: 'failed',
+    error,
+    framework: testCase.framework,
+    browser: testCase.browser,
+    dataset: testCase.dataset || null,
+    output: '',
+    screenshots: {},
+    steps: [{ step: 'Schedule test case', status: 'failed', message: error }]
+  };
+  const job = jobs.get(testCase.jobId);
+  if (job) {
+    Object.assign(job, { state: 'completed', result });
+    journal({ event: 'completed', jobId: testCase.jobId });
+  }
+  // Held in the job table for an owner that is not connected, like a worker's result
+  sendToOwner(job ? job.owner : runOwner(testCase.runId), {
+    type: 'test-result',
+    runId: testCase.runId,
+    jobId: testCase.jobId,
+    result
+  });
+  logger.warn(`Failed test case ${testCase.name} (job ${testCase.jobId}): ${error}`);
+  broadcastWorkers();
+}
+
+// Take the longest queued, unpinned test this worker can run from another worker's queue
+function stealTest(thiefId) {
+  const thief = clientState.get(thiefId);
+  let victimId = null;
+  let victimIndex = -1;
+  let longest = -1;
+  for (const [clientId, state] of clientState) {
+    if (clientId === thiefId) {
+      continue;
+    }
+    state.queue.forEach((testCase, index) => {
+      if (!testCase.pinned && canRun(thief, testCase) && estimateOf(testCase) > longest) {
+        victimId = clientId;
+        victimIndex = index;
+        longest = estimateOf(testCase);
+      }
+    });
+  }
+  if (victimId === null) {
+    return null;
+  }
+
+  const [testCase] = clientState.get(victimId).queue.splice(victimIndex, 1);
+  cancelPrefetch(victimId, testCase.jobId);
+  logger.info(`Client ${thiefId} stole test case ${testCase.name} (job ${testCase.jobId}) from client ${victimId}`);
+  return testCase;
+}
+
+function describeWorkers() {
+  return Array.from(clientState, ([clientId, state]) => ({
+    clientId,
+    capacity: state.capacity,
+    capabilities: state.capabilities,
+    running: state.slots
+      .map((slot, index) => slot && { slot: index, jobId: slot.jobId, name: slot.name, runId: slot.runId, browser: slot.browser, cancelling: Boolean(slot.cancelling) })
+      .filter(Boolean),
+    queued: state.queue.length,
+    prefetched: state.prefetched.size,
+    load: workerLoad(state),
+    estimatedBacklogMs: Math.round(estimatedBacklog(state))
+  }));
+}
+
+// Push live worker load to Flask backends, coalescing bursts of changes
+let workersUpdateTimer = null;
+function broadcastWorkers() {
+  if (workersUpdateTimer) {
+    return;
+  }
+  workersUpdateTimer = setTimeout(() => {
+    workersUpdateTimer = null;
+    const message = JSON.stringify({
+      type: 'workers-update',
+      workers: describeWorkers(),
+      unplaced: unplacedQueue.length,
+      awaitingReconnect: awaitingReconnect.size
+    });
+    flaskClients.forEach((flaskWs) => flaskWs.send(message));
+  }, 100);
+}
+
+function describeState(state) {
+  const running = state.slots.filter((slot) => slot !== null).map((slot) => slot.name);
+  return JSON.stringify({ capacity: state.capacity, running, queued: state.queue.length });
+}
+
+function releaseSlot(state, jobId) {
+  let index = state.slots.findIndex((slot) => slot !== null && slot.jobId === jobId);
+  if (index === -1 && !jobId) {
+    // Results from workers that do not echo a job id free the first busy slot
+    index = state.slots.findIndex((slot) => slot !== null);
+  }
+  if (index !== -1) {
+    state.slots[index] = null;
+  }
+}
+
+// Cancel a run: its queued jobs are dropped everywhere and its running tests are told to
+// stop. Their slots stay taken, marked cancelling, until the worker sends the stopped
+// test's result (with whatever it produced before it was stopped): the worker may need
+// its kill grace period to get rid of the test, and a new test in the same slot would
+// share its browser cache directory.
+// Returns the ids of the dropped jobs and how many running tests were stopped.
+function cancelRun(runId, reason) {
+  const ofRun = (testCase) => testCase.runId === runId;
+  const dropped = [];
+  const drain = (queue) => {
+    for (let index = queue.length - 1; index >= 0; index--) {
+      if (ofRun(queue[index])) {
+        dropped.push(queue.splice(index, 1)[0].jobId);
+      }
+    }
+  };
+  drain(unplacedQueue);
+  // Recovered jobs still waiting to be resubmitted
+  jobs.forEach((job, jobId) => {
+    if (job.stub && job.state === 'queued' && ofRun(job.testCase)) {
+      dropped.push(jobId);
+    }
+  });
+  awaitingReconnect.forEach((testCase, jobId) => {
+    if (ofRun(testCase)) {
+      awaitingReconnect.delete(jobId);
+      dropped.push(jobId);
+    }
+  });
+
+  let stopped = 0;
+  clientState.forEach((state, clientId) => {
+    drain(state.queue);
+    state.slots.forEach((slot, index) => {
+      if (slot !== null && ofRun(slot) && !slot.cancelling) {
+        slot.cancelling = true;
+        clients.get(clientId).send(JSON.stringify({ type: 'cancel-test', jobId: slot.jobId, reason }));
+        stopped++;
+      }
+    });
+  });
+  dropped.forEach((jobId) => {
+    if (jobs.delete(jobId)) {
+      journal({ event: 'cancelled', jobId });
+    }
+  });
+  logger.info(`Cancelled run ${runId} (${reason}): dropped ${dropped.length} queued jobs, stopping ${stopped} running tests`);
+
+  // Withdraw prefetches of dropped jobs and announce what now heads the drained queues
+  clientState.forEach((state, clientId) => {
+    dropped.forEach((jobId) => cancelPrefetch(clientId, jobId));
+    sendNextTest(clientId);
+  });
+  return { dropped, stopped };
+}
+
+// Fill every free slot on the client from its queue, stealing work once the queue is empty
 function sendNextTest(clientId) {
   const state = clientState.get(clientId);
-  if (!state || state.queue.length === 0) {
-    logger.info(`No more tests in queue for client ${clientId}, marked as not busy`);
-    state.busy = false;
+  const client = clients.get(clientId);
+  if (!state || !client || (state.capabilities && state.capabilities.pending)) {
     return;
   }
 
-  if (!state.busy) {
-    const testCase = state.queue.shift();
-    const client = clients.get(clientId);
-    if (client) {
-      state.busy = true;
-      client.send(JSON.stringify({
-        type: 'run-test',
-        testCase,
-        clientId
-      }));
-      logger.info(`Sent test case ${testCase.name} (framework: ${testCase.framework}) to Electron client ${clientId}`);
+  let slot = state.slots.indexOf(null);
+  while (slot !== -1) {
+    const testCase = state.queue.length > 0 ? state.queue.shift() : stealTest(clientId);
+    if (!testCase) {
+      break;
+    }
+    testCase.startedAt = Date.now();
+    state.slots[slot] = testCase;
+    state.prefetched.delete(testCase.jobId);
+    if (jobs.has(testCase.jobId)) {
+      jobs.get(testCase.jobId).state = 'dispatched';
+      journal({ event: 'dispatched', jobId: testCase.jobId, clientId });
     }
+    client.send(JSON.stringify({
+      type: 'run-test',
+      testCase,
+      clientId,
+      jobId: testCase.jobId,
+      slot
+    }));
+    logger.info(`Sent test case ${testCase.name} (framework: ${testCase.framework}) to Electron client ${clientId} slot ${slot}`);
+    slot = state.slots.indexOf(null);
+  }
+
+  if (state.queue.length === 0 && state.slots.every((s) => s === null)) {
+    logger.info(`No more tests in queue for client ${clientId}, all slots idle`);
+  }
+  prefetchNext(clientId);
+}
+
+// Announce the tests at the head of the worker's queue that it has not been told about.
+// They stay queued here: the worker only prepares them, and a later run-test (or
+// prefetch-cancel, if they are stolen or withdrawn) settles what happens to them.
+function prefetchNext(clientId) {
+  const state = clientState.get(clientId);
+  const client = clients.get(clientId);
+  state.queue.slice(0, state.capacity * PREFETCH_PER_SLOT).forEach((testCase) => {
+    if (state.prefetched.has(testCase.jobId)) {
+      return;
+    }
+    state.prefetched.add(testCase.jobId);
+    client.send(JSON.stringify({ type: 'prefetch-test', testCase, jobId: testCase.jobId }));
+    logger.info(`Sent prefetch of test case ${testCase.name} (job ${testCase.jobId}) to Electron client ${clientId}`);
+  });
+}
+
+// Tell a worker that a test it prefetched will not be sent to it after all, and announce
+// the test that moved up in its queue instead
+function cancelPrefetch(clientId, jobId) {
+  const state = clientState.get(clientId);
+  const client = clients.get(clientId);
+  if (!state || !state.prefetched.delete(jobId) || !client) {
+    return;
   }
+  client.send(JSON.stringify({ type: 'prefetch-cancel', jobId }));
+  logger.info(`Cancelled prefetch of job ${jobId} on Electron client ${clientId}`);
+  prefetchNext(clientId);
 }
 
-ensureLogsDir();
\ No newline at end of file
+ensureLogsDir();
+replayJournal();
\ No newline at end of file
@@ -1,24 +1,49 @@
 import React, { useState, useEffect } from 'react';
 import './App.css';
 
+// The viewer fetches a report without its output, then pages through the output
+const REPORT_FIELDS = 'name,status,error,framework,browser,clientId,steps,screenshots,outputInfo,attempts,flaky,visualStatus';
+const OUTPUT_PAGE_LINES = 500;
+// Pause before reconnecting to the change feed after an error
+const CHANGES_RETRY_MS = 5000;
+
 function App() {
   const [selectedBrowser, setBrowser] = useState('Chrome');
   const [selectedFramework, setFramework] = useState('Selenium');
+  const [selectedMode, setMode] = useState('all');
+  const [sharedPrefix, setSharedPrefix] = useState(false);
+  const [screenshotMode, setScreenshotMode] = useState('all');
   const [clientId, setClientId] = useState('');
   const [testResults, setTestResults] = useState(null);
   const [loading, setLoading] = useState(false);
+  // Runs started and not finished yet, as seen on the change feed
+  const [activeRuns, setActiveRuns] = useState([]);
   const [reports, setReports] = useState([]);
   const [selectedReport, setSelectedReport] = useState(null);
   const [viewingReport, setViewingReport] = useState(false);
+  const [reportOutput, setReportOutput] = useState(null);
+  const [workers, setWorkers] = useState([]);
 
   useEffect(() => {
-    // Generate a random client ID on component mount
-    setClientId(generateClientId());
-    
-    // Fetch available reports
-    fetchReports();
+    // Watch the change feed (which loads the reports first) and fetch the worker pool
+    let stopped = false;
+    watchReports(() => stopped);
+    fetchWorkers();
+    return () => { stopped = true; };
   }, []);
   
+  const fetchWorkers = async () => {
+    try {
+      const response = await fetch('http://localhost:5000/workers');
+      const data = await response.json();
+      if (data.status === 'success') {
+        setWorkers(data.workers);
+      }
+    } catch (error) {
+      console.error('Error fetching workers:', error);
+    }
+  };
+  
   const fetchReports = async () => {
     try {
       const response = await fetch('http://localhost:5000/reports');
@@ -31,6 +56,62 @@ function App() {
     }
   };
   
+  const applyReportChanges = (changes) => {
+    setActiveRuns((current) => changes.reduce((runs, change) => {
+      if (change.type !== 'run') {
+        return runs;
+      }
+      const others = runs.filter((runId) => runId !== change.runId);
+      return change.status === 'running' ? [...others, change.runId] : others;
+    }, current));
+    setReports((current) => changes.reduce((list, change) => {
+      if (change.type === 'report' && !list.some((report) => report.filename === change.filename)) {
+        return [{ filename: change.filename, timestamp: change.timestamp, data: change.data }, ...list];
+      }
+      if (change.type === 'archived') {
+        return list.filter((report) => report.filename !== change.filename);
+      }
+      return list;
+    }, current));
+  };
+
+  // Long-poll /reports/changes: load the full list once, then apply only the deltas.
+  // The list is reloaded whenever the backend asks for a reset (restart, delete-all).
+  const watchReports = async (isStopped) => {
+    let cursor = null;
+    while (!isStopped()) {
+      try {
+        const response = await fetch(`http://localhost:5000/reports/changes${cursor ? `?since=${cursor}` : ''}`);
+        const data = await response.json();
+        if (data.status !== 'success') {
+          throw new Error(data.message);
+        }
+        if (!cursor || data.reset || data.changes.some((change) => change.type === 'reset')) {
+          await fetchReports();
+        } else {
+          applyReportChanges(data.changes);
+        }
+        cursor = data.cursor;
+      } catch (error) {
+        console.error('Error watching report changes:', error);
+        await new Promise((resolve) => setTimeout(resolve, CHANGES_RETRY_MS));
+      }
+    }
+  };
+  
+  // Stops the run's running tests and drops its queued ones; the execute request then returns
+  const cancelRun = async (runId) => {
+    try {
+      const response = await fetch(`http://localhost:5000/runs/${runId}/cancel`, { method: 'POST' });
+      const data = await response.json();
+      if (data.status !== 'success') {
+        alert(`Error: ${data.message}`);
+      }
+    } catch (error) {
+      console.error('Error cancelling run:', error);
+    }
+  };
+
   const deleteAllReports = async () => {
     if (window.confirm('Are you sure you want to delete all reports?')) {
       try {
@@ -51,9 +132,28 @@ function App() {
     }
   };
   
+  const fetchOutputPage = async (filename, offset) => {
+    const response = await fetch(`http://localhost:5000/reports/${filename}/output?offset=${offset}&limit=${OUTPUT_PAGE_LINES}`);
+    return response.json();
+  };
+
+  const loadMoreOutput = async () => {
+    try {
+      const page = await fetchOutputPage(reportOutput.filename, reportOutput.nextOffset);
+      if (page.status === 'success') {
+        setReportOutput({ ...reportOutput, text: reportOutput.text + page.text, nextOffset: page.nextOffset });
+      }
+    } catch (error) {
+      console.error('Error fetching report output:', error);
+    }
+  };
+
   const viewReport = async (filename) => {
     try {
-      const response = await fetch(`http://localhost:5000/reports/${filename}`);
+      const [response, page] = await Promise.all([
+        fetch(`http://localhost:5000/reports/${filename}?fields=${REPORT_FIELDS}`),
+        fetchOutputPage(filename, 0)
+      ]);
       const data = await response.json();
       if (data.status === 'success') {
         // Extract timestamp from filename
@@ -75,6 +175,12 @@ function App() {
           results: [data.report] // Wrap the report in an array for consistent rendering
         };
         setSelectedReport(formattedReport);
+        setReportOutput(page.status === 'success' ? {
+          filename,
+          text: page.text,
+          nextOffset: page.nextOffset,
+          totalLines: page.totalLines
+        } : null);
         setViewingReport(true);
       }
     } catch (error) {
@@ -82,14 +188,6 @@ function App() {
     }
   };
 
-  const generateClientId = () => {
-    return 'xxxxxxxx-xxxx-4xxx-yxxx-xxxxxxxxxxxx'.replace(/[xy]/g, function(c) {
-      const r = Math.random() * 16 | 0;
-      const v = c === 'x' ? r : ((r & 0x3) | 0x8);
-      return v.toString(16);
-    });
-  };
-
   const executeTests = async () => {
     setLoading(true);
     try {
@@ -102,51 +200,39 @@ function App() {
         body: JSON.stringify({
           browser: selectedBrowser,
           framework: selectedFramework,
-          clientId: clientId
+          // An empty client ID lets the hub schedule across all workers
+          clientId: clientId || null,
+          mode: selectedMode,
+          // Run navigation shared by several tests once and fork the rest from its checkpoint
+          sharedPrefix,
+          screenshots: screenshotMode
         }),
       });
 
       const data = await response.json();
       setTestResults(data);
       
-      // Wait for tests to complete and fetch the latest reports
-      setTimeout(async () => {
-        await fetchReports();
-        const latestReports = await fetch('http://localhost:5000/reports');
-        const reportsData = await latestReports.json();
+      // The request returns once the run has finished; fetch only this run's reports.
+      // The reports list picks them up from the change feed.
+      if (data.runId) {
+        const runResponse = await fetch(`http://localhost:5000/runs/${data.runId}/reports`);
+        const runData = await runResponse.json();
         
-        if (reportsData.status === 'success' && reportsData.reports.length > 0) {
-          // Get all reports
-          const allReports = reportsData.reports;
-          const allResults = [];
-          
-          // Fetch each report
-          for (const report of allReports) {
-            try {
-              const reportResponse = await fetch(`http://localhost:5000/reports/${report.filename}`);
-              const reportData = await reportResponse.json();
-              
-              if (reportData.status === 'success') {
-                allResults.push(reportData.report);
-              }
-            } catch (error) {
-              console.error(`Error fetching report ${report.filename}:`, error);
-            }
-          }
-          
-          // Create a formatted report object with all test results
+        if (runData.status === 'success') {
+          // Create a formatted report object with the run's test results
           const formattedResults = {
-            timestamp: new Date().toISOString(),
+            timestamp: runData.run.startedAt,
+            runId: data.runId,
             browser: selectedBrowser,
             framework: selectedFramework,
-            clientId: clientId,
-            results: allResults,
+            clientId: clientId || 'Worker pool',
+            results: runData.reports.map((entry) => entry.report),
             status: 'success'
           };
           setTestResults(formattedResults);
         }
-        setLoading(false);
-      }, 120000); // Wait 120 seconds for all tests to complete
+      }
+      setLoading(false);
     } catch (error) {
       setTestResults({
         message: "Error executing tests: " + error.message,
@@ -182,10 +268,15 @@ function App() {
                       <pre>{result.error}</pre>
                     </div>
                   )}
-                  {result.output && (
+                  {reportOutput && reportOutput.text && (
                     <div className="output">
                       <h5>Output:</h5>
-                      <pre>{result.output}</pre>
+                      <pre>{reportOutput.text}</pre>
+                      {reportOutput.nextOffset !== null && (
+                        <button onClick={loadMoreOutput}>
+                          Load more ({reportOutput.nextOffset} of {reportOutput.totalLines} lines shown)
+                        </button>
+                      )}
                     </div>
                   )}
                   {result.steps && result.steps.length > 0 && (
@@ -232,13 +323,47 @@ function App() {
               <option value="Robot">Robot</option>
             </select>
           </div>
+
+          <div className="form-group">
+            <label>Run Mode:</label>
+            <select 
+              value={selectedMode}
+              onChange={(e) => setMode(e.target.value)}
+            >
+              <option value="all">All tests (failing and changed first)</option>
+              <option value="failed-only">Failed only</option>
+              <option value="changed-only">Changed only</option>
+            </select>
+          </div>
+          <div className="form-group">
+            <label>
+              <input
+                type="checkbox"
+                checked={sharedPrefix}
+                onChange={(e) => setSharedPrefix(e.target.checked)}
+              />
+              Share common test prefixes
+            </label>
+          </div>
+          <div className="form-group">
+            <label>Screenshots:</label>
+            <select 
+              value={screenshotMode}
+              onChange={(e) => setScreenshotMode(e.target.value)}
+            >
+              <option value="all">Every step</option>
+              <option value="on-failure">Only on failure (last steps before it)</option>
+              <option value="first-and-last">First and last step</option>
+              <option value="on-visual-change">Only when the page changed</option>
+            </select>
+          </div>
           <div className="form-group">
             <label>Electron Client ID:</label>
             <input 
               type="text" 
               value={clientId}
               onChange={(e) => setClientId(e.target.value)}
-              placeholder="Enter Client ID"
+              placeholder="Leave empty to use the whole worker pool"
             />
           </div>
 
@@ -255,9 +380,33 @@ function App() {
               <p>This may take up to 2 minutes to complete.</p>
               <p>Browser windows will open and close automatically.</p>
               <div className="spinner"></div>
+              {activeRuns.map((runId) => (
+                <button key={runId} onClick={() => cancelRun(runId)}>
+                  Cancel run {runId.slice(0, 8)}
+                </button>
+              ))}
             </div>
           )}
           
+          <div className="workers-section">
+            <h2>Workers</h2>
+            <button onClick={fetchWorkers}>Refresh Workers</button>
+            {workers.length > 0 ? (
+              <ul className="reports-list">
+                {workers.map((worker) => (
+                  <li key={worker.clientId}>
+                    {worker.clientId}: {worker.running.length}/{worker.capacity} slots busy, {worker.queued} queued
+                    {worker.capabilities && worker.capabilities.browsers && (
+                      <span> ({Object.keys(worker.capabilities.browsers).join(', ')})</span>
+                    )}
+                  </li>
+                ))}
+              </ul>
+            ) : (
+              <p>No workers connected</p>
+            )}
+          </div>
+
           <div className="reports-section">
             <h2>Available Reports</h2>
             <div className="reports-actions">
@@ -281,6 +430,7 @@ function App() {
           {testResults && (
             <div className={`results ${testResults.status}`}>
               <h2>Test Results:</h2>
+              {testResults.runId && <p><strong>Run ID:</strong> {testResults.runId}</p>}
               {testResults.results ? testResults.results.map((result, index) => (
                 <div key={index} className={`test-result ${result.status}`}>
                   <h3>{result.name}</h3>